@@ -0,0 +1,325 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import Optional
+from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import copy_context
+from functools import partial
+from telebot.types import CallbackQuery
+from telebot.types import Message
+from bot import HotelsBot, ResultStream
+from hotels import AsyncHotelsRequest
+from sessions import SessionStore
+from subscriptions import SubscriptionStore
+from env import ASYNC_UPSTREAM_LIMIT, ASYNC_TELEGRAM_WORKERS
+from env import METRICS_TRACE
+from metrics import timed, traced
+
+
+logger = logging.getLogger(__name__)
+
+# Обработчик шага диалога: обычный метод или корутина
+StepHandler = Union[
+    Callable[[Message], None],
+    Callable[[Message], Awaitable[None]]
+]
+
+
+class AsyncHotelsBot(HotelsBot):
+    """Бот с циклом обработки сообщений на asyncio
+
+    Каждое сообщение обрабатывается в отдельной задаче, сообщения
+    одного чата - последовательно. Шаги диалога с запросами к сайту
+    выполняются асинхронно и не задерживают другие чаты.
+
+    Args:
+        HotelsBot: класс-родитель
+    """
+
+    _request_class = AsyncHotelsRequest
+
+    def __init__(
+        self, token: str,
+        upstream_limit: int = ASYNC_UPSTREAM_LIMIT,
+        telegram_workers: int = ASYNC_TELEGRAM_WORKERS,
+        session_store: Optional[SessionStore] = None,
+        subscriptions: Optional[SubscriptionStore] = None
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            token (str): токен телеграм бота
+            upstream_limit (int, optional): максимальное количество
+                одновременных запросов к сайту.
+                Defaults to ASYNC_UPSTREAM_LIMIT.
+            telegram_workers (int, optional): количество потоков для
+                вызовов API телеграма. Defaults to ASYNC_TELEGRAM_WORKERS.
+            session_store (Optional[SessionStore], optional): хранилище
+                запросов пользователей. Defaults to None.
+            subscriptions (Optional[SubscriptionStore], optional):
+                хранилище сохраненных поисков. Defaults to None.
+        """
+        super().__init__(
+            token, threaded=False, session_store=session_store,
+            subscriptions=subscriptions
+        )
+        self._upstream_limit: int = upstream_limit
+        self._telegram_executor = ThreadPoolExecutor(
+            max_workers=telegram_workers,
+            thread_name_prefix='telegram-async'
+        )
+        # Следующие шаги диалогов: идентификатор чата -> обработчик
+        self._steps: dict[int, StepHandler] = dict()
+        # Поиски, к которым перешли шаги диалогов:
+        # идентификатор чата -> сообщение
+        self._pending_searches: dict[int, Message] = dict()
+        # Города из строки команды, ожидающие проверки:
+        # идентификатор чата -> сообщение и имя города
+        self._pending_cities: dict[int, tuple[Message, str]] = dict()
+        # Блокировки для последовательной обработки сообщений чата
+        # и количество задач, которые держат или ждут блокировку
+        self._chat_locks: dict[int, tuple[asyncio.Lock, int]] = dict()
+
+    def register_next_step_handler(
+        self, message: Message, callback: StepHandler, *args, **kwargs
+    ) -> None:
+        """Регистрация следующего шага диалога чата
+
+        Args:
+            message (Message): объект-сообщение к боту
+            callback (StepHandler): обработчик следующего сообщения чата
+        """
+        self._remember_step(message.chat.id, callback.__name__)
+        self._steps[message.chat.id] = callback
+
+    def _clear_step(self, chat_id: int) -> None:
+        """Отмена ожидания следующего шага диалога чата
+
+        Args:
+            chat_id (int): идентификатор чата
+        """
+        self._steps.pop(chat_id, None)
+        self._remember_step(chat_id, None)
+
+    async def _call(self, func: Callable, *args, **kwargs):
+        """Выполнение блокирующего вызова API телеграма вне цикла событий
+
+        Args:
+            func (Callable): блокирующая функция
+
+        Returns:
+            результат функции
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._telegram_executor,
+            copy_context().run, partial(func, *args, **kwargs)
+        )
+
+    async def _get_city_name(self, message: Message) -> None:
+        """Асинхронное получение имени города из сообщения к боту
+
+        Args:
+            message (Message): объект-сообщение к боту
+        """
+        isCityExists: Optional[bool] = \
+            await self._users_cookies[message.chat.id].is_city_exists_async(
+                message.text
+            )
+        await self._call(self._on_city_checked, message, isCityExists)
+
+    def _start_search(
+        self, message: Message, request_type: str, arguments: list[str]
+    ) -> None:
+        """Откладывание проверки города из строки команды: команда
+            разбирается в потоке, проверка выполняется асинхронно после
+            разбора
+
+        Args:
+            message (Message): объект-сообщение к боту
+            request_type (str): тип поиска
+            arguments (list[str]): слова строки команды после самой команды
+        """
+        city_name = self._new_search(message, request_type, arguments)
+        if not city_name:
+            self._continue_dialog(message)
+            return
+        self._pending_cities[message.chat.id] = (message, city_name)
+
+    async def _check_pending_city(self, chat_id: int) -> None:
+        """Асинхронная проверка города, отложенная разбором команды чата
+
+        Args:
+            chat_id (int): идентификатор чата
+        """
+        message, city_name = self._pending_cities.pop(chat_id, (None, None))
+        request = self._users_cookies.get(chat_id)
+        if message is None or request is None:
+            return
+        isCityExists: Optional[bool] = \
+            await request.is_city_exists_async(city_name)
+        await self._call(
+            self._on_city_checked, message, isCityExists, city_name
+        )
+
+    def _run_search(self, message: Message) -> None:
+        """Откладывание поиска: шаги диалога выполняются в потоках,
+            сам поиск - асинхронно после завершения шага
+
+        Args:
+            message (Message): объект-сообщение к боту
+        """
+        self._pending_searches[message.chat.id] = message
+
+    async def _run_pending_search(self, chat_id: int) -> None:
+        """Асинхронный поиск отелей, отложенный шагом диалога чата
+
+        Args:
+            chat_id (int): идентификатор чата
+        """
+        message = self._pending_searches.pop(chat_id, None)
+        request = self._users_cookies.get(chat_id)
+        if message is None or request is None:
+            return
+        stream = ResultStream(self, message, request)
+        async for hotels in request.iter_hotels_async():
+            await self._call(stream.add, hotels)
+        await self._call(stream.finish)
+
+    async def process_message(self, message: Message) -> None:
+        """Обработка входящего сообщения: очередной шаг диалога
+            или разбор команды
+
+        Args:
+            message (Message): объект-сообщение к боту
+        """
+        chat_id = message.chat.id
+        try:
+            async with self._chat_lock(chat_id):
+                handler = self._steps.pop(chat_id, None)
+                if handler is None:
+                    # Диалог, начатый до перезапуска бота
+                    step = self._get_saved_step(chat_id)
+                    if step is not None:
+                        handler = getattr(self, step)
+                if handler is None:
+                    await self._call(self.parse_command, message)
+                    await self._check_pending_city(chat_id)
+                    await self._run_pending_search(chat_id)
+                    return
+                if chat_id not in self._users_cookies:
+                    await self._call(
+                        self.send_message, chat_id,
+                        'Поиск устарел, начни его заново'
+                    )
+                    return
+                self._remember_step(chat_id, None)
+                step = handler.__name__
+                request_type = self._get_request_type(chat_id)
+                with traced(METRICS_TRACE, chat_id, step, request_type), \
+                        timed(step.lstrip('_'), request_type):
+                    if asyncio.iscoroutinefunction(handler):
+                        await handler(message)
+                    else:
+                        await self._call(handler, message)
+                    await self._run_pending_search(chat_id)
+        except Exception:
+            logger.exception('Ошибка обработки сообщения чата %s', chat_id)
+
+    async def process_callback(self, call: CallbackQuery) -> None:
+        """Обработка нажатия кнопки под сообщением бота
+
+        Args:
+            call (CallbackQuery): нажатие кнопки
+        """
+        chat_id = call.message.chat.id
+        try:
+            async with self._chat_lock(chat_id):
+                await self._call(self.parse_callback, call)
+                await self._run_pending_search(chat_id)
+        except Exception:
+            logger.exception('Ошибка обработки кнопки чата %s', chat_id)
+
+    @asynccontextmanager
+    async def _chat_lock(self, chat_id: int) -> AsyncIterator[None]:
+        """Последовательная обработка обновлений одного чата
+
+        Args:
+            chat_id (int): идентификатор чата
+        """
+        lock, users = self._chat_locks.get(chat_id, (asyncio.Lock(), 0))
+        self._chat_locks[chat_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            # Блокировка удаляется, только когда ее никто не ждет:
+            # сразу после освобождения она не занята, пока ожидающая
+            # задача не продолжит работу
+            lock, users = self._chat_locks[chat_id]
+            if users == 1:
+                del self._chat_locks[chat_id]
+            else:
+                self._chat_locks[chat_id] = (lock, users - 1)
+
+    async def run(
+        self, interval: float = 0, long_polling_timeout: int = 20
+    ) -> None:
+        """Цикл опроса телеграма о новых сообщениях
+
+        Args:
+            interval (float, optional): пауза между запросами обновлений.
+                                        Defaults to 0.
+            long_polling_timeout (int, optional): таймаут длинного опроса.
+                                                  Defaults to 20.
+        """
+        AsyncHotelsRequest.set_upstream_limit(self._upstream_limit)
+        tasks: set[asyncio.Task] = set()
+        offset: Optional[int] = None
+        while True:
+            try:
+                updates = await self._call(
+                    self.get_updates,
+                    offset=offset,
+                    timeout=long_polling_timeout,
+                    long_polling_timeout=long_polling_timeout
+                )
+            except Exception:
+                logger.exception('Ошибка получения обновлений')
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                if (
+                    update.callback_query is not None and
+                    update.callback_query.message is not None
+                ):
+                    coroutine = self.process_callback(update.callback_query)
+                elif (
+                    update.message is not None and
+                    update.message.text is not None
+                ):
+                    coroutine = self.process_message(update.message)
+                else:
+                    continue
+                task = asyncio.create_task(coroutine)
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if interval:
+                await asyncio.sleep(interval)
+
+    def polling_async(
+        self, interval: float = 0, long_polling_timeout: int = 20
+    ) -> None:
+        """Запуск асинхронного цикла опроса телеграма
+
+        Args:
+            interval (float, optional): пауза между запросами обновлений.
+                                        Defaults to 0.
+            long_polling_timeout (int, optional): таймаут длинного опроса.
+                                                  Defaults to 20.
+        """
+        asyncio.run(self.run(interval, long_polling_timeout))
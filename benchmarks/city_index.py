@@ -0,0 +1,132 @@
+"""Замер локального индекса городов: размер файла, время загрузки,
+точная проверка города и подбор похожих имен при опечатках
+
+Запуск из корня проекта:
+    $ python -m benchmarks.city_index [--cities 100000]
+"""
+import os
+from argparse import ArgumentParser
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from timeit import repeat
+from cityindex import CityIndex
+
+# Слоги для имен городов
+SYLLABLES = tuple(
+    consonant + vowel
+    for consonant in 'бвгджзклмнпрстфхцчш'
+    for vowel in 'аеиоуыя'
+) + ('ск', 'ов', 'ин', 'бург', 'град', 'поль')
+
+
+def make_name(rng: Random) -> str:
+    """Случайное имя города
+
+    Args:
+        rng (Random): генератор случайных чисел
+
+    Returns:
+        str: имя города
+    """
+    name = ''.join(
+        rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))
+    ).capitalize()
+    if rng.random() < 0.1:
+        name += ' ' + ''.join(
+            rng.choice(SYLLABLES) for _ in range(2)
+        ).capitalize()
+    return name
+
+
+def make_typo(name: str, rng: Random) -> str:
+    """Имя с одной опечаткой (замена, пропуск или перестановка букв)
+
+    Args:
+        name (str): имя города
+        rng (Random): генератор случайных чисел
+
+    Returns:
+        str: имя с опечаткой
+    """
+    position = rng.randrange(1, len(name) - 1)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return name[:position] + 'а' + name[position + 1:]
+    if kind == 1:
+        return name[:position] + name[position + 1:]
+    return (
+        name[:position] + name[position + 1] + name[position] +
+        name[position + 2:]
+    )
+
+
+def per_call_us(func, names: list[str], number: int = 3) -> float:
+    """Лучшее среднее время вызова в микросекундах
+
+    Args:
+        func: проверяемая функция имени
+        names (list[str]): имена для вызовов
+        number (int, optional): количество повторов. Defaults to 3.
+
+    Returns:
+        float: микросекунд на вызов
+    """
+    best = min(repeat(
+        lambda: [func(name) for name in names], number=1, repeat=number
+    ))
+    return best / len(names) * 1e6
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--cities', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = Random(args.seed)
+    index = CityIndex()
+    while len(index) < args.cities:
+        index.add(str(1000000 + len(index)), make_name(rng))
+    names = [index.get_name(str(1000000 + rng.randrange(len(index))))
+             for _ in range(args.queries)]
+    typos = [make_typo(name, rng) for name in names]
+
+    with TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cities.idx')
+        index.save(path)
+        size = os.path.getsize(path)
+        started = perf_counter()
+        loaded = CityIndex()
+        loaded.load(path)
+        load_seconds = perf_counter() - started
+    started = perf_counter()
+    loaded.build_trigrams()
+    trigrams_seconds = perf_counter() - started
+
+    found = sum(
+        any(city[1] == name for city in loaded.suggest(typo, 5))
+        for name, typo in zip(names, typos)
+    )
+    print('cities: {}, index file: {:.1f} KiB ({:.1f} B/city)'.format(
+        len(loaded), size / 1024, size / len(loaded)
+    ))
+    print('load: {:.0f} ms, fuzzy index build: {:.0f} ms'.format(
+        load_seconds * 1000, trigrams_seconds * 1000
+    ))
+    print('exact lookup: {:.2f} us'.format(
+        per_call_us(loaded.lookup, names)
+    ))
+    print('prefix completion: {:.1f} us'.format(
+        per_call_us(lambda name: loaded.complete(name[:4], 5), names)
+    ))
+    print('fuzzy suggestion: {:.0f} us, typo corrected in top 5: {:.0%}'
+          .format(
+              per_call_us(lambda name: loaded.suggest(name, 5), typos),
+              found / len(typos)
+          ))
+
+
+if __name__ == '__main__':
+    main()
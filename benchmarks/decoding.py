@@ -0,0 +1,91 @@
+"""Замер разбора страницы properties/list: прежний путь
+(Response.text + json.loads + полный словарь) и текущий
+(байты ответа + быстрый JSON + сразу объекты Hotel)
+
+Запуск из корня проекта:
+    $ python -m benchmarks.decoding [--pages 20] [--repeat 5]
+"""
+import json
+from argparse import ArgumentParser
+from timeit import repeat
+from requests import Response
+from hotels import Hotel, HotelsRequest, loads
+from benchmarks.payloads import properties_list_bytes
+
+
+def make_response(content: bytes) -> Response:
+    """Ответ requests без указания кодировки, как у сайта
+
+    Args:
+        content (bytes): тело ответа
+
+    Returns:
+        Response: объект ответа
+    """
+    response = Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'application/json'
+    response._content = content
+    return response
+
+
+def legacy_parse(response: Response) -> list[Hotel]:
+    """Разбор страницы прежним способом
+
+    Args:
+        response (Response): ответ сайта
+
+    Returns:
+        list[Hotel]: список отелей
+    """
+    results = []
+    for hotel in json.loads(
+        response.text
+    )['data']['body']['searchResults']['results']:
+        distance = None
+        for landmark in hotel['landmarks']:
+            if landmark['label'] == 'Центр города':
+                distance = float(
+                    str(landmark['distance'])
+                    .split(sep=' ')[0]
+                    .replace(',', '.')
+                )
+            break
+        results.append(Hotel(
+            name=hotel['name'],
+            address=dict(hotel['address']).get('streetAddress', ''),
+            distance=distance,
+            price=int(
+                str(hotel['ratePlan']['price']['current'])
+                .split(sep=' ')[0]
+                .replace(',', '')
+            )
+        ))
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    payloads = [properties_list_bytes(page) for page in range(1, args.pages + 1)]
+    print('JSON backend: {}'.format(loads.__module__))
+    print('page size: {:.1f} KiB'.format(
+        sum(map(len, payloads)) / len(payloads) / 1024
+    ))
+
+    def run_legacy() -> None:
+        # Каждый раз новый ответ: requests кэширует определенную кодировку
+        for content in payloads:
+            legacy_parse(make_response(content))
+
+    def run_lean() -> None:
+        for content in payloads:
+            HotelsRequest.parse_page(make_response(content).content)
+
+    for name, func in (('legacy', run_legacy), ('lean', run_lean)):
+        best = min(repeat(func, number=1, repeat=args.repeat))
+        print('{:7} {:8.3f} ms/page'.format(
+            name, best / len(payloads) * 1000
+        ))
@@ -0,0 +1,276 @@
+"""Сквозной замер бота на локальных заменителях hotels4 и телеграма
+
+Прогоняет множество диалогов /lowprice, /highprice и /bestdeal через
+HotelsBot и выводит количество диалогов в секунду, процентили
+задержки каждого шага и количество запросов к hotels4 на диалог.
+
+Запуск из корня проекта:
+    $ python -m benchmarks.e2e --dialogs 2000 --concurrency 50 [--one-shot]
+"""
+import asyncio
+from argparse import ArgumentParser
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from threading import Lock
+from time import perf_counter
+from telebot import apihelper
+from telebot.types import Message
+from telebot.types import Update
+from bot import HotelsBot
+from async_bot import AsyncHotelsBot
+from hotels import HotelsClient
+from metrics import HEDGED_REQUESTS
+from ratelimit import RateLimiter
+from fake_telegram import make_text_update
+from benchmarks.fakes import FakeHotelsServer
+from benchmarks.fakes import FakeTelegramServer
+from benchmarks.fakes import get_calls
+from benchmarks.fakes import percentile
+from benchmarks.fakes import start_in_process
+
+
+# Названия шагов диалога по порядку
+STEPS = {
+    'lowprice': ('command', 'city', 'hotels_count'),
+    'highprice': ('command', 'city', 'hotels_count'),
+    'bestdeal': (
+        'command', 'city', 'min_price', 'max_price',
+        'min_distance', 'max_distance', 'hotels_count'
+    )
+}
+
+
+def make_dialog(
+    rng: Random, cities: int, one_shot: bool = False
+) -> tuple[str, list[str]]:
+    """Случайный диалог пользователя
+
+    Args:
+        rng (Random): генератор случайных чисел
+        cities (int): количество различных городов
+        one_shot (bool, optional): все параметры одной строкой
+                                   с командой. Defaults to False.
+
+    Returns:
+        tuple[str, list[str]]: команда и тексты сообщений по порядку
+    """
+    command = rng.choice(('lowprice', 'highprice', 'bestdeal'))
+    # Популярность городов убывает, как в реальном трафике
+    city = 'Город {}'.format(int(rng.paretovariate(1.2)) % cities)
+    count = str(rng.randint(1, 10))
+    if command != 'bestdeal':
+        texts = ['/' + command, city, count]
+    else:
+        min_distance = rng.uniform(0.3, 8)
+        texts = [
+            '/' + command, city, '1000', '30000',
+            '{:.1f}'.format(min_distance).replace('.', ','),
+            '{:.1f}'.format(min_distance + rng.uniform(0.5, 3)),
+            count
+        ]
+    if one_shot:
+        return command, [' '.join(texts)]
+    return command, texts
+
+
+class Recorder:
+    """Сбор задержек шагов диалогов
+    """
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self._lock = Lock()
+
+    def add(self, step: str, latency: float) -> None:
+        with self._lock:
+            self.latencies[step].append(latency)
+
+
+def run_sync(
+    bot: HotelsBot, dialogs: list, concurrency: int, recorder: Recorder
+) -> None:
+    """Прогон диалогов через потоковый бот
+
+    Args:
+        bot (HotelsBot): бот без собственных потоков
+        dialogs (list): диалоги (идентификатор чата, команда, сообщения)
+        concurrency (int): количество одновременных диалогов
+        recorder (Recorder): сбор задержек
+    """
+    def run_dialog(dialog: tuple) -> None:
+        chat_id, command, texts = dialog
+        for step, text in zip(STEPS[command], texts):
+            update = Update.de_json(make_text_update(chat_id, text))
+            started = perf_counter()
+            bot.process_new_updates([update])
+            recorder.add(step, perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_dialog, dialogs))
+
+
+def run_async(
+    bot: AsyncHotelsBot, dialogs: list, concurrency: int,
+    recorder: Recorder
+) -> None:
+    """Прогон диалогов через асинхронный бот
+
+    Args:
+        bot (AsyncHotelsBot): асинхронный бот
+        dialogs (list): диалоги (идентификатор чата, команда, сообщения)
+        concurrency (int): количество одновременных диалогов
+        recorder (Recorder): сбор задержек
+    """
+    async def run_dialog(dialog: tuple, limit: asyncio.Semaphore) -> None:
+        chat_id, command, texts = dialog
+        async with limit:
+            for step, text in zip(STEPS[command], texts):
+                message = Message.de_json(
+                    make_text_update(chat_id, text)['message']
+                )
+                started = perf_counter()
+                await bot.process_message(message)
+                recorder.add(step, perf_counter() - started)
+
+    async def run_all() -> None:
+        bot._upstream_limit = concurrency
+        limit = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*[
+            run_dialog(dialog, limit) for dialog in dialogs
+        ])
+
+    asyncio.run(run_all())
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--dialogs', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--mode', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help='задержка ответа hotels4, секунды'
+    )
+    parser.add_argument(
+        '--pages', type=int, default=10,
+        help='страниц по 25 отелей в выдаче города'
+    )
+    parser.add_argument(
+        '--error-rate', type=float, default=0.0,
+        help='доля ответов 500 от hotels4'
+    )
+    parser.add_argument(
+        '--slow-rate', type=float, default=0.0,
+        help='доля медленных ответов hotels4'
+    )
+    parser.add_argument(
+        '--slow-latency', type=float, default=1.0,
+        help='задержка медленного ответа hotels4, секунды'
+    )
+    parser.add_argument(
+        '--telegram-rate', type=float, default=0.0,
+        help='сообщений телеграма в секунду, 0 - без ограничения'
+    )
+    parser.add_argument(
+        '--chat-rate', type=float, default=0.0,
+        help='сообщений в секунду в один чат, 0 - без ограничения'
+    )
+    parser.add_argument(
+        '--hotels-rps', type=float, default=0.0,
+        help='запросов к hotels4 в секунду, 0 - без ограничения'
+    )
+    parser.add_argument(
+        '--one-shot', action='store_true',
+        help='команды с параметрами одной строкой, без диалога'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Заменители работают в отдельных процессах
+    hotels_process, hotels_url = start_in_process(
+        FakeHotelsServer, latency=args.latency, pages=args.pages,
+        error_rate=args.error_rate, seed=args.seed,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency
+    )
+    telegram_process, telegram_url = start_in_process(FakeTelegramServer)
+    HotelsClient.BASE_URL = hotels_url
+    apihelper.API_URL = telegram_url + '/bot{0}/{1}'
+    # По умолчанию замеряется сам бот, без ограничения частоты запросов
+    scheduler = HotelsBot._scheduler
+    scheduler.global_limiter = RateLimiter(
+        args.telegram_rate, burst=args.concurrency
+    )
+    scheduler.chat_rate = args.chat_rate
+    scheduler.workers = args.concurrency
+    HotelsClient.rate_limiter = RateLimiter(
+        args.hotels_rps, burst=max(int(args.hotels_rps), 1)
+    )
+
+    rng = Random(args.seed)
+    dialogs = [
+        (chat_id,) + make_dialog(rng, args.cities, args.one_shot)
+        for chat_id in range(1, args.dialogs + 1)
+    ]
+    recorder = Recorder()
+    token = '1:benchmark'
+    started = perf_counter()
+    if args.mode == 'async':
+        run_async(AsyncHotelsBot(token), dialogs, args.concurrency, recorder)
+    else:
+        bot = HotelsBot(token, threaded=False)
+
+        @bot.message_handler(func=lambda message: True,
+                             content_types=['text'])
+        def get_command(message: Message) -> None:
+            bot.parse_command(message)
+
+        run_sync(bot, dialogs, args.concurrency, recorder)
+    # Сообщения отправляются без ожидания, дожидаемся очереди
+    scheduler.wait_idle()
+    elapsed = perf_counter() - started
+    hotels_calls = get_calls(hotels_url)
+    telegram_calls = get_calls(telegram_url)
+    hotels_process.terminate()
+    telegram_process.terminate()
+
+    upstream_calls = sum(hotels_calls.values())
+    print('mode: {}{}, dialogs: {}, concurrency: {}'.format(
+        args.mode, ' one-shot' if args.one_shot else '', args.dialogs,
+        args.concurrency
+    ))
+    print('dialogs/sec: {:.1f}'.format(args.dialogs / elapsed))
+    print('upstream calls/dialog: {:.2f} ({})'.format(
+        upstream_calls / args.dialogs,
+        ', '.join(
+            '{} {}'.format(path.rsplit('/', 1)[-1], count)
+            for path, count in sorted(hotels_calls.items())
+        )
+    ))
+    print('hedged requests: {:.0f} sent, {:.0f} won'.format(*(
+        sum(
+            HEDGED_REQUESTS.value(path, outcome)
+            for path in HotelsClient.latencies
+        )
+        for outcome in ('sent', 'won')
+    )))
+    print('telegram calls/dialog: {:.2f}'.format(
+        sum(telegram_calls.values()) / args.dialogs
+    ))
+    print('{:14} {:>7} {:>9} {:>9} {:>9}'.format(
+        'step', 'count', 'p50 ms', 'p95 ms', 'p99 ms'
+    ))
+    for step in STEPS['bestdeal']:
+        values = sorted(recorder.latencies[step])
+        # Шаги без замеров (например, при --one-shot) не выводятся
+        if not values:
+            continue
+        print('{:14} {:7} {:9.1f} {:9.1f} {:9.1f}'.format(
+            step, len(values),
+            *(percentile(values, share) * 1000 for share in (.5, .95, .99))
+        ))
+
+
+if __name__ == '__main__':
+    main()
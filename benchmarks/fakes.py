@@ -0,0 +1,280 @@
+"""Локальные заменители API hotels4 и API телеграма для замеров
+без ключей RapidAPI и токена бота
+"""
+from typing import Optional
+from abc import ABC
+from abc import abstractmethod
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from json import dumps
+from json import loads
+from multiprocessing import get_context
+from multiprocessing.process import BaseProcess
+from random import Random
+from threading import Lock
+from threading import Thread
+from time import monotonic
+from time import sleep
+from urllib.parse import parse_qsl
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+from zlib import crc32
+from benchmarks.payloads import make_locations_search
+from benchmarks.payloads import properties_list_bytes
+
+
+# Путь, по которому сервер отдает количество запросов по путям
+STATS_PATH = '/_stats'
+
+
+class FakeServer(ABC):
+    """Базовый класс локального HTTP-сервера в фоновом потоке
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            host (str, optional): адрес сервера. Defaults to '127.0.0.1'.
+            port (int, optional): порт, 0 - любой свободный. Defaults to 0.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, как у настоящих API
+            protocol_version = 'HTTP/1.1'
+            # Без задержки отправки мелких ответов
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                server._handle(self)
+
+            def do_POST(self) -> None:
+                server._handle(self)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._lock = Lock()
+        # Количество запросов по путям
+        self.calls: Counter = Counter()
+
+    @property
+    def url(self) -> str:
+        """Адрес сервера
+        """
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        parts = urlsplit(handler.path)
+        params = dict(parse_qsl(parts.query))
+        length = int(handler.headers.get('Content-Length', 0))
+        if length:
+            params.update(parse_qsl(handler.rfile.read(length).decode()))
+        if parts.path == STATS_PATH:
+            with self._lock:
+                status, body = 200, dumps(self.calls).encode('utf-8')
+        else:
+            with self._lock:
+                self.calls[parts.path] += 1
+            status, body = self.respond(parts.path, params)
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    @abstractmethod
+    def respond(self, path: str, params: dict) -> tuple[int, bytes]:
+        """Формирование ответа на запрос
+
+        Args:
+            path (str): путь запроса
+            params (dict): параметры запроса
+
+        Returns:
+            tuple[int, bytes]: код и тело ответа
+        """
+
+    def start(self) -> 'FakeServer':
+        """Запуск сервера в фоновом потоке
+
+        Returns:
+            FakeServer: этот же сервер
+        """
+        Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """Остановка сервера
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeHotelsServer(FakeServer):
+    """Заменитель API hotels4 с настраиваемыми задержкой, количеством
+        страниц результатов, долей ошибок и долей медленных ответов
+    """
+
+    def __init__(
+        self, latency: float = 0.05, pages: int = 10,
+        error_rate: float = 0.0, seed: int = 0, slow_rate: float = 0.0,
+        slow_latency: float = 1.0, price_seed: int = 0, **kwargs
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            latency (float, optional): задержка ответа (секунды).
+                                       Defaults to 0.05.
+            pages (int, optional): количество страниц по 25 отелей
+                                   в выдаче города. Defaults to 10.
+            error_rate (float, optional): доля ответов 500.
+                                          Defaults to 0.0.
+            seed (int, optional): начальное значение генератора.
+                                  Defaults to 0.
+            slow_rate (float, optional): доля медленных ответов.
+                                         Defaults to 0.0.
+            slow_latency (float, optional): задержка медленного ответа
+                                            (секунды). Defaults to 1.0.
+            price_seed (int, optional): начальное значение цен отелей,
+                                        при смене цены меняются, а отели
+                                        остаются. Defaults to 0.
+        """
+        super().__init__(**kwargs)
+        self.latency: float = latency
+        self.slow_rate: float = slow_rate
+        self.slow_latency: float = slow_latency
+        self.pages: int = pages
+        self.error_rate: float = error_rate
+        self._rng = Random(seed)
+        self._payloads: dict[tuple, bytes] = dict()
+        self.price_seed: int = price_seed
+
+    def respond(self, path: str, params: dict) -> tuple[int, bytes]:
+        with self._lock:
+            slow = self._rng.random() < self.slow_rate
+            failed = self._rng.random() < self.error_rate
+        if slow or self.latency:
+            sleep(self.slow_latency if slow else self.latency)
+        if failed:
+            return 500, b'{"message": "Internal Server Error"}'
+        if path.endswith('/locations/search'):
+            city_name = params.get('query', '')
+            body = make_locations_search(
+                city_name, str(crc32(city_name.encode()))
+            )
+            return 200, dumps(body, ensure_ascii=False).encode('utf-8')
+        if path.endswith('/properties/list'):
+            key = (
+                params.get('destinationId'),
+                int(params.get('pageNumber', 1)),
+                int(params.get('pageSize', 25)),
+                self.price_seed
+            )
+            # Готовые ответы, чтобы замер не упирался в сам заменитель
+            body = self._payloads.get(key)
+            if body is None:
+                body = properties_list_bytes(
+                    key[1], page_size=key[2], total=self.pages * 25,
+                    seed=crc32(str(key[0]).encode()) + key[3]
+                )
+                self._payloads[key] = body
+            return 200, body
+        return 404, b'{"message": "Not Found"}'
+
+
+class FakeTelegramServer(FakeServer):
+    """Заменитель API телеграма: принимает исходящие сообщения бота
+        и запоминает время их получения по чатам
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._message_id: int = 0
+        # Идентификатор чата -> время последнего сообщения бота
+        self.last_message: dict[int, float] = dict()
+
+    def respond(self, path: str, params: dict) -> tuple[int, bytes]:
+        method = path.rsplit('/', 1)[-1]
+        if method == 'getUpdates':
+            return 200, b'{"ok": true, "result": []}'
+        chat_id = int(params.get('chat_id', 0))
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+            self.last_message[chat_id] = monotonic()
+        result = {
+            'message_id': int(params.get('message_id', message_id)),
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': params.get('text', '')
+        }
+        return 200, dumps({'ok': True, 'result': result}).encode('utf-8')
+
+
+def _serve(server_class: type, kwargs: dict, urls) -> None:
+    """Запуск сервера в дочернем процессе
+
+    Args:
+        server_class (type): класс сервера
+        kwargs (dict): параметры сервера
+        urls: канал для передачи адреса сервера родителю
+    """
+    server = server_class(**kwargs)
+    urls.send(server.url)
+    server._server.serve_forever()
+
+
+def start_in_process(
+    server_class: type, **kwargs
+) -> tuple[BaseProcess, str]:
+    """Запуск сервера-заменителя в отдельном процессе, чтобы он
+        не делил интерпретатор с замеряемым ботом
+
+    Args:
+        server_class (type): класс сервера
+
+    Returns:
+        tuple[BaseProcess, str]: процесс и адрес сервера
+    """
+    context = get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_serve, args=(server_class, kwargs, sender), daemon=True
+    )
+    process.start()
+    return process, receiver.recv()
+
+
+def get_calls(url: str) -> Counter:
+    """Получение количества запросов к серверу по путям
+
+    Args:
+        url (str): адрес сервера
+
+    Returns:
+        Counter: путь -> количество запросов
+    """
+    with urlopen(url + STATS_PATH) as response:
+        return Counter(loads(response.read()))
+
+
+def percentile(values: list[float], share: float) -> Optional[float]:
+    """Процентиль выборки
+
+    Args:
+        values (list[float]): отсортированные значения
+        share (float): доля (0.95 - 95-й процентиль)
+
+    Returns:
+        Optional[float]: значение процентиля, None - выборка пуста
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(len(values) * share + 0.5) - 1))
+    return values[index]
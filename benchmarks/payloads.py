@@ -0,0 +1,185 @@
+"""Ответы API hotels4 в формате properties/list и locations/search
+для замеров и локального сервера-заменителя
+
+Структура ответов повторяет ответы сайта, включая поля, которые бот
+не использует (фотографии, отзывы, акции)
+"""
+from random import Random
+from json import dumps
+
+
+def make_hotel(index: int, rng: Random) -> dict:
+    """Формирование записи отеля
+
+    Args:
+        index (int): порядковый номер отеля в выдаче
+        rng (Random): генератор случайных чисел
+
+    Returns:
+        dict: запись отеля
+    """
+    price = rng.randint(1000, 30000)
+    return {
+        'id': 100000 + index,
+        'name': 'Отель {}'.format(index),
+        'starRating': rng.choice([2.0, 3.0, 4.0, 5.0]),
+        'urls': {},
+        'address': {
+            'streetAddress': 'ул. Тверская, {}'.format(index),
+            'extendedAddress': '',
+            'locality': 'Москва',
+            'postalCode': '125009',
+            'region': 'Москва',
+            'countryName': 'Россия',
+            'countryCode': 'ru',
+            'obfuscate': False
+        },
+        'guestReviews': {
+            'unformattedRating': rng.uniform(6, 10),
+            'rating': '8,6',
+            'ratingMaximum': 10,
+            'badge': 'fabulous',
+            'badgeText': 'Потрясающе',
+            'total': rng.randint(10, 3000)
+        },
+        'landmarks': [
+            {
+                'label': 'Центр города',
+                'distance': '{:.1f} км'.format(
+                    0.2 + index * 0.15
+                ).replace('.', ',')
+            },
+            {'label': 'Красная площадь', 'distance': '2,1 км'}
+        ],
+        'ratePlan': {
+            'price': {
+                'current': '{:,} RUB'.format(price),
+                'exactCurrent': float(price),
+                'old': '{:,} RUB'.format(price + 500)
+            },
+            'features': {
+                'freeCancellation': True,
+                'paymentPreference': False,
+                'noCCRequired': False
+            }
+        },
+        'neighbourhood': 'Тверской',
+        'deals': {
+            'specialDeal': {'dealText': 'Скидка 10 %'},
+            'priceReasoning': 'DRR-441'
+        },
+        'messaging': {'scarcity': 'Осталось 2 номера'},
+        'badging': {},
+        'pimmsAttributes': 'DoubleStamps|D13|TESCO',
+        'coordinate': {
+            'lat': 55.75 + rng.uniform(-0.1, 0.1),
+            'lon': 37.61 + rng.uniform(-0.1, 0.1)
+        },
+        'roomsLeft': rng.randint(0, 5),
+        'providerType': 'LOCAL',
+        'supplierHotelId': 5000000 + index,
+        'isAlternative': False,
+        'optimizedThumbUrls': {
+            'srpDesktop':
+                'https://exp.cdn-hotels.com/hotels/1000000/{}/'
+                'abcdef_z.jpg?impolicy=fcrop&w=250&h=140&q=high'.format(index)
+        }
+    }
+
+
+def make_properties_list(
+    page: int, page_size: int = 25, total: int = 250, seed: int = 0
+) -> dict:
+    """Формирование ответа properties/list
+
+    Args:
+        page (int): номер страницы
+        page_size (int, optional): размер страницы. Defaults to 25.
+        total (int, optional): всего отелей в выдаче. Defaults to 250.
+        seed (int, optional): начальное значение генератора.
+                              Defaults to 0.
+
+    Returns:
+        dict: ответ сайта
+    """
+    rng = Random(seed * 100003 + page)
+    start = (page - 1) * page_size
+    results = [
+        make_hotel(index, rng)
+        for index in range(start, min(start + page_size, total))
+    ]
+    return {
+        'result': 'OK',
+        'data': {
+            'body': {
+                'header': 'Москва, Россия',
+                'query': {'destination': {'id': '1153093'}},
+                'searchResults': {
+                    'totalCount': total,
+                    'results': results,
+                    'pagination': {
+                        'currentPage': page,
+                        'pageGroup': 'EXPEDIA_IN_POLYGON',
+                        'nextPageStartIndex': start + page_size,
+                        'nextPageNumber': page + 1
+                    }
+                },
+                'sortResults': {'options': []},
+                'filters': {'name': {}, 'starRating': {}, 'price': {}},
+                'pointOfSale': {'currency': {'code': 'RUB'}},
+                'miscellaneous': {'pageViewBeaconUrl': ''}
+            }
+        }
+    }
+
+
+def make_locations_search(city_name: str, destination_id: str) -> dict:
+    """Формирование ответа locations/search с одним найденным городом
+
+    Args:
+        city_name (str): имя города
+        destination_id (str): идентификатор города
+
+    Returns:
+        dict: ответ сайта
+    """
+    return {
+        'term': city_name.lower(),
+        'moresuggestions': 10,
+        'autoSuggestInstance': None,
+        'trackingID': '',
+        'misspellingfallback': False,
+        'suggestions': [
+            {
+                'group': 'CITY_GROUP',
+                'entities': [{
+                    'geoId': '1000000000000000000',
+                    'destinationId': destination_id,
+                    'landmarkCityDestinationId': None,
+                    'type': 'CITY',
+                    'redirectPage': 'DEFAULT_PAGE',
+                    'latitude': 55.75,
+                    'longitude': 37.61,
+                    'searchDetail': None,
+                    'caption': city_name,
+                    'name': city_name
+                }]
+            },
+            {'group': 'LANDMARK_GROUP', 'entities': []},
+            {'group': 'HOTEL_GROUP', 'entities': []}
+        ]
+    }
+
+
+def properties_list_bytes(page: int, **kwargs) -> bytes:
+    """Ответ properties/list в виде байтов тела ответа
+
+    Args:
+        page (int): номер страницы
+
+    Returns:
+        bytes: тело ответа
+    """
+    return dumps(
+        make_properties_list(page, **kwargs), ensure_ascii=False
+    ).encode('utf-8')
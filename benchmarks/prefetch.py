@@ -0,0 +1,188 @@
+"""Замер фонового обновления популярных поисков на локальном
+заменителе hotels4
+
+Потоки-пользователи выполняют поиски /lowprice и /highprice по городам
+с убывающей популярностью. Время свежести страниц результатов сжато
+до нескольких секунд, чтобы за время замера кэш много раз устаревал.
+Замер выполняется без обновления и с ним, выводятся процентили
+задержки поиска, доля поисков без ожидания сайта и количество запросов
+к сайту от пользователей и от обновления.
+
+Запуск из корня проекта:
+    $ python -m benchmarks.prefetch --duration 20 --ttl 3
+"""
+from argparse import ArgumentParser
+from random import Random
+from threading import Event
+from threading import Lock
+from threading import Thread
+from time import perf_counter
+from time import sleep
+from cache import SWRCache
+from hotels import HotelsClient, HotelsRequest
+from popularity import DecayingCounter
+from prefetch import Prefetcher
+from prefetch import PREFETCH_PAGES_TOTAL
+from ratelimit import RateLimiter
+from benchmarks.fakes import FakeHotelsServer
+from benchmarks.fakes import get_calls
+from benchmarks.fakes import percentile
+from benchmarks.fakes import start_in_process
+
+
+def get_prefetched() -> int:
+    """Количество запросов к сайту от фонового обновления
+
+    Returns:
+        int: загруженные и неудачные страницы
+    """
+    return int(
+        PREFETCH_PAGES_TOTAL.value('fetched') +
+        PREFETCH_PAGES_TOTAL.value('error')
+    )
+
+
+def get_cached_share(latencies: list[float], upstream: float) -> float:
+    """Доля поисков без ожидания сайта
+
+    Args:
+        latencies (list[float]): задержки поисков
+        upstream (float): задержка ответа сайта (секунды)
+
+    Returns:
+        float: доля от 0 до 1
+    """
+    # Поиск с запросом к сайту не быстрее ответа сайта
+    cached = sum(latency < upstream / 2 for latency in latencies)
+    return cached / max(len(latencies), 1)
+
+
+def run(
+    args, hotels_url: str, prefetch: bool
+) -> tuple[list[float], list[float], int, int]:
+    """Один замер
+
+    Args:
+        args: параметры замера
+        hotels_url (str): адрес заменителя hotels4
+        prefetch (bool): с фоновым обновлением
+
+    Returns:
+        tuple[list[float], list[float], int, int]: отсортированные
+            задержки всех поисков и поисков самых популярных городов,
+            запросы к сайту от пользователей и от обновления
+    """
+    # Пустые кэш и счетчики популярности для каждого замера
+    HotelsRequest.pages_cache = SWRCache(
+        maxsize=10 ** 6, ttl=args.ttl, stale_ttl=0,
+        weigh=lambda hotels: max(len(hotels), 1)
+    )
+    HotelsRequest.popularity = DecayingCounter(args.ttl * 10, 10000)
+    prefetcher = Prefetcher(
+        top_k=args.top_k, pages=2, rate=args.prefetch_rps,
+        interval=args.ttl / 3, rollover_lead=0
+    )
+    if prefetch:
+        prefetcher.start()
+    calls_before = get_calls(hotels_url)['/properties/list']
+    prefetched_before = get_prefetched()
+
+    latencies: list[float] = list()
+    hot_latencies: list[float] = list()
+    # Города, поиски по которым должны попасть в top_k (по два порядка
+    # сортировки на город)
+    hot_cities = {str(city) for city in range(1, args.top_k // 2 + 1)}
+    lock = Lock()
+    stopped = Event()
+
+    def user(seed: int) -> None:
+        rng = Random(seed)
+        while not stopped.is_set():
+            request = HotelsRequest()
+            # Популярность городов убывает, как в реальном трафике
+            request.city_id = str(int(rng.paretovariate(1.2)) % args.cities)
+            request.request_type = rng.choice(('lowprice', 'highprice'))
+            request.hotels_count = rng.randint(1, 10)
+            started = perf_counter()
+            for _ in request.iter_hotels():
+                pass
+            latency = perf_counter() - started
+            with lock:
+                latencies.append(latency)
+                if request.city_id in hot_cities:
+                    hot_latencies.append(latency)
+            sleep(rng.expovariate(1 / args.think))
+
+    users = [
+        Thread(target=user, args=(args.seed + index,), daemon=True)
+        for index in range(args.users)
+    ]
+    for thread in users:
+        thread.start()
+    sleep(args.duration)
+    stopped.set()
+    for thread in users:
+        thread.join()
+    if prefetch:
+        prefetcher.stop()
+    prefetched = get_prefetched() - prefetched_before
+    total = get_calls(hotels_url)['/properties/list'] - calls_before
+    return (
+        sorted(latencies), sorted(hot_latencies),
+        total - prefetched, prefetched
+    )
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--duration', type=float, default=20,
+                        help='длительность замера, секунды')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--think', type=float, default=0.1,
+                        help='средняя пауза между поисками, секунды')
+    parser.add_argument('--cities', type=int, default=500)
+    parser.add_argument('--ttl', type=float, default=3,
+                        help='время свежести страницы, секунды')
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument(
+        '--prefetch-rps', type=float, default=20,
+        help='запросов к hotels4 в секунду для обновления'
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0.2,
+        help='задержка ответа hotels4, секунды'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    hotels_process, hotels_url = start_in_process(
+        FakeHotelsServer, latency=args.latency, seed=args.seed
+    )
+    HotelsClient.BASE_URL = hotels_url
+    # Запросы пользователей не ограничиваются, обновление - своей частотой
+    HotelsClient.rate_limiter = RateLimiter(0)
+
+    print('{:>9} {:>8} {:>8} {:>10} {:>8} {:>8} {:>10} {:>9}'.format(
+        'prefetch', 'searches', 'cached', 'hot cached', 'p90 ms',
+        'p99 ms', 'user reqs', 'prefetch'
+    ))
+    for prefetch in (False, True):
+        latencies, hot_latencies, user_requests, prefetched = run(
+            args, hotels_url, prefetch
+        )
+        print(
+            '{:>9} {:>8} {:>8.1%} {:>10.1%} {:>8.1f} {:>8.1f} {:>10} {:>9}'
+            .format(
+                'on' if prefetch else 'off', len(latencies),
+                get_cached_share(latencies, args.latency),
+                get_cached_share(hot_latencies, args.latency),
+                percentile(latencies, 0.9) * 1000,
+                percentile(latencies, 0.99) * 1000,
+                user_requests, prefetched
+            )
+        )
+    hotels_process.terminate()
+
+
+if __name__ == '__main__':
+    main()
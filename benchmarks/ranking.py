@@ -0,0 +1,165 @@
+"""Замер ранжирования /bestdeal: прежний цикл (первые подходящие отели
+в порядке выдачи сайта с выходом на первом слишком далеком отеле)
+и колоночное ранжирование лучших отелей по цене и расстоянию
+
+Страницы ответов properties/list формируются заранее и разбираются
+один раз, замеряется только отбор отелей. Качество результата - средняя
+оценка выбранных отелей (меньше - лучше) и доля лучших отелей полной
+выдачи среди выбранных.
+
+Запуск из корня проекта:
+    $ python -m benchmarks.ranking [--pages 10] [--count 5]
+"""
+from argparse import ArgumentParser
+from math import nan
+from random import Random
+from timeit import repeat
+from hotels import Hotel, HotelsRequest
+from ranking import RankingColumns
+from benchmarks.payloads import properties_list_bytes
+
+
+def legacy_select(
+    pages: list[list[Hotel]], count: int, min_distance: float,
+    max_distance: float
+) -> tuple[list[Hotel], int]:
+    """Отбор отелей прежним циклом
+
+    Args:
+        pages (list[list[Hotel]]): страницы выдачи
+        count (int): количество отелей
+        min_distance (float): минимальное расстояние
+        max_distance (float): максимальное расстояние
+
+    Returns:
+        tuple[list[Hotel], int]: отели и количество просмотренных страниц
+    """
+    results: list[Hotel] = list()
+    for page_number, page in enumerate(pages, 1):
+        for hotel in page:
+            if hotel.price is None:
+                continue
+            if hotel.distance < min_distance:
+                continue
+            if hotel.distance > max_distance:
+                return results, page_number
+            results.append(hotel)
+            if len(results) == count:
+                return results, page_number
+    return results, len(pages)
+
+
+def ranked_select(
+    pages: list[list[Hotel]], count: int, min_price: float,
+    max_price: float, min_distance: float, max_distance: float,
+    max_pages: int
+) -> tuple[list[Hotel], int]:
+    """Отбор отелей колоночным ранжированием
+
+    Args:
+        pages (list[list[Hotel]]): страницы выдачи
+        count (int): количество отелей
+        min_price (float): минимальная цена
+        max_price (float): максимальная цена
+        min_distance (float): минимальное расстояние
+        max_distance (float): максимальное расстояние
+        max_pages (int): бюджет страниц
+
+    Returns:
+        tuple[list[Hotel], int]: отели и количество просмотренных страниц
+    """
+    columns = RankingColumns()
+    for page in pages[:max_pages]:
+        columns.extend(
+            page,
+            (nan if hotel.price is None else hotel.price for hotel in page),
+            (
+                nan if hotel.distance is None else hotel.distance
+                for hotel in page
+            )
+        )
+    return (
+        columns.top(count, min_price, max_price, min_distance, max_distance),
+        min(len(pages), max_pages)
+    )
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=10,
+                        help='страниц по 25 отелей в выдаче')
+    parser.add_argument('--count', type=int, default=5)
+    parser.add_argument('--max-pages', type=int, default=4,
+                        help='бюджет страниц ранжирования')
+    parser.add_argument('--min-price', type=int, default=3000)
+    parser.add_argument('--max-price', type=int, default=15000)
+    parser.add_argument('--min-distance', type=float, default=1.0)
+    parser.add_argument('--max-distance', type=float, default=15.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Выдача сайта по расстоянию с фильтром по цене (priceMin, priceMax),
+    # разбитая на страницы по 25 отелей
+    hotels = [
+        hotel
+        for page in range(1, args.pages * 3 + 1)
+        for hotel in HotelsRequest.parse_page(properties_list_bytes(
+            page, total=args.pages * 75, seed=7
+        ))
+        if args.min_price <= hotel.price <= args.max_price
+    ][:args.pages * 25]
+    pages = [hotels[start:start + 25] for start in range(0, len(hotels), 25)]
+    # Та же выдача не по расстоянию: сайт не гарантирует порядок
+    shuffled = list(hotels)
+    Random(0).shuffle(shuffled)
+    shuffled_pages = [
+        shuffled[start:start + 25] for start in range(0, len(shuffled), 25)
+    ]
+
+    def score(hotel: Hotel) -> float:
+        return (
+            0.5 * (hotel.price - args.min_price) /
+            (args.max_price - args.min_price) +
+            0.5 * (hotel.distance - args.min_distance) /
+            (args.max_distance - args.min_distance)
+        )
+
+    # Лучшие отели полной выдачи
+    best = ranked_select(
+        pages, args.count, args.min_price, args.max_price,
+        args.min_distance, args.max_distance, len(pages)
+    )[0]
+
+    variants = (
+        ('legacy loop', lambda source: legacy_select(
+            source, args.count, args.min_distance, args.max_distance
+        )),
+        ('ranked top-k', lambda source: ranked_select(
+            source, args.count, args.min_price, args.max_price,
+            args.min_distance, args.max_distance, args.max_pages
+        ))
+    )
+    print('{:<14} {:<10} {:>8} {:>6} {:>10} {:>10}'.format(
+        'method', 'order', 'us', 'pages', 'avg score', 'best hits'
+    ))
+    for name, select in variants:
+        for order, source in (
+            ('distance', pages), ('shuffled', shuffled_pages)
+        ):
+            seconds = min(repeat(
+                lambda: select(source), number=100, repeat=args.repeat
+            )) / 100
+            selected, pages_used = select(source)
+            print('{:<14} {:<10} {:>8.1f} {:>6} {:>10} {:>10}'.format(
+                name, order, seconds * 1e6, pages_used,
+                '{:.3f}'.format(
+                    sum(map(score, selected)) / len(selected)
+                ) if selected else '-',
+                '{}/{}'.format(
+                    sum(hotel in best for hotel in selected), len(best)
+                )
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Замер памяти на сессию при большом количестве чатов
+
+Запуск из корня проекта:
+    $ python -m benchmarks.session_memory [--chats 100000]
+"""
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Optional
+from hotels import Hotel, HotelsRequest
+from sessions import MemorySessionStore
+
+
+class DictHotelsRequest:
+    """Запрос с полями в словаре атрибутов (прежнее представление)
+    """
+
+    def __init__(self) -> None:
+        self.request_type: Optional[str] = None
+        self.city_id: Optional[int] = None
+        self.city_name: Optional[str] = None
+        self.min_price: Optional[int] = None
+        self.max_price: Optional[int] = None
+        self.min_distance: Optional[float] = None
+        self.max_distance: Optional[float] = None
+        self.hotels_count: Optional[int] = None
+
+
+class DictHotel:
+    """Отель с полями в словаре атрибутов (прежнее представление)
+    """
+
+    def __init__(
+        self, name: str, address: str, distance: float, price: int
+    ) -> None:
+        self.name = name
+        self.address = address
+        self.distance = distance
+        self.price = price
+
+
+def fill_request(request) -> None:
+    """Заполнение запроса типичными для /bestdeal значениями
+    """
+    request.request_type = 'bestdeal'
+    request.city_id = '1153093'
+    request.city_name = 'москва'
+    request.min_price = 1000
+    request.max_price = 5000
+    request.min_distance = 0.5
+    request.max_distance = 3.0
+    request.hotels_count = 5
+
+
+def measure(factory, chats: int) -> float:
+    """Замер памяти на одну сессию
+
+    Args:
+        factory: функция создания запроса
+        chats (int): количество чатов
+
+    Returns:
+        float: байт на сессию
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = MemorySessionStore(max_size=chats, idle_ttl=3600)
+    for chat_id in range(chats):
+        request = factory()
+        fill_request(request)
+        store[chat_id] = request
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(store) == chats
+    return (after - before) / chats
+
+
+def measure_hotels(factory, count: int) -> float:
+    """Замер памяти на одну запись отеля
+
+    Args:
+        factory: класс отеля
+        count (int): количество записей
+
+    Returns:
+        float: байт на запись
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    hotels = [
+        factory('Отель', 'улица', 1.5, 1000 + index)
+        for index in range(count)
+    ]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(hotels) == count
+    return (after - before) / count
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--chats', type=int, default=100000)
+    args = parser.parse_args()
+    print('chats: {}'.format(args.chats))
+    print('session, __dict__:  {:.0f} B'.format(
+        measure(DictHotelsRequest, args.chats)
+    ))
+    print('session, __slots__: {:.0f} B'.format(
+        measure(HotelsRequest, args.chats)
+    ))
+    print('hotel, __dict__:    {:.0f} B'.format(
+        measure_hotels(DictHotel, args.chats)
+    ))
+    print('hotel, __slots__:   {:.0f} B'.format(
+        measure_hotels(Hotel, args.chats)
+    ))
@@ -0,0 +1,148 @@
+"""Замер многопроцессного режима: пропускная способность в зависимости
+от количества рабочих процессов на локальных заменителях hotels4
+и телеграма
+
+Обновления всех диалогов передаются входному процессу сразу, замеряется
+время до подтверждения обработки последнего обновления. С --kill
+первый рабочий процесс останавливается посреди замера: перезапущенный
+процесс должен получить все неподтвержденные обновления.
+
+Запуск из корня проекта:
+    $ python -m benchmarks.sharding --workers 1 2 4 [--kill]
+"""
+import os
+from argparse import ArgumentParser
+from functools import partial
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from time import sleep
+from telebot import apihelper
+from bot import HotelsBot
+from hotels import HotelsClient
+from ratelimit import RateLimiter
+from sessions import SQLiteSessionStore
+from sharding import ShardFront
+from fake_telegram import make_text_update
+from benchmarks.e2e import make_dialog
+from benchmarks.fakes import FakeHotelsServer
+from benchmarks.fakes import FakeTelegramServer
+from benchmarks.fakes import get_calls
+from benchmarks.fakes import start_in_process
+
+
+def make_benchmark_bot(
+    index: int, hotels_url: str, telegram_url: str, session_db: str
+) -> HotelsBot:
+    """Создание бота рабочего процесса, подключенного к заменителям
+
+    Args:
+        index (int): номер рабочего процесса
+        hotels_url (str): адрес заменителя hotels4
+        telegram_url (str): адрес заменителя телеграма
+        session_db (str): общая база сессий: диалоги переживают
+                          перезапуск процесса
+
+    Returns:
+        HotelsBot: бот с обработчиками сообщений
+    """
+    HotelsClient.BASE_URL = hotels_url
+    apihelper.API_URL = telegram_url + '/bot{0}/{1}'
+    # Замеряется сам бот, без ограничения частоты запросов
+    HotelsBot._scheduler.global_limiter = RateLimiter(0)
+    HotelsBot._scheduler.chat_rate = 0
+    HotelsClient.rate_limiter = RateLimiter(0)
+    bot = HotelsBot(
+        '1:benchmark', threaded=False,
+        session_store=SQLiteSessionStore(
+            session_db, max_size=10 ** 6, idle_ttl=3600
+        )
+    )
+    bot.add_default_handlers()
+    return bot
+
+
+def wait_idle(front: ShardFront, timeout: float = 600) -> None:
+    """Ожидание подтверждения всех переданных обновлений
+
+    Args:
+        front (ShardFront): входной процесс
+        timeout (float, optional): максимальное время ожидания (секунды).
+                                   Defaults to 600.
+    """
+    started = perf_counter()
+    while front.pending() and perf_counter() - started < timeout:
+        sleep(0.01)
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--lanes', type=int, default=8,
+                        help='потоков обработки в рабочем процессе')
+    parser.add_argument('--dialogs', type=int, default=1000)
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help='задержка ответа hotels4, секунды'
+    )
+    parser.add_argument(
+        '--kill', action='store_true',
+        help='остановить первый рабочий процесс во время замера'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print('CPUs: {}'.format(os.cpu_count()))
+    print('{:>7} {:>6} {:>12} {:>10} {:>9}'.format(
+        'workers', 'lanes', 'dialogs/sec', 'messages', 'restarts'
+    ))
+    for workers in args.workers:
+        # Новые заменители для каждого замера: кэши процессов бота пустые
+        hotels_process, hotels_url = start_in_process(
+            FakeHotelsServer, latency=args.latency, seed=args.seed
+        )
+        telegram_process, telegram_url = start_in_process(FakeTelegramServer)
+        directory = TemporaryDirectory()
+        front = ShardFront(
+            workers, args.lanes, max_pending=10 ** 6,
+            make_bot=partial(
+                make_benchmark_bot, hotels_url=hotels_url,
+                telegram_url=telegram_url,
+                session_db=os.path.join(directory.name, 'sessions.db')
+            )
+        )
+        front.start()
+        # Прогрев: запуск процессов и импорт модулей не входят в замер
+        for chat_id in range(-100, 0):
+            front.route(make_text_update(chat_id, '/help'))
+        wait_idle(front)
+        warmup_messages = sum(get_calls(telegram_url).values())
+
+        rng = Random(args.seed)
+        dialogs = [
+            (chat_id,) + make_dialog(rng, args.cities)
+            for chat_id in range(1, args.dialogs + 1)
+        ]
+        started = perf_counter()
+        for chat_id, _, texts in dialogs:
+            for text in texts:
+                front.route(make_text_update(chat_id, text))
+        if args.kill:
+            sleep(0.5)
+            front.workers[0].process.kill()
+        wait_idle(front)
+        elapsed = perf_counter() - started
+        messages = sum(get_calls(telegram_url).values()) - warmup_messages
+        front.stop()
+        hotels_process.terminate()
+        telegram_process.terminate()
+        directory.cleanup()
+        print('{:>7} {:>6} {:>12.1f} {:>10} {:>9}'.format(
+            workers, args.lanes, args.dialogs / elapsed, messages,
+            sum(worker.restarts for worker in front.workers)
+        ))
+
+
+if __name__ == '__main__':
+    main()
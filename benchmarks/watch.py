@@ -0,0 +1,126 @@
+"""Замер проверки сохраненных поисков на локальных заменителях hotels4
+и телеграма
+
+Создает подписки чатов на поиски /lowprice, /highprice и /bestdeal
+по городам с убывающей популярностью и выполняет несколько проходов
+проверки цен. Между проходами заменитель hotels4 меняет цены отелей.
+Выводит для каждого прохода количество подписок, различных запросов,
+запросов к сайту (и сколько их было бы без группировки), подписок
+на запрос, отправленных оповещений и длительность прохода.
+
+Запуск из корня проекта:
+    $ python -m benchmarks.watch --subscriptions 10000 --cycles 3
+"""
+import os
+from argparse import ArgumentParser
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from telebot import apihelper
+from bot import HotelsBot
+from hotels import HotelsClient, HotelsRequest
+from pricewatch import PriceWatcher
+from ratelimit import RateLimiter
+from subscriptions import SubscriptionStore
+from env import BESTDEAL_MAX_PAGES
+from benchmarks.fakes import FakeHotelsServer
+from benchmarks.fakes import FakeTelegramServer
+from benchmarks.fakes import start_in_process
+
+
+def make_request(rng: Random, cities: int) -> HotelsRequest:
+    """Случайный сохраненный поиск
+
+    Args:
+        rng (Random): генератор случайных чисел
+        cities (int): количество различных городов
+
+    Returns:
+        HotelsRequest: запрос с заполненными параметрами
+    """
+    request = HotelsRequest()
+    request.request_type = rng.choice(('lowprice', 'highprice', 'bestdeal'))
+    # Популярность городов убывает, как в реальном трафике
+    city = int(rng.paretovariate(1.2)) % cities
+    request.city_id = str(city)
+    request.city_name = 'город {}'.format(city)
+    request.hotels_count = rng.randint(1, 10)
+    if request.request_type == 'bestdeal':
+        # Пользователи выбирают круглые границы цен
+        request.min_price = rng.choice((0, 1000, 3000))
+        request.max_price = rng.choice((10000, 20000, 30000))
+        request.min_distance = 0
+        request.max_distance = rng.choice((1, 3, 5))
+    return request
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--subscriptions', type=int, default=10000)
+    parser.add_argument('--chats', type=int, default=5000)
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help='задержка ответа hotels4, секунды'
+    )
+    parser.add_argument('--workers', type=int, default=8,
+                        help='одновременных запросов к hotels4')
+    parser.add_argument(
+        '--telegram-rate', type=float, default=0.0,
+        help='сообщений телеграма в секунду, 0 - без ограничения'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Цены меняются между проходами, поэтому заменитель в этом процессе
+    hotels_server = FakeHotelsServer(latency=args.latency).start()
+    telegram_process, telegram_url = start_in_process(FakeTelegramServer)
+    HotelsClient.BASE_URL = hotels_server.url
+    HotelsClient.rate_limiter = RateLimiter(0)
+    apihelper.API_URL = telegram_url + '/bot{0}/{1}'
+    HotelsBot._scheduler.global_limiter = RateLimiter(
+        args.telegram_rate, burst=HotelsBot._scheduler.workers
+    )
+    HotelsBot._scheduler.chat_rate = 0
+
+    directory = TemporaryDirectory()
+    store = SubscriptionStore(
+        os.path.join(directory.name, 'watch.db'),
+        max_per_chat=args.subscriptions
+    )
+    rng = Random(args.seed)
+    naive_requests = 0
+    for _ in range(args.subscriptions):
+        request = make_request(rng, args.cities)
+        store.add(
+            rng.randrange(args.chats), request, rng.choice((5, 10, 20))
+        )
+        naive_requests += \
+            BESTDEAL_MAX_PAGES if request.request_type == 'bestdeal' else 1
+    bot = HotelsBot('1:benchmark', threaded=False, subscriptions=store)
+    watcher = PriceWatcher(bot, store, workers=args.workers)
+
+    print('{:>5} {:>13} {:>8} {:>9} {:>9} {:>9} {:>7} {:>8}'.format(
+        'cycle', 'subscriptions', 'queries', 'requests', 'naive',
+        'ratio', 'alerts', 'seconds'
+    ))
+    for cycle in range(1, args.cycles + 1):
+        started = perf_counter()
+        subscriptions, queries, requests, alerts = watcher.run_once()
+        elapsed = perf_counter() - started
+        print(
+            '{:>5} {:>13} {:>8} {:>9} {:>9} {:>9.1f} {:>7} {:>8.2f}'.format(
+                cycle, subscriptions, queries, requests, naive_requests,
+                watcher.batching_ratio, alerts, elapsed
+            )
+        )
+        # Новые цены к следующему проходу
+        hotels_server.price_seed += 1
+    hotels_server.stop()
+    telegram_process.terminate()
+    directory.cleanup()
+
+
+if __name__ == '__main__':
+    main()
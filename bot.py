@@ -1,7 +1,221 @@
+import logging
+from typing import Callable
 from typing import Optional
+from concurrent.futures import Future
+from functools import partial
+from math import isfinite
+from time import monotonic
+from time import perf_counter
 from telebot import TeleBot
+from telebot.apihelper import ApiException
+from telebot.types import CallbackQuery
+from telebot.types import InlineKeyboardButton
+from telebot.types import InlineKeyboardMarkup
 from telebot.types import Message
-from hotels import HotelsRequest
+from hotels import Hotel, HotelsRequest
+from sessions import SessionStore, MemorySessionStore
+from subscriptions import SubscriptionStore
+from cache import TTLCache
+from env import SESSION_MAX_SIZE, SESSION_IDLE_TTL
+from env import STREAM_EDIT_INTERVAL, METRICS_TRACE
+from env import RESULT_SET_TTL
+from env import TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE
+from env import TELEGRAM_CHAT_BURST, TELEGRAM_SEND_WORKERS
+from env import WATCH_MIN_DROP
+from metrics import timed, traced
+from metrics import STAGE_SECONDS
+from ratelimit import TelegramScheduler
+from ratelimit import PRIORITY_RESULTS, PRIORITY_DIALOG, PRIORITY_HELP
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_distance(text: str) -> float:
+    """Разбор расстояния в километрах (можно с запятой)
+
+    Args:
+        text (str): расстояние
+
+    Returns:
+        float: расстояние
+    """
+    return float(text.replace(',', '.'))
+
+
+def is_number(text: str) -> bool:
+    """Проверка, что слово - число (можно с запятой)
+
+    Args:
+        text (str): слово
+
+    Returns:
+        bool: True - число
+    """
+    try:
+        return isfinite(parse_distance(text))
+    except ValueError:
+        return False
+
+
+class ResultSet:
+    """Результат поиска чата, сохраненный для листания страниц
+    """
+
+    __slots__ = ('message_id', 'request', 'hotels', 'bounds', 'page')
+
+    def __init__(
+        self, message_id: int, request: HotelsRequest, hotels: list[Hotel],
+        bounds: list[tuple[int, int]]
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            message_id (int): сообщение с результатами
+            request (HotelsRequest): запрос, результаты которого выводятся
+            hotels (list[Hotel]): найденные отели
+            bounds (list[tuple[int, int]]): границы страниц в списке отелей
+        """
+        self.message_id: int = message_id
+        self.request: HotelsRequest = request
+        self.hotels: list[Hotel] = hotels
+        self.bounds: list[tuple[int, int]] = bounds
+        # Показанная страница
+        self.page: int = 0
+
+
+class ResultStream:
+    """Постепенный вывод результатов поиска в чат
+
+    Первые найденные отели отправляются сразу, следующие добавляются
+    редактированием того же сообщения не чаще одного раза
+    за STREAM_EDIT_INTERVAL секунд, пока не заполнится первая страница.
+    После окончания поиска к сообщению добавляются кнопки листания
+    страниц, если отелей больше, чем помещается на одну страницу
+    """
+
+    def __init__(
+        self, bot: 'HotelsBot', message: Message, request: HotelsRequest
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            bot (HotelsBot): объект телеграм бота
+            message (Message): сообщение к боту, на которое дается ответ
+            request (HotelsRequest): запрос, результаты которого выводятся
+        """
+        self.bot: HotelsBot = bot
+        self.chat_id: int = message.chat.id
+        self.request: HotelsRequest = request
+        self.per_page: int = request.hotels_count or HotelsRequest.MAX_CITIES
+        self.hotels: list[Hotel] = list()
+        self.failed: bool = False
+        self._started: float = monotonic()
+        self._message_id: Optional[int] = None
+        self._last_edit: float = 0
+        self._shown_text: str = ''
+
+    def _first_page(self) -> str:
+        """Текст первой страницы из найденных к этому моменту отелей
+
+        Returns:
+            str: текст страницы
+        """
+        hotels = self.hotels[:self.per_page]
+        start, end = self.request.get_result_pages(hotels, self.per_page)[0]
+        return self.request._get_result_str(hotels[start:end])
+
+    def add(self, hotels: Optional[list[Hotel]]) -> None:
+        """Добавление очередной порции отелей
+
+        Args:
+            hotels (Optional[list[Hotel]]): найденные отели,
+                                            None - ошибка поиска
+        """
+        if hotels is None:
+            self.failed = True
+            return
+        self.hotels.extend(hotels)
+        if not self.hotels:
+            return
+        if self._message_id is None:
+            self._shown_text = self._first_page()
+            self._message_id = self.bot.send_message(
+                self.chat_id,
+                self._shown_text,
+                parse_mode='MarkdownV2',
+                priority=PRIORITY_RESULTS,
+                wait=True
+            ).message_id
+            self._last_edit = monotonic()
+            logger.info(
+                'Время до первого результата в чате %s: %.3f с',
+                self.chat_id, self._last_edit - self._started
+            )
+        elif monotonic() - self._last_edit >= STREAM_EDIT_INTERVAL:
+            self._update(self._first_page())
+
+    def _update(
+        self, text: str, keyboard: Optional[InlineKeyboardMarkup] = None
+    ) -> None:
+        """Редактирование отправленного сообщения, если изменился текст
+            или добавляются кнопки
+
+        Args:
+            text (str): текст сообщения
+            keyboard (Optional[InlineKeyboardMarkup], optional): кнопки
+                листания страниц. Defaults to None.
+        """
+        if text == self._shown_text and keyboard is None:
+            return
+        try:
+            self.bot.edit_message_text(
+                text,
+                chat_id=self.chat_id,
+                message_id=self._message_id,
+                parse_mode='MarkdownV2',
+                reply_markup=keyboard,
+                priority=PRIORITY_RESULTS,
+                # Правки одного сообщения выполняются по порядку
+                wait=True
+            )
+        except ApiException:
+            logger.exception('Ошибка обновления результатов поиска')
+            return
+        self._last_edit = monotonic()
+        self._shown_text = text
+
+    def finish(self) -> None:
+        """Завершение вывода: последнее обновление сообщения с кнопками
+            листания страниц или сообщение об ошибке либо пустом результате
+        """
+        if self._message_id is not None:
+            bounds = self.request.get_result_pages(self.hotels, self.per_page)
+            keyboard = None
+            if len(bounds) > 1:
+                keyboard = self.bot.remember_results(
+                    self.chat_id,
+                    ResultSet(
+                        self._message_id, self.request, self.hotels, bounds
+                    )
+                )
+            start, end = bounds[0]
+            self._update(
+                self.request._get_result_str(self.hotels[start:end]),
+                keyboard
+            )
+        if self.failed:
+            self.bot.send_message(
+                self.chat_id,
+                'Упс. Что-то пошло не так, попробуйте снова',
+                priority=PRIORITY_RESULTS
+            )
+        elif not self.hotels:
+            self.bot.send_message(
+                self.chat_id,
+                'Ничего не найдено, сделай запрос помягче',
+                priority=PRIORITY_RESULTS
+            )
 
 
 class HotelsBot(TeleBot):
@@ -24,10 +238,311 @@ class HotelsBot(TeleBot):
         '/help - вывести справку по командам\r\n' + \
         '/lowprice - самые дешевые отели \r\n' + \
         '/highprice - самые дорогие отели\r\n' + \
-        '/bestdeal - самые дешевые отели, но ближе всего к центру'
+        '/bestdeal - самые дешевые отели, но ближе всего к центру\r\n' + \
+        '/watch [процент] - следить за ценами последнего поиска\r\n' + \
+        '/watchlist - сохраненные поиски\r\n' + \
+        '\r\nПараметры можно указать сразу в команде:\r\n' + \
+        '/lowprice <город> <количество отелей>\r\n' + \
+        '/bestdeal <город> <мин. цена> <макс. цена> <мин. расстояние> ' + \
+        '<макс. расстояние> <количество отелей>'
+
+    # Команды без параметров: текст сообщения -> обработчик
+    _text_commands = {
+        'Привет': '_hello',
+        '/start': '_start',
+        '/help': '_help'
+    }
+    # Команды сохраненных поисков: команда -> обработчик
+    _watch_commands = {
+        'watch': '_watch',
+        'watchlist': '_watchlist'
+    }
+    # Параметры поиска: поле запроса -> (обработчик шага диалога, вопрос,
+    # функция разбора значения, текст ошибки)
+    _parameters = {
+        'city_id': ('_get_city_name', 'В каком городе ищешь?', None, None),
+        'min_price': (
+            '_get_min_price', 'Какая минимальная цена (целое число)?',
+            int, 'Неправильно указана минимальная цена'
+        ),
+        'max_price': (
+            '_get_max_price', 'Какая максимальная цена (целое число)?',
+            int, 'Неправильно указана максимальная цена'
+        ),
+        'min_distance': (
+            '_get_min_distance',
+            'Какое минимальное расстояние до центра в километрах ' +
+            '(можно с запятой)?',
+            parse_distance,
+            'Неправильно указана минимальная дистанция'
+        ),
+        'max_distance': (
+            '_get_max_distance',
+            'Какое максимальное расстояние до центра в километрах ' +
+            '(можно с запятой)?',
+            parse_distance,
+            'Неправильно указана максимальная дистанция'
+        ),
+        'hotels_count': (
+            '_get_hotels_count', 'Сколько отелей ты хочешь найти?',
+            None, None
+        )
+    }
+    # Команды поиска: тип поиска -> параметры в порядке строки команды
+    # и вопросов диалога
+    _search_commands = {
+        'lowprice': ('city_id', 'hotels_count'),
+        'highprice': ('city_id', 'hotels_count'),
+        'bestdeal': (
+            'city_id', 'min_price', 'max_price',
+            'min_distance', 'max_distance', 'hotels_count'
+        )
+    }
+
+    # Хранилище запросов пользователя
+    _users_cookies: SessionStore = MemorySessionStore(
+        max_size=SESSION_MAX_SIZE,
+        idle_ttl=SESSION_IDLE_TTL
+    )
+    # Класс запроса к сайту, создаваемого для нового поиска
+    _request_class = HotelsRequest
+    # Префикс данных кнопок выбора города: city:<destinationId>
+    _city_callback = 'city:'
+    # Префикс данных кнопок листания результатов: page:<номер страницы>
+    _page_callback = 'page:'
+    # Префикс данных кнопок удаления подписки: unwatch:<номер подписки>
+    _unwatch_callback = 'unwatch:'
+    # Сохраненные поиски, None - слежение за ценами не настроено
+    subscriptions: Optional[SubscriptionStore] = None
+    # Результаты последнего поиска чатов для листания страниц
+    _result_sets = TTLCache(maxsize=SESSION_MAX_SIZE, ttl=RESULT_SET_TTL)
+    # Общая очередь исходящих вызовов API телеграма
+    _scheduler = TelegramScheduler(
+        global_rate=TELEGRAM_GLOBAL_RATE,
+        chat_rate=TELEGRAM_CHAT_RATE,
+        chat_burst=TELEGRAM_CHAT_BURST,
+        workers=TELEGRAM_SEND_WORKERS
+    )
+
+    def __init__(
+        self, token: str, *args,
+        session_store: Optional[SessionStore] = None,
+        subscriptions: Optional[SubscriptionStore] = None, **kwargs
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            token (str): токен телеграм бота
+            session_store (Optional[SessionStore], optional): хранилище
+                запросов пользователей вместо общего хранилища в памяти.
+                Defaults to None.
+            subscriptions (Optional[SubscriptionStore], optional):
+                хранилище сохраненных поисков. Defaults to None.
+        """
+        super().__init__(token, *args, **kwargs)
+        if session_store is not None:
+            self._users_cookies = session_store
+        if subscriptions is not None:
+            self.subscriptions = subscriptions
+
+    def add_default_handlers(self) -> None:
+        """Направление всех текстовых сообщений к боту на разбор команды,
+            нажатий кнопок - на разбор нажатия
+        """
+        self.message_handler(
+            func=lambda message: True, content_types=['text']
+        )(self.parse_command)
+        self.callback_query_handler(
+            func=lambda call: True
+        )(self.parse_callback)
+
+    def _remember_step(self, chat_id: int, step: Optional[str]) -> None:
+        """Сохранение имени следующего шага диалога в сессии чата
+
+        Args:
+            chat_id (int): идентификатор чата
+            step (Optional[str]): имя обработчика шага, None - диалог
+                                  завершен
+        """
+        request = self._users_cookies.get(chat_id)
+        if request is not None:
+            request.step = step
+            self._users_cookies.save(chat_id)
+
+    def register_next_step_handler(
+        self, message: Message, callback: Callable, *args, **kwargs
+    ) -> None:
+        """Регистрация следующего шага диалога с сохранением шага в сессии
+
+        Args:
+            message (Message): объект-сообщение к боту
+            callback (Callable): обработчик следующего сообщения чата
+        """
+        self._remember_step(message.chat.id, callback.__name__)
+        super().register_next_step_handler(
+            message, self._resume_step, callback.__name__
+        )
+
+    def _clear_step(self, chat_id: int) -> None:
+        """Отмена ожидания следующего шага диалога чата
+
+        Args:
+            chat_id (int): идентификатор чата
+        """
+        self.clear_step_handler_by_chat_id(chat_id)
+        self._remember_step(chat_id, None)
+
+    def _resume_step(self, message: Message, step: str) -> None:
+        """Выполнение сохраненного шага диалога
+
+        Args:
+            message (Message): объект-сообщение к боту
+            step (str): имя обработчика шага
+        """
+        if message.chat.id not in self._users_cookies:
+            self.send_message(
+                message.chat.id,
+                'Поиск устарел, начни его заново'
+            )
+            return
+        self._remember_step(message.chat.id, None)
+        request_type = self._get_request_type(message.chat.id)
+        with traced(METRICS_TRACE, message.chat.id, step, request_type), \
+                timed(step.lstrip('_'), request_type):
+            getattr(self, step)(message)
+
+    def _get_request_type(self, chat_id: int) -> Optional[str]:
+        """Тип команды текущего поиска чата для метрик
+
+        Args:
+            chat_id (int): идентификатор чата
+
+        Returns:
+            Optional[str]: тип команды, None - поиска нет
+        """
+        request = self._users_cookies.get(chat_id)
+        return None if request is None else request.request_type
+
+    def _schedule(
+        self, stage: str, chat_id: int, priority: int, wait: bool,
+        func: Callable, /, *args, **kwargs
+    ):
+        """Вызов API телеграма через очередь исходящих вызовов с замером
+            длительности
+
+        Без ожидания поток обработчика не задерживается, пока чат
+        исчерпал свой лимит сообщений, а ошибка вызова только пишется
+        в лог
+
+        Args:
+            stage (str): этап для метрик
+            chat_id (int): идентификатор чата
+            priority (int): приоритет в очереди
+            wait (bool): ожидать выполнения вызова
+            func (Callable): вызов API
+
+        Returns:
+            результат вызова при ожидании, иначе Future
+        """
+        request_type = self._get_request_type(chat_id)
+        if wait:
+            with timed(stage, request_type):
+                return self._scheduler.call(
+                    chat_id, priority, func, *args, **kwargs
+                )
+        started = perf_counter()
+        future = self._scheduler.submit(
+            chat_id, priority, func, *args, **kwargs
+        )
+        future.add_done_callback(
+            partial(self._on_scheduled_done, stage, request_type, started)
+        )
+        return future
+
+    @staticmethod
+    def _on_scheduled_done(
+        stage: str, request_type: Optional[str], started: float,
+        future: Future
+    ) -> None:
+        """Учет завершения вызова API телеграма без ожидания
+
+        Args:
+            stage (str): этап для метрик
+            request_type (Optional[str]): тип команды
+            started (float): момент постановки в очередь (perf_counter)
+            future (Future): результат вызова
+        """
+        STAGE_SECONDS.observe(
+            perf_counter() - started, stage, request_type or ''
+        )
+        error = future.exception()
+        if error is not None:
+            logger.error('Ошибка вызова API телеграма (%s): %s', stage, error)
+
+    def send_message(
+        self, chat_id: int, text: str, *args,
+        priority: int = PRIORITY_DIALOG, wait: bool = False, **kwargs
+    ):
+        """Отправка сообщения через очередь исходящих вызовов
+
+        Args:
+            chat_id (int): идентификатор чата
+            text (str): текст сообщения
+            priority (int, optional): приоритет в очереди.
+                                      Defaults to PRIORITY_DIALOG.
+            wait (bool, optional): ожидать отправки, например, чтобы
+                                   получить номер сообщения.
+                                   Defaults to False.
+
+        Returns:
+            отправленное сообщение при ожидании, иначе Future
+        """
+        return self._schedule(
+            'send', chat_id, priority, wait, super().send_message,
+            chat_id, text, *args, **kwargs
+        )
+
+    def submit_message(
+        self, chat_id: int, text: str, *args,
+        priority: int = PRIORITY_DIALOG, **kwargs
+    ) -> Future:
+        """Постановка сообщения в очередь исходящих вызовов без ожидания
+            отправки (рассылка многим чатам)
+
+        Args:
+            chat_id (int): идентификатор чата
+            text (str): текст сообщения
+            priority (int, optional): приоритет в очереди.
+                                      Defaults to PRIORITY_DIALOG.
+
+        Returns:
+            Future: результат отправки
+        """
+        return self._scheduler.submit(
+            chat_id, priority, super().send_message,
+            chat_id, text, *args, **kwargs
+        )
+
+    def edit_message_text(
+        self, text: str, *args, priority: int = PRIORITY_DIALOG,
+        wait: bool = False, **kwargs
+    ):
+        """Редактирование сообщения через очередь исходящих вызовов
+
+        Args:
+            text (str): новый текст сообщения
+            priority (int, optional): приоритет в очереди.
+                                      Defaults to PRIORITY_DIALOG.
+            wait (bool, optional): ожидать редактирования.
+                                   Defaults to False.
 
-    # Словарь для хранения запросов пользователя
-    _users_cookies: dict[int, HotelsRequest] = dict()
+        Returns:
+            результат редактирования при ожидании, иначе Future
+        """
+        return self._schedule(
+            'edit', kwargs.get('chat_id'), priority, wait,
+            super().edit_message_text, text, *args, **kwargs
+        )
 
     # Шаги по получению информации от пользователя для формирования запроса
     def _get_city_name(self, message: Message) -> None:
@@ -39,6 +554,22 @@ class HotelsBot(TeleBot):
         # Проверка имени города на реальность
         isCityExists: Optional[bool] = \
             self._users_cookies[message.chat.id].is_city_exists(message.text)
+        self._on_city_checked(message, isCityExists)
+
+    def _on_city_checked(
+        self, message: Message, isCityExists: Optional[bool],
+        city_name: Optional[str] = None
+    ) -> None:
+        """Ответ по результату проверки имени города и переход к следующему
+            шагу
+
+        Args:
+            message (Message): объект-сообщение к боту
+            isCityExists (Optional[bool]): результат проверки имени города
+            city_name (Optional[str], optional): проверенное имя города,
+                                                 None - текст сообщения.
+                                                 Defaults to None.
+        """
         if isCityExists is None:
             self.send_message(
                 message.chat.id,
@@ -46,24 +577,176 @@ class HotelsBot(TeleBot):
             )
             return
         if not isCityExists:
+            self._suggest_cities(message, city_name or message.text)
+            return
+        self._continue_dialog(message)
+
+    def _continue_dialog(self, message: Message) -> None:
+        """Вопрос о первом не указанном параметре поиска или сам поиск,
+            если указаны все параметры команды
+
+        Args:
+            message (Message): объект-сообщение к боту
+        """
+        request = self._users_cookies[message.chat.id]
+        for field in self._search_commands[request.request_type]:
+            if getattr(request, field) is None:
+                step, question = self._parameters[field][:2]
+                self.send_message(message.chat.id, question)
+                self.register_next_step_handler(message, getattr(self, step))
+                return
+        self._run_search(message)
+
+    def _run_search(self, message: Message) -> None:
+        """Поиск отелей с выводом результата в бота по мере получения
+            страниц
+
+        Args:
+            message (Message): объект-сообщение к боту
+        """
+        request = self._users_cookies[message.chat.id]
+        stream = ResultStream(self, message, request)
+        for hotels in request.iter_hotels():
+            stream.add(hotels)
+        stream.finish()
+
+    def _suggest_cities(self, message: Message, city_name: str) -> None:
+        """Ответ на несуществующее имя города: похожие известные города
+            кнопками и ожидание выбора или повторного ввода имени
+
+        Args:
+            message (Message): объект-сообщение к боту
+            city_name (str): введенное имя города
+        """
+        cities = self._users_cookies[message.chat.id].suggest_cities(
+            city_name
+        )
+        if not cities:
             self.send_message(
                 message.chat.id,
                 'Города с таким именем не существует'
             )
             return
-        # Определяем следущих шаг бота
-        if self._users_cookies[message.chat.id].request_type == 'bestdeal':
-            self.send_message(
-                message.chat.id,
-                'Какая минимальная цена (целое число)?'
+        keyboard = InlineKeyboardMarkup(row_width=1)
+        keyboard.add(*(
+            InlineKeyboardButton(
+                name, callback_data=self._city_callback + destination_id
             )
-            self.register_next_step_handler(message, self._get_min_price)
-        else:
-            self.send_message(
-                message.chat.id,
-                'Сколько отелей ты хочешь найти?'
+            for destination_id, name in cities
+        ))
+        self.send_message(
+            message.chat.id,
+            'Города с таким именем не существует. Может быть, ' +
+            'ты имел в виду один из этих? Или напиши имя еще раз',
+            reply_markup=keyboard
+        )
+        self.register_next_step_handler(message, self._get_city_name)
+
+    def _choose_city(self, call: CallbackQuery, destination_id: str) -> None:
+        """Выбор города нажатием кнопки с предложенным городом
+
+        Args:
+            call (CallbackQuery): нажатие кнопки
+            destination_id (str): идентификатор выбранного города
+        """
+        chat_id = call.message.chat.id
+        request = self._users_cookies.get(chat_id)
+        if (
+            request is None or request.step != '_get_city_name' or
+            not request.choose_city(destination_id)
+        ):
+            self.answer_callback_query(
+                call.id, 'Поиск устарел, начни его заново'
+            )
+            return
+        self.answer_callback_query(call.id)
+        self._clear_step(chat_id)
+        with traced(
+            METRICS_TRACE, chat_id, '_choose_city', request.request_type
+        ), timed('choose_city', request.request_type):
+            self._on_city_checked(call.message, True)
+
+    def remember_results(
+        self, chat_id: int, result_set: ResultSet
+    ) -> InlineKeyboardMarkup:
+        """Сохранение результата поиска чата для листания страниц
+
+        Args:
+            chat_id (int): идентификатор чата
+            result_set (ResultSet): результат поиска
+
+        Returns:
+            InlineKeyboardMarkup: кнопки листания для первой страницы
+        """
+        self._result_sets.set(chat_id, result_set)
+        return self._get_page_keyboard(0, len(result_set.bounds))
+
+    def _get_page_keyboard(
+        self, page: int, page_count: int
+    ) -> InlineKeyboardMarkup:
+        """Кнопки листания страниц результата
+
+        Args:
+            page (int): номер показанной страницы (с нуля)
+            page_count (int): количество страниц
+
+        Returns:
+            InlineKeyboardMarkup: кнопки
+        """
+        buttons: list[InlineKeyboardButton] = list()
+        if page > 0:
+            buttons.append(InlineKeyboardButton(
+                '◀ Назад', callback_data=self._page_callback + str(page - 1)
+            ))
+        buttons.append(InlineKeyboardButton(
+            '{}/{}'.format(page + 1, page_count),
+            callback_data=self._page_callback + str(page)
+        ))
+        if page < page_count - 1:
+            buttons.append(InlineKeyboardButton(
+                'Вперед ▶', callback_data=self._page_callback + str(page + 1)
+            ))
+        keyboard = InlineKeyboardMarkup()
+        keyboard.row(*buttons)
+        return keyboard
+
+    def _show_result_page(self, call: CallbackQuery, page: str) -> None:
+        """Показ страницы сохраненного результата поиска без запросов
+            к сайту
+
+        Args:
+            call (CallbackQuery): нажатие кнопки
+            page (str): номер страницы (с нуля)
+        """
+        chat_id = call.message.chat.id
+        result_set: Optional[ResultSet] = self._result_sets.get(chat_id)
+        if (
+            result_set is None or
+            result_set.message_id != call.message.message_id or
+            not page.isdigit() or int(page) >= len(result_set.bounds)
+        ):
+            self.answer_callback_query(
+                call.id, 'Результаты устарели, начни поиск заново'
+            )
+            return
+        self.answer_callback_query(call.id)
+        if int(page) == result_set.page:
+            return
+        result_set.page = int(page)
+        start, end = result_set.bounds[result_set.page]
+        with timed('result_page', result_set.request.request_type):
+            self.edit_message_text(
+                result_set.request._get_result_str(
+                    result_set.hotels[start:end]
+                ),
+                chat_id=chat_id,
+                message_id=result_set.message_id,
+                parse_mode='MarkdownV2',
+                reply_markup=self._get_page_keyboard(
+                    result_set.page, len(result_set.bounds)
+                ),
+                priority=PRIORITY_RESULTS
             )
-            self.register_next_step_handler(message, self._get_hotels_count)
 
     def _get_min_price(self, message: Message) -> None:
         """Получение значения минимальной стоимости для фильтрации из сообщения к боту
@@ -71,20 +754,7 @@ class HotelsBot(TeleBot):
         Args:
             message (Message): объект-сообщение к боту
         """
-        try:
-            self._users_cookies[message.chat.id].min_price = int(message.text)
-        except ValueError:
-            self.send_message(
-                message.chat.id,
-                'Неправильно указана минимальная цена'
-            )
-            return
-        self.send_message(
-            message.chat.id,
-            'Какая максимальная цена (целое число)?'
-        )
-        # Следующий шаг
-        self.register_next_step_handler(message, self._get_max_price)
+        self._read_parameter(message, 'min_price')
 
     def _get_max_price(self, message: Message) -> None:
         """Получение значения максимальной стоимости для фильтрации из сообщения к боту
@@ -92,21 +762,7 @@ class HotelsBot(TeleBot):
         Args:
             message (Message): объект-сообщение к боту
         """
-        try:
-            self._users_cookies[message.chat.id].max_price = int(message.text)
-        except ValueError:
-            self.send_message(
-                message.chat.id,
-                'Неправильно указана максимальная цена'
-            )
-            return
-        self.send_message(
-            message.chat.id,
-            'Какое минимальное расстояние до центра в километрах ' +
-            '(можно с запятой)?'
-        )
-        # Следующий шаг
-        self.register_next_step_handler(message, self._get_min_distance)
+        self._read_parameter(message, 'max_price')
 
     def _get_min_distance(self, message: Message) -> None:
         """Получение значения минимальной дистанции до центра
@@ -115,23 +771,7 @@ class HotelsBot(TeleBot):
         Args:
             message (Message): объект-сообщение к боту
         """
-        try:
-            distance_str = message.text.replace(',', '.')
-            self._users_cookies[message.chat.id].min_distance = \
-                float(distance_str)
-        except ValueError:
-            self.send_message(
-                message.chat.id,
-                'Неправильно указана минимальная дистанция'
-            )
-            return
-        self.send_message(
-            message.chat.id,
-            'Какое максимальное расстояние до центра в километрах ' +
-            '(можно с запятой)?'
-        )
-        # Следующий шаг
-        self.register_next_step_handler(message, self._get_max_distance)
+        self._read_parameter(message, 'min_distance')
 
     def _get_max_distance(self, message: Message) -> None:
         """Получение значения максимальной дистанции до центра
@@ -140,22 +780,7 @@ class HotelsBot(TeleBot):
         Args:
             message (Message): объект-сообщение к боту
         """
-        try:
-            distance_str = message.text.replace(',', '.')
-            self._users_cookies[message.chat.id].max_distance = \
-                float(distance_str)
-        except ValueError:
-            self.send_message(
-                message.chat.id,
-                'Неправильно указана максимальная дистанция'
-            )
-            return
-        self.send_message(
-            message.chat.id,
-            'Сколько отелей ты хочешь найти?'
-        )
-        # Следующий шаг
-        self.register_next_step_handler(message, self._get_hotels_count)
+        self._read_parameter(message, 'max_distance')
 
     def _get_hotels_count(self, message: Message) -> None:
         """Получение количества отелей для поиска для фильтрации из сообщения к боту
@@ -163,44 +788,71 @@ class HotelsBot(TeleBot):
         Args:
             message (Message): объект-сообщение к боту
         """
+        self._read_parameter(message, 'hotels_count')
+
+    def _read_parameter(self, message: Message, field: str) -> None:
+        """Сохранение параметра поиска из ответа на вопрос и переход
+            к следующему шагу
+
+        Args:
+            message (Message): объект-сообщение к боту
+            field (str): поле запроса
+        """
+        self._set_parameter(message.chat.id, field, message.text)
+        self._users_cookies.save(message.chat.id)
+        # При ошибке тот же вопрос задается снова
+        self._continue_dialog(message)
+
+    def _set_parameter(self, chat_id: int, field: str, text: str) -> bool:
+        """Разбор значения параметра поиска и сохранение его в запрос
+
+        Args:
+            chat_id (int): идентификатор чата
+            field (str): поле запроса
+            text (str): значение параметра от пользователя
+
+        Returns:
+            bool: True - значение сохранено
+        """
+        if field == 'hotels_count':
+            self._set_hotels_count(chat_id, text)
+            return True
+        parse, error_text = self._parameters[field][2:]
+        try:
+            value = parse(text)
+        except ValueError:
+            self.send_message(chat_id, error_text)
+            return False
+        setattr(self._users_cookies[chat_id], field, value)
+        return True
+
+    def _set_hotels_count(self, chat_id: int, text: str) -> None:
+        """Сохранение количества отелей из сообщения к боту в запрос
+
+        Args:
+            chat_id (int): идентификатор чата
+            text (str): количество отелей от пользователя
+        """
         try:
             # Проверяем на соответствие максимальному значению отелей в поиске
-            if int(message.text) > HotelsRequest.MAX_CITIES:
-                self._users_cookies[message.chat.id].hotels_count = \
+            if int(text) > HotelsRequest.MAX_CITIES:
+                self._users_cookies[chat_id].hotels_count = \
                     HotelsRequest.MAX_CITIES
                 self.send_message(
-                    message.chat.id,
-                    'Ты указал слишком много отелей, найду 10, больше не могу'
+                    chat_id,
+                    'Ты указал слишком много отелей, покажу по 10 ' +
+                    'на странице'
                 )
             else:
-                self._users_cookies[message.chat.id].hotels_count =\
-                    int(message.text)
+                self._users_cookies[chat_id].hotels_count = int(text)
         except ValueError:
             self.send_message(
-                message.chat.id,
-                'Неверное количество отелей, найду максимально, 10 штук'
+                chat_id,
+                'Неверное количество отелей, покажу по 10 на странице'
             )
-            self._users_cookies[message.chat.id].hotels_count = \
+            self._users_cookies[chat_id].hotels_count = \
                 HotelsRequest.MAX_CITIES
-        # Выполняем поис отелей и выводим результат в бота
-        responce_text = self._users_cookies[message.chat.id].get_responce()
-        if responce_text is None:
-            self.send_message(
-                message.chat.id,
-                'Упс. Что-то пошло не так, попробуйте снова'
-            )
-            return
-        if responce_text == '':
-            self.send_message(
-                message.chat.id,
-                'Ничего не найдено, сделай запрос помягче'
-            )
-            return
-        self.send_message(
-            message.chat.id,
-            responce_text,
-            parse_mode='Markdown'
-        )
+        self._users_cookies.save(chat_id)
 
     def _hello(self, chat_id: int) -> None:
         """Ответ на запрос "Привет"
@@ -213,7 +865,7 @@ class HotelsBot(TeleBot):
             self._commands_title,
             self._commands_help
         )
-        self.send_message(chat_id, responce_text)
+        self.send_message(chat_id, responce_text, priority=PRIORITY_HELP)
 
     def _start(self, chat_id: int) -> None:
         """Ответ на команду /start
@@ -226,7 +878,7 @@ class HotelsBot(TeleBot):
             self._commands_title,
             self._commands_help
         )
-        self.send_message(chat_id, responce_text)
+        self.send_message(chat_id, responce_text, priority=PRIORITY_HELP)
 
     def _help(self, chat_id: int) -> None:
         """Ответ на команду /help
@@ -238,7 +890,7 @@ class HotelsBot(TeleBot):
             self._commands_title,
             self._commands_help
         )
-        self.send_message(chat_id, responce_text)
+        self.send_message(chat_id, responce_text, priority=PRIORITY_HELP)
 
     def _unknown(self, chat_id: int) -> None:
         """Ответ на неизвестную команду
@@ -251,33 +903,281 @@ class HotelsBot(TeleBot):
                 self._commands_title,
                 self._commands_help
             )
-        self.send_message(chat_id, responce_text)
+        self.send_message(chat_id, responce_text, priority=PRIORITY_HELP)
+
+    def _get_saved_step(self, chat_id: int) -> Optional[str]:
+        """Получение сохраненного в сессии шага диалога
+
+        Args:
+            chat_id (int): идентификатор чата
+
+        Returns:
+            Optional[str]: имя обработчика шага, None - нет диалога
+        """
+        request = self._users_cookies.get(chat_id)
+        return None if request is None else request.step
 
     def parse_command(self, message: Message) -> None:
         """Разбор полученнго сообщение, поиск команды
 
+        Команды поиска принимают параметры в той же строке:
+        /bestdeal Москва 1000 5000 0,5 3 5 - поиск сразу, без диалога,
+        о не указанных параметрах бот спрашивает по очереди
+
         Args:
             message (Message): объект-сообщение к боту
         """
-        if message.text == 'Привет':
-            self._hello(message.chat.id)
-        elif message.text == '/start':
-            self._start(message.chat.id)
-        elif message.text == '/help':
-            self._help(message.chat.id)
-        elif (
-            message.text == '/lowprice' or
-            message.text == '/highprice' or
-            message.text == '/bestdeal'
-        ):
-            # Удаляем историю предыдущего поиска
-            if message.chat.id in self._users_cookies:
-                del self._users_cookies[message.chat.id]
-            # Создаем новую историю поиска
-            self._users_cookies[message.chat.id] = HotelsRequest()
-            self._users_cookies[message.chat.id].request_type = \
-                message.text[1:]
-            self.send_message(message.chat.id, 'В каком городе ищешь?')
-            self.register_next_step_handler(message, self._get_city_name)
+        command, *arguments = message.text.split() or ('',)
+        # Команда в группе может быть с именем бота: /bestdeal@bot
+        request_type = command.partition('@')[0][1:]
+        if message.text in self._text_commands:
+            getattr(self, self._text_commands[message.text])(message.chat.id)
+        elif command.startswith('/') and request_type in self._search_commands:
+            self._start_search(message, request_type, arguments)
+        elif command.startswith('/') and request_type in self._watch_commands:
+            getattr(self, self._watch_commands[request_type])(
+                message, arguments
+            )
+        elif self._get_saved_step(message.chat.id) is not None:
+            # Продолжаем диалог, начатый до перезапуска бота
+            self._resume_step(message, self._get_saved_step(message.chat.id))
         else:
             self._unknown(message.chat.id)
+
+    def _start_search(
+        self, message: Message, request_type: str, arguments: list[str]
+    ) -> None:
+        """Начало нового поиска с параметрами из строки команды
+
+        Args:
+            message (Message): объект-сообщение к боту
+            request_type (str): тип поиска
+            arguments (list[str]): слова строки команды после самой команды
+        """
+        city_name = self._new_search(message, request_type, arguments)
+        if not city_name:
+            self._continue_dialog(message)
+            return
+        self._on_city_checked(
+            message,
+            self._users_cookies[message.chat.id].is_city_exists(city_name),
+            city_name
+        )
+
+    def _new_search(
+        self, message: Message, request_type: str, arguments: list[str]
+    ) -> str:
+        """Создание запроса чата и заполнение его параметрами из строки
+            команды, кроме города
+
+        Args:
+            message (Message): объект-сообщение к боту
+            request_type (str): тип поиска
+            arguments (list[str]): слова строки команды после самой команды
+
+        Returns:
+            str: имя города для проверки, пустая строка - город не указан
+        """
+        chat_id = message.chat.id
+        # Удаляем историю предыдущего поиска
+        self._users_cookies.delete(chat_id)
+        # Создаем новую историю поиска
+        request = self._request_class()
+        request.request_type = request_type
+        self._users_cookies[chat_id] = request
+        fields = self._search_commands[request_type][1:]
+        city_name, values = self._split_arguments(arguments, len(fields))
+        for field, text in zip(fields, values):
+            self._set_parameter(chat_id, field, text)
+        self._users_cookies.save(chat_id)
+        return city_name
+
+    @staticmethod
+    def _split_arguments(
+        arguments: list[str], count: int
+    ) -> tuple[str, list[str]]:
+        """Разделение слов строки команды на имя города (может быть
+            из нескольких слов) и значения остальных параметров
+
+        Параметры - числа в конце строки, но не больше count, остальные
+        слова - имя города (в нем тоже могут быть числа)
+
+        Args:
+            arguments (list[str]): слова строки команды
+            count (int): количество параметров после города
+
+        Returns:
+            tuple[str, list[str]]: имя города и значения параметров
+        """
+        position = len(arguments)
+        while (
+            position > 0 and len(arguments) - position < count and
+            is_number(arguments[position - 1])
+        ):
+            position -= 1
+        return ' '.join(arguments[:position]), arguments[position:]
+
+    def parse_callback(self, call: CallbackQuery) -> None:
+        """Разбор нажатия кнопки под сообщением бота
+
+        Args:
+            call (CallbackQuery): нажатие кнопки
+        """
+        if call.data and call.data.startswith(self._city_callback):
+            self._choose_city(call, call.data[len(self._city_callback):])
+        elif call.data and call.data.startswith(self._page_callback):
+            self._show_result_page(call, call.data[len(self._page_callback):])
+        elif call.data and call.data.startswith(self._unwatch_callback):
+            self._unwatch(call, call.data[len(self._unwatch_callback):])
+        else:
+            self.answer_callback_query(call.id)
+
+    @classmethod
+    def describe_search(cls, request: HotelsRequest) -> str:
+        """Краткое описание параметров поиска
+
+        Args:
+            request (HotelsRequest): запрос
+
+        Returns:
+            str: команда, город и параметры, например
+                 /lowprice Москва, отелей: 5
+        """
+        text = '/{} {}'.format(
+            request.request_type, (request.city_name or '').title()
+        )
+        if request.request_type == 'bestdeal':
+            text += ', {}-{} руб., {}-{} км'.format(
+                request.min_price, request.max_price,
+                request.min_distance, request.max_distance
+            )
+        return text + ', отелей: {}'.format(
+            request.hotels_count or HotelsRequest.MAX_CITIES
+        )
+
+    def _watch(self, message: Message, arguments: list[str]) -> None:
+        """Ответ на команду /watch: сохранение последнего поиска чата
+            для слежения за ценами
+
+        Args:
+            message (Message): объект-сообщение к боту
+            arguments (list[str]): снижение цены в процентах, о котором
+                                   сообщать (необязательно)
+        """
+        chat_id = message.chat.id
+        if self.subscriptions is None:
+            self.send_message(chat_id, 'Слежение за ценами не настроено')
+            return
+        request = self._users_cookies.get(chat_id)
+        if (
+            request is None or request.step is not None or
+            request.request_type not in self._search_commands or
+            any(
+                getattr(request, field) is None
+                for field in self._search_commands[request.request_type]
+            )
+        ):
+            self.send_message(
+                chat_id,
+                'Сначала выполни поиск, за ценами которого нужно следить'
+            )
+            return
+        min_drop = WATCH_MIN_DROP
+        if arguments:
+            try:
+                min_drop = float(arguments[0].rstrip('%').replace(',', '.'))
+            except ValueError:
+                min_drop = 0
+            if not 0 < min_drop < 100:
+                self.send_message(
+                    chat_id,
+                    'Неправильно указано снижение цены, нужен процент ' +
+                    'от 0 до 100'
+                )
+                return
+        subscription_id = self.subscriptions.add(chat_id, request, min_drop)
+        if subscription_id is None:
+            self.send_message(
+                chat_id,
+                (
+                    'Можно сохранить не больше {} поисков, удали ' +
+                    'ненужные: /watchlist'
+                ).format(self.subscriptions.max_per_chat)
+            )
+            return
+        self.send_message(
+            chat_id,
+            (
+                'Слежу за ценами: {}\r\nСообщу, если цена отеля ' +
+                'снизится на {:g}% и больше'
+            ).format(self.describe_search(request), min_drop)
+        )
+
+    def _get_watchlist(
+        self, chat_id: int
+    ) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+        """Список сохраненных поисков чата с кнопками удаления
+
+        Args:
+            chat_id (int): идентификатор чата
+
+        Returns:
+            tuple[str, Optional[InlineKeyboardMarkup]]: текст и кнопки
+        """
+        subscriptions = self.subscriptions.get_chat(chat_id)
+        if not subscriptions:
+            return 'Сохраненных поисков нет', None
+        keyboard = InlineKeyboardMarkup(row_width=5)
+        keyboard.add(*(
+            InlineKeyboardButton(
+                '✖ {}'.format(number),
+                callback_data=self._unwatch_callback +
+                str(subscription.subscription_id)
+            )
+            for number, subscription in enumerate(subscriptions, 1)
+        ))
+        return '\r\n'.join(
+            '{}. {}, снижение от {:g}%'.format(
+                number, self.describe_search(subscription.request),
+                subscription.min_drop
+            )
+            for number, subscription in enumerate(subscriptions, 1)
+        ), keyboard
+
+    def _watchlist(self, message: Message, arguments: list[str]) -> None:
+        """Ответ на команду /watchlist: сохраненные поиски чата
+
+        Args:
+            message (Message): объект-сообщение к боту
+            arguments (list[str]): не используются
+        """
+        if self.subscriptions is None:
+            self.send_message(
+                message.chat.id, 'Слежение за ценами не настроено'
+            )
+            return
+        text, keyboard = self._get_watchlist(message.chat.id)
+        self.send_message(message.chat.id, text, reply_markup=keyboard)
+
+    def _unwatch(self, call: CallbackQuery, subscription_id: str) -> None:
+        """Удаление сохраненного поиска нажатием кнопки в списке
+
+        Args:
+            call (CallbackQuery): нажатие кнопки
+            subscription_id (str): номер подписки
+        """
+        chat_id = call.message.chat.id
+        if (
+            self.subscriptions is None or not subscription_id.isdigit() or
+            not self.subscriptions.remove(chat_id, int(subscription_id))
+        ):
+            self.answer_callback_query(call.id, 'Поиск уже удален')
+            return
+        self.answer_callback_query(call.id, 'Поиск удален')
+        text, keyboard = self._get_watchlist(chat_id)
+        self.edit_message_text(
+            text,
+            chat_id=chat_id,
+            message_id=call.message.message_id,
+            reply_markup=keyboard
+        )
@@ -0,0 +1,280 @@
+from typing import Any
+from typing import Callable
+from typing import Hashable
+from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+
+
+class TTLCache:
+    """Потокобезопасный кэш с ограничением по количеству записей (LRU)
+        и временем жизни записей (TTL), общий для всех чатов
+    """
+
+    def __init__(
+        self, maxsize: int, ttl: float,
+        weigh: Optional[Callable[[Any], int]] = None
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            maxsize (int): максимальный суммарный вес записей в кэше
+            ttl (float): время жизни записи по умолчанию (секунды)
+            weigh (Optional[Callable[[Any], int]], optional): функция
+                веса значения, без нее вес каждой записи равен 1 и
+                maxsize ограничивает количество записей. Defaults to None.
+        """
+        self.maxsize: int = maxsize
+        self.ttl: float = ttl
+        self._weigh: Optional[Callable[[Any], int]] = weigh
+        # Ключ -> (время истечения, значение, вес),
+        # порядок - от давно использованных к недавним
+        self._data: OrderedDict[Hashable, tuple[float, Any, int]] = \
+            OrderedDict()
+        self._weight: int = 0
+        self._lock = Lock()
+        # Счетчики попаданий, промахов и вытеснений
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Получение значения из кэша
+
+        Args:
+            key (Hashable): ключ записи
+            default (Any, optional): значение при отсутствии записи
+                                     или истечении ее времени жизни.
+                                     Defaults to None.
+
+        Returns:
+            Any: значение из кэша или default
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires, value, weight = item
+            if expires <= monotonic():
+                del self._data[key]
+                self._weight -= weight
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self, key: Hashable, value: Any, ttl: Optional[float] = None
+    ) -> None:
+        """Сохранение значения в кэш
+
+        Args:
+            key (Hashable): ключ записи
+            value (Any): значение
+            ttl (Optional[float], optional): время жизни записи, если
+                                             отличается от общего.
+                                             Defaults to None.
+        """
+        expires = monotonic() + (self.ttl if ttl is None else ttl)
+        weight = 1 if self._weigh is None else self._weigh(value)
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._weight -= previous[2]
+            self._data[key] = (expires, value, weight)
+            self._weight += weight
+            # Вытесняем самые давно использованные записи
+            while self._weight > self.maxsize and len(self._data) > 1:
+                _, (_, _, evicted_weight) = self._data.popitem(last=False)
+                self._weight -= evicted_weight
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удаление записи из кэша
+
+        Args:
+            key (Hashable): ключ записи
+            default (Any, optional): значение при отсутствии записи.
+                                     Defaults to None.
+
+        Returns:
+            Any: удаленное значение или default
+        """
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self._weight -= item[2]
+        return item[1]
+
+    def clear(self) -> None:
+        """Очистка кэша и счетчиков
+        """
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def prune(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Удаление записей, ключи которых удовлетворяют условию
+
+        Args:
+            predicate (Callable[[Hashable], bool]): условие для ключа
+
+        Returns:
+            int: количество удаленных записей
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self._weight -= self._data.pop(key)[2]
+        return len(keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Проверка наличия действующей записи без учета в счетчиках
+
+        Args:
+            key (Hashable): ключ записи
+
+        Returns:
+            bool: True - запись есть и ее время жизни не истекло
+        """
+        item = self._data.get(key)
+        return item is not None and item[0] > monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SWRCache(TTLCache):
+    """Кэш с отдачей устаревших значений на время фонового обновления
+        (stale-while-revalidate)
+    """
+
+    def __init__(
+        self, maxsize: int, ttl: float, stale_ttl: float,
+        weigh: Optional[Callable[[Any], int]] = None,
+        max_workers: int = 2, error_ttl: float = 0
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            maxsize (int): максимальный суммарный вес записей в кэше
+            ttl (float): время, в течение которого значение свежее
+            stale_ttl (float): время после устаревания, в течение которого
+                               значение еще отдается, пока идет обновление
+            weigh (Optional[Callable[[Any], int]], optional): функция
+                веса значения. Defaults to None.
+            max_workers (int, optional): количество потоков фонового
+                                         обновления. Defaults to 2.
+            error_ttl (float, optional): время после stale_ttl, в течение
+                которого значение отдается, только если загрузка нового
+                не удалась (stale-if-error). Defaults to 0.
+        """
+        super().__init__(
+            maxsize=maxsize,
+            ttl=ttl + stale_ttl + error_ttl,
+            weigh=None if weigh is None else lambda item: weigh(item[1])
+        )
+        self.fresh_ttl: float = ttl
+        self.stale_ttl: float = stale_ttl
+        self.stale_hits: int = 0
+        # Отдачи устаревших значений при ошибке загрузки
+        self.error_hits: int = 0
+        self._refreshing: set[Hashable] = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='cache-refresh'
+        )
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Сохранение свежего значения в кэш
+
+        Args:
+            key (Hashable): ключ записи
+            value (Any): значение
+        """
+        self.set(key, (monotonic() + self.fresh_ttl, value))
+
+    def fresh_for(self, key: Hashable) -> float:
+        """Оставшееся время свежести значения без учета в счетчиках
+
+        Args:
+            key (Hashable): ключ записи
+
+        Returns:
+            float: секунды до устаревания, 0 - значения нет
+                   или оно устарело
+        """
+        item = self._data.get(key)
+        if item is None:
+            return 0
+        return max(item[1][0] - monotonic(), 0)
+
+    def get_or_load(
+        self, key: Hashable, loader: Callable[[], Optional[Any]]
+    ) -> Optional[Any]:
+        """Получение значения из кэша или через функцию загрузки
+
+        Устаревшее значение отдается сразу, а обновление запускается
+        в фоне. Результат None функции загрузки считается ошибкой
+        и в кэш не сохраняется. Значение старше stale_ttl загружается
+        заново и отдается, только если загрузка не удалась.
+
+        Args:
+            key (Hashable): ключ записи
+            loader (Callable[[], Optional[Any]]): функция загрузки значения
+
+        Returns:
+            Optional[Any]: значение или None при ошибке загрузки
+        """
+        item = self.get(key)
+        if item is None:
+            value = loader()
+            if value is not None:
+                self.put(key, value)
+            return value
+        fresh_until, value = item
+        now = monotonic()
+        if fresh_until + self.stale_ttl <= now:
+            loaded = loader()
+            if loaded is not None:
+                self.put(key, loaded)
+                return loaded
+            self.error_hits += 1
+        elif fresh_until <= now:
+            self.stale_hits += 1
+            self._revalidate(key, loader)
+        return value
+
+    def _revalidate(
+        self, key: Hashable, loader: Callable[[], Optional[Any]]
+    ) -> None:
+        """Запуск фонового обновления записи, если оно еще не запущено
+
+        Args:
+            key (Hashable): ключ записи
+            loader (Callable[[], Optional[Any]]): функция загрузки значения
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._executor.submit(self._refresh, key, loader)
+
+    def _refresh(
+        self, key: Hashable, loader: Callable[[], Optional[Any]]
+    ) -> None:
+        try:
+            value = loader()
+            if value is not None:
+                self.put(key, value)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
@@ -0,0 +1,425 @@
+import atexit
+import csv
+import gzip
+import os
+from typing import Iterable
+from typing import Optional
+from argparse import ArgumentParser
+from bisect import bisect_left
+from bisect import insort
+from json import load
+from threading import Lock
+from threading import Thread
+
+
+# Метка формата в первой строке файла индекса
+FORMAT_HEADER = '# hotels-city-index 1'
+
+
+def normalize_name(name: str) -> str:
+    """Приведение имени города к ключу индекса
+
+    Args:
+        name (str): имя города
+
+    Returns:
+        str: имя в нижнем регистре без лишних пробелов
+    """
+    return ' '.join(name.lower().split())
+
+
+def get_trigrams(name: str) -> set[str]:
+    """Триграммы имени с границами слова
+
+    Args:
+        name (str): нормализованное имя
+
+    Returns:
+        set[str]: триграммы
+    """
+    padded = '  {} '.format(name)
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def edit_distance(first: str, second: str, limit: int) -> int:
+    """Расстояние Дамерау-Левенштейна (перестановка соседних букв -
+        одна опечатка) с отсечением по пределу
+
+    Args:
+        first (str): первая строка
+        second (str): вторая строка
+        limit (int): расстояния больше предела не различаются
+
+    Returns:
+        int: расстояние, limit + 1 - если больше предела
+    """
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    # Считаются только клетки не дальше limit от диагонали,
+    # остальные заведомо больше предела
+    over = limit + 1
+    size = len(second) + 1
+    before_previous = [over] * size
+    previous = [column if column <= limit else over for column in range(size)]
+    for row in range(1, len(first) + 1):
+        first_char = first[row - 1]
+        current = [over] * size
+        if row <= limit:
+            current[0] = row
+        best = current[0]
+        for column in range(
+            max(1, row - limit), min(size - 1, row + limit) + 1
+        ):
+            second_char = second[column - 1]
+            distance = previous[column - 1]
+            if first_char != second_char:
+                distance += 1
+                if previous[column] < distance:
+                    distance = previous[column] + 1
+                if current[column - 1] < distance:
+                    distance = current[column - 1] + 1
+                if (
+                    row > 1 and column > 1 and
+                    first_char == second[column - 2] and
+                    first[row - 2] == second_char and
+                    before_previous[column - 2] < distance
+                ):
+                    distance = before_previous[column - 2] + 1
+            if distance < best:
+                best = distance
+            current[column] = distance
+        if best > limit:
+            return over
+        before_previous, previous = previous, current
+    return min(previous[-1], over)
+
+
+class CityIndex:
+    """Локальный индекс городов сайта hotels.com: точный поиск по имени
+        и destinationId без запроса к сайту, поиск по началу имени
+        (отсортированный список имен) и нечеткий поиск при опечатках
+        (триграммы с проверкой расстоянием Левенштейна)
+
+    Города добавляются из файла-справочника и из ответов
+    locations/search. Файл индекса - текст в gzip, строка на город:
+    destinationId<TAB>имя[<TAB>другое имя...]
+    """
+
+    def __init__(self) -> None:
+        # Имена городов: нормализованное имя -> (destinationId, имя)
+        self._by_name: dict[str, tuple[str, str]] = dict()
+        # Основное имя города: destinationId -> имя
+        self._by_id: dict[str, str] = dict()
+        # Отсортированные нормализованные имена для поиска по началу
+        self._sorted: list[str] = list()
+        # (триграмма, длина имени) -> нормализованные имена
+        # (строится при первом нечетком поиске)
+        self._trigrams: Optional[dict[tuple[str, int], list[str]]] = None
+        self._lock = Lock()
+        # Есть города, не сохраненные в файл
+        self.dirty: bool = False
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, name: str) -> bool:
+        return normalize_name(name) in self._by_name
+
+    def lookup(self, name: str) -> Optional[tuple[str, str]]:
+        """Поиск города по точному имени
+
+        Args:
+            name (str): имя города
+
+        Returns:
+            Optional[tuple[str, str]]: destinationId и нормализованное имя,
+                                       None - город не найден
+        """
+        city = self._by_name.get(normalize_name(name))
+        if city is None:
+            return None
+        return city[0], normalize_name(city[1])
+
+    def get_name(self, destination_id: str) -> Optional[str]:
+        """Основное имя города по destinationId
+
+        Args:
+            destination_id (str): идентификатор города
+
+        Returns:
+            Optional[str]: имя города, None - город не найден
+        """
+        return self._by_id.get(destination_id)
+
+    def add(
+        self, destination_id: str, name: str,
+        aliases: Iterable[str] = ()
+    ) -> bool:
+        """Добавление города в индекс
+
+        Args:
+            destination_id (str): идентификатор города
+            name (str): основное имя города
+            aliases (Iterable[str], optional): другие имена города.
+                                               Defaults to ().
+
+        Returns:
+            bool: True - в индексе появились новые имена
+        """
+        destination_id = str(destination_id)
+        added = False
+        with self._lock:
+            self._by_id.setdefault(destination_id, name)
+            for alias in (name, *aliases):
+                key = normalize_name(alias)
+                if not key or key in self._by_name:
+                    continue
+                self._by_name[key] = (destination_id, name)
+                insort(self._sorted, key)
+                if self._trigrams is not None:
+                    for trigram in get_trigrams(key):
+                        self._trigrams.setdefault(
+                            (trigram, len(key)), []
+                        ).append(key)
+                added = True
+            self.dirty = self.dirty or added
+        return added
+
+    def add_search_response(self, response: dict) -> int:
+        """Добавление городов из ответа locations/search
+
+        Args:
+            response (dict): разобранный ответ сайта
+
+        Returns:
+            int: количество добавленных городов
+        """
+        added = 0
+        for group in response.get('suggestions') or ():
+            if group.get('group') != 'CITY_GROUP':
+                continue
+            for city in group.get('entities') or ():
+                if city.get('destinationId') and city.get('name'):
+                    added += self.add(city['destinationId'], city['name'])
+        return added
+
+    def complete(self, prefix: str, limit: int) -> list[tuple[str, str]]:
+        """Поиск городов по началу имени
+
+        Args:
+            prefix (str): начало имени
+            limit (int): максимальное количество городов
+
+        Returns:
+            list[tuple[str, str]]: destinationId и имя города
+        """
+        prefix = normalize_name(prefix)
+        result: list[tuple[str, str]] = list()
+        if not prefix:
+            return result
+        with self._lock:
+            position = bisect_left(self._sorted, prefix)
+            while (
+                position < len(self._sorted) and len(result) < limit and
+                self._sorted[position].startswith(prefix)
+            ):
+                city = self._by_name[self._sorted[position]]
+                if city not in result:
+                    result.append(city)
+                position += 1
+        return result
+
+    def build_trigrams(self) -> None:
+        """Построение триграммного индекса для нечеткого поиска
+        """
+        with self._lock:
+            if self._trigrams is not None:
+                return
+            trigrams: dict[tuple[str, int], list[str]] = dict()
+            for key in self._sorted:
+                length = len(key)
+                for trigram in get_trigrams(key):
+                    trigrams.setdefault((trigram, length), []).append(key)
+            self._trigrams = trigrams
+
+    def suggest(self, name: str, limit: int) -> list[tuple[str, str]]:
+        """Подбор городов с похожими именами: сначала города, имя которых
+            начинается с введенного, затем ближайшие по расстоянию
+            Левенштейна
+
+        Args:
+            name (str): введенное имя
+            limit (int): максимальное количество городов
+
+        Returns:
+            list[tuple[str, str]]: destinationId и имя города
+        """
+        key = normalize_name(name)
+        if not key:
+            return list()
+        result = self.complete(key, limit)
+        self.build_trigrams()
+        # Допустимое количество опечаток растет с длиной имени
+        max_distance = max(1, len(key) // 4)
+        lengths = range(
+            len(key) - max_distance, len(key) + max_distance + 1
+        )
+        # Опечатка меняет не больше четырех триграмм (перестановка букв),
+        # поэтому имя на допустимом расстоянии содержит хотя бы одну
+        # из 4 * max_distance + 1 любых триграмм введенного имени - берем
+        # самые редкие среди имен подходящей длины
+        candidates: set[str] = set()
+        with self._lock:
+            postings = sorted(
+                (
+                    [
+                        self._trigrams[(trigram, length)]
+                        for length in lengths
+                        if (trigram, length) in self._trigrams
+                    ]
+                    for trigram in get_trigrams(key)
+                ),
+                key=lambda lists: sum(map(len, lists))
+            )
+            for lists in postings[:4 * max_distance + 1]:
+                for posting in lists:
+                    candidates.update(posting)
+        scored = list()
+        for candidate in candidates:
+            distance = edit_distance(key, candidate, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, candidate))
+        for _, candidate in sorted(scored):
+            if len(result) >= limit:
+                break
+            city = self._by_name[candidate]
+            if city not in result:
+                result.append(city)
+        return result
+
+    def load(self, path: str) -> int:
+        """Загрузка городов из файла индекса
+
+        Args:
+            path (str): путь к файлу
+
+        Returns:
+            int: количество загруженных городов
+        """
+        by_name: dict[str, tuple[str, str]] = dict()
+        by_id: dict[str, str] = dict()
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            header = file.readline().rstrip('\n')
+            if header != FORMAT_HEADER:
+                raise ValueError('Неизвестный формат индекса городов')
+            for line in file:
+                if not line.strip():
+                    continue
+                destination_id, name, *aliases = line.rstrip('\n').split('\t')
+                by_id[destination_id] = name
+                city = (destination_id, name)
+                for alias in (name, *aliases):
+                    by_name.setdefault(normalize_name(alias), city)
+        with self._lock:
+            by_name.update(self._by_name)
+            by_id.update(self._by_id)
+            self._by_name = by_name
+            self._by_id = by_id
+            self._sorted = sorted(by_name)
+            self._trigrams = None
+        return len(by_id)
+
+    def save(self, path: str) -> None:
+        """Сохранение индекса в файл (с заменой файла целиком)
+
+        Args:
+            path (str): путь к файлу
+        """
+        with self._lock:
+            names: dict[str, list[str]] = {
+                destination_id: [name]
+                for destination_id, name in self._by_id.items()
+            }
+            for key, (destination_id, name) in self._by_name.items():
+                if key != normalize_name(name):
+                    names[destination_id].append(key)
+            self.dirty = False
+        temp_path = path + '.tmp'
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as file:
+            file.write(FORMAT_HEADER + '\n')
+            for destination_id in sorted(names):
+                file.write('\t'.join([destination_id] + names[destination_id]))
+                file.write('\n')
+        os.replace(temp_path, path)
+
+    def start(self, path: Optional[str] = None) -> 'CityIndex':
+        """Загрузка индекса из файла, сохранение найденных на сайте городов
+            в файл при завершении процесса и построение индекса нечеткого
+            поиска в фоне
+
+        Перед сохранением файл загружается заново, поэтому города,
+        сохраненные другими процессами, не теряются
+
+        Args:
+            path (Optional[str], optional): путь к файлу индекса,
+                                            None - без файла.
+                                            Defaults to None.
+
+        Returns:
+            CityIndex: этот же объект
+        """
+        if path:
+            if os.path.exists(path):
+                self.load(path)
+
+            def save() -> None:
+                if self.dirty:
+                    if os.path.exists(path):
+                        self.load(path)
+                    self.save(path)
+
+            atexit.register(save)
+        Thread(target=self.build_trigrams, daemon=True).start()
+        return self
+
+    def import_gazetteer(self, path: str) -> int:
+        """Импорт городов из файла-справочника в формате CSV
+            (destinationId,имя[,другое имя...]), строки с # пропускаются
+
+        Args:
+            path (str): путь к файлу
+
+        Returns:
+            int: количество добавленных городов
+        """
+        added = 0
+        with open(path, newline='', encoding='utf-8') as file:
+            for row in csv.reader(file):
+                if len(row) < 2 or row[0].startswith('#'):
+                    continue
+                added += self.add(row[0].strip(), row[1].strip(), row[2:])
+        return added
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(
+        description='Сборка индекса городов из справочников ' +
+                    'и сохраненных ответов locations/search'
+    )
+    parser.add_argument('index', help='файл индекса (дополняется)')
+    parser.add_argument('--gazetteer', nargs='*', default=[],
+                        help='справочники городов в формате CSV')
+    parser.add_argument('--responses', nargs='*', default=[],
+                        help='сохраненные ответы locations/search (JSON)')
+    args = parser.parse_args()
+
+    index = CityIndex()
+    if os.path.exists(args.index):
+        index.load(args.index)
+    for gazetteer_path in args.gazetteer:
+        index.import_gazetteer(gazetteer_path)
+    for response_path in args.responses:
+        with open(response_path, encoding='utf-8') as response_file:
+            index.add_search_response(load(response_file))
+    index.save(args.index)
+    print('Городов в индексе: {}'.format(len(index)))
@@ -12,3 +12,152 @@ load_dotenv(dotenv_path=env_path)
 BOT_TOKEN = getenv('BOT_TOKEN')
 HOTELS_KEY = getenv('HOTELS_KEY')
 HOTELS_HOST = getenv('HOTELS_HOST')
+# Адреса API (можно заменить на локальные заменители для замеров):
+# адрес API hotels.com и шаблон адреса API телеграма вида
+# http://host:port/bot{0}/{1}, где {0} - токен, {1} - метод
+HOTELS_BASE_URL = getenv('HOTELS_BASE_URL', 'https://hotels4.p.rapidapi.com')
+TELEGRAM_API_URL = getenv('TELEGRAM_API_URL')
+
+# Параметры HTTP-клиента к API hotels.com
+# Таймауты установки соединения и чтения ответа (секунды)
+HOTELS_CONNECT_TIMEOUT = float(getenv('HOTELS_CONNECT_TIMEOUT', '3.05'))
+HOTELS_READ_TIMEOUT = float(getenv('HOTELS_READ_TIMEOUT', '10'))
+# Размер пула соединений (количество пулов и соединений в пуле,
+# 0 - по количеству потоков, выполняющих запросы)
+HOTELS_POOL_CONNECTIONS = int(getenv('HOTELS_POOL_CONNECTIONS', '4'))
+HOTELS_POOL_MAXSIZE = int(getenv('HOTELS_POOL_MAXSIZE', '0'))
+# Бюджет повторных запросов при ответах 429/5xx и множитель задержки
+HOTELS_MAX_RETRIES = int(getenv('HOTELS_MAX_RETRIES', '2'))
+HOTELS_BACKOFF_FACTOR = float(getenv('HOTELS_BACKOFF_FACTOR', '0.3'))
+# Дублирование медленных запросов: процентиль задержек последних ответов
+# (0 - без дублирования), после которого отправляется дублирующий запрос,
+# минимальная задержка (секунды) и количество учитываемых ответов
+HOTELS_HEDGE_PERCENTILE = float(getenv('HOTELS_HEDGE_PERCENTILE', '0.95'))
+HOTELS_HEDGE_MIN_DELAY = float(getenv('HOTELS_HEDGE_MIN_DELAY', '0.05'))
+HOTELS_HEDGE_WINDOW = int(getenv('HOTELS_HEDGE_WINDOW', '200'))
+# Автомат защиты: доля ошибок среди последних запросов, при которой
+# запросы к сайту прекращаются (0 - автомат отключен), количество
+# учитываемых запросов и пауза до пробного запроса (секунды)
+HOTELS_BREAKER_ERROR_RATE = float(getenv('HOTELS_BREAKER_ERROR_RATE', '0.5'))
+HOTELS_BREAKER_WINDOW = int(getenv('HOTELS_BREAKER_WINDOW', '20'))
+HOTELS_BREAKER_COOLDOWN = float(getenv('HOTELS_BREAKER_COOLDOWN', '30'))
+
+# Кэш поиска городов: размер, время жизни найденных
+# и ненайденных городов (секунды)
+CITY_CACHE_SIZE = int(getenv('CITY_CACHE_SIZE', '5000'))
+CITY_CACHE_TTL = float(getenv('CITY_CACHE_TTL', '86400'))
+CITY_NEGATIVE_TTL = float(getenv('CITY_NEGATIVE_TTL', '600'))
+
+# Кэш страниц результатов поиска: максимальное количество отелей в кэше,
+# время свежести страницы, время отдачи устаревшей страницы на время
+# обновления и время отдачи ее только при ошибке сайта (секунды)
+RESULTS_CACHE_SIZE = int(getenv('RESULTS_CACHE_SIZE', '50000'))
+RESULTS_CACHE_TTL = float(getenv('RESULTS_CACHE_TTL', '900'))
+RESULTS_STALE_TTL = float(getenv('RESULTS_STALE_TTL', '3600'))
+RESULTS_STALE_IF_ERROR = float(getenv('RESULTS_STALE_IF_ERROR', '21600'))
+
+# Количество одновременно загружаемых страниц для /bestdeal
+# и размер общего пула потоков загрузки страниц
+PAGES_PREFETCH = int(getenv('PAGES_PREFETCH', '3'))
+PAGES_WORKERS = int(getenv('PAGES_WORKERS', '16'))
+
+# Асинхронный режим бота: максимальное количество одновременных запросов
+# к сайту и количество потоков для вызовов API телеграма
+ASYNC_UPSTREAM_LIMIT = int(getenv('ASYNC_UPSTREAM_LIMIT', '32'))
+ASYNC_TELEGRAM_WORKERS = int(getenv('ASYNC_TELEGRAM_WORKERS', '16'))
+
+# Режим вебхука: адрес и порт локального сервера, публичный адрес
+# вебхука, секретный токен, количество рабочих потоков и размер очереди
+WEBHOOK_HOST = getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_URL = getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = getenv('WEBHOOK_SECRET')
+WEBHOOK_WORKERS = int(getenv('WEBHOOK_WORKERS', '4'))
+WEBHOOK_QUEUE_SIZE = int(getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+
+# Хранилище сессий пользователей: максимальное количество сессий,
+# время неактивности до удаления сессии (секунды) и путь к базе SQLite
+# (если не задан, сессии хранятся только в памяти)
+SESSION_MAX_SIZE = int(getenv('SESSION_MAX_SIZE', '100000'))
+SESSION_IDLE_TTL = float(getenv('SESSION_IDLE_TTL', '3600'))
+SESSION_DB = getenv('SESSION_DB')
+
+# Минимальный интервал между обновлениями сообщения с результатами
+# поиска (секунды)
+STREAM_EDIT_INTERVAL = float(getenv('STREAM_EDIT_INTERVAL', '1.5'))
+
+# Метрики: адрес и порт HTTP-сервера выгрузки метрик в формате Prometheus
+# (0 - сервер не запускается) и вывод трассировки шагов диалогов в лог
+METRICS_HOST = getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(getenv('METRICS_PORT', '0'))
+METRICS_TRACE = getenv('METRICS_TRACE', '').lower() in ('1', 'true', 'yes')
+
+# Максимальное время ожидания такого же запроса к сайту, выполняемого
+# для другого чата (секунды)
+COALESCE_TIMEOUT = float(getenv('COALESCE_TIMEOUT', '30'))
+
+# Ограничение частоты исходящих запросов: сообщений телеграма в секунду
+# по всем чатам и в один чат, сообщений в чат подряд без ожидания,
+# количество потоков отправки; запросов к сайту в секунду (0 - без
+# ограничения) и запросов к сайту подряд без ожидания
+TELEGRAM_GLOBAL_RATE = float(getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_CHAT_BURST = int(getenv('TELEGRAM_CHAT_BURST', '3'))
+TELEGRAM_SEND_WORKERS = int(getenv('TELEGRAM_SEND_WORKERS', '4'))
+HOTELS_RPS = float(getenv('HOTELS_RPS', '5'))
+HOTELS_BURST = int(getenv('HOTELS_BURST', '5'))
+
+# Локальный индекс городов: путь к файлу индекса (если не задан, индекс
+# пополняется только в памяти), количество предлагаемых похожих городов
+# и проверка городов только по индексу, без запросов к сайту
+CITY_INDEX = getenv('CITY_INDEX')
+CITY_SUGGESTIONS = int(getenv('CITY_SUGGESTIONS', '5'))
+CITY_INDEX_STRICT = getenv('CITY_INDEX_STRICT', '').lower() in (
+    '1', 'true', 'yes'
+)
+
+# Ранжирование /bestdeal: максимальное количество загружаемых страниц
+# и вес цены в оценке отеля (вес расстояния до центра - 1 - вес цены)
+BESTDEAL_MAX_PAGES = int(getenv('BESTDEAL_MAX_PAGES', '4'))
+BESTDEAL_PRICE_WEIGHT = float(getenv('BESTDEAL_PRICE_WEIGHT', '0.5'))
+
+# Постраничный вывод результатов поиска: количество отелей, собираемых
+# за один поиск, и время хранения результатов для листания (секунды)
+RESULT_SET_SIZE = int(getenv('RESULT_SET_SIZE', '25'))
+RESULT_SET_TTL = float(getenv('RESULT_SET_TTL', '3600'))
+
+# Многопроцессный режим (sharding.py): количество рабочих процессов,
+# потоков обработки в процессе и максимальное количество обновлений,
+# отправленных процессу, но еще не обработанных
+SHARD_WORKERS = int(getenv('SHARD_WORKERS', '4'))
+SHARD_LANES = int(getenv('SHARD_LANES', '8'))
+SHARD_MAX_PENDING = int(getenv('SHARD_MAX_PENDING', '1000'))
+# Общий для процессов машины кэш городов и страниц результатов: путь
+# к файлу базы SQLite (если не задан, у каждого процесса только свои
+# кэши) и максимальное количество записей
+SHARED_CACHE_DB = getenv('SHARED_CACHE_DB')
+SHARED_CACHE_SIZE = int(getenv('SHARED_CACHE_SIZE', '100000'))
+
+# Фоновое обновление популярных поисков /lowprice и /highprice:
+# количество обновляемых поисков (0 - обновление отключено), страниц
+# результатов на поиск, доля квоты запросов к сайту, интервал проверки
+# (секунды), время уменьшения популярности вдвое (секунды), максимальное
+# количество отслеживаемых поисков и время до полуночи, с которого
+# загружаются страницы следующего дня (секунды)
+PREFETCH_TOP_K = int(getenv('PREFETCH_TOP_K', '20'))
+PREFETCH_PAGES = int(getenv('PREFETCH_PAGES', '2'))
+PREFETCH_QUOTA_SHARE = float(getenv('PREFETCH_QUOTA_SHARE', '0.2'))
+PREFETCH_INTERVAL = float(getenv('PREFETCH_INTERVAL', '60'))
+PREFETCH_HALF_LIFE = float(getenv('PREFETCH_HALF_LIFE', '3600'))
+PREFETCH_MAX_TRACKED = int(getenv('PREFETCH_MAX_TRACKED', '10000'))
+PREFETCH_ROLLOVER_LEAD = float(getenv('PREFETCH_ROLLOVER_LEAD', '600'))
+
+# Сохраненные поиски: путь к базе SQLite подписок и цен (если не задан,
+# слежение за ценами отключено), интервал проверки цен (секунды),
+# снижение цены в процентах по умолчанию, максимальное количество
+# подписок чата и количество одновременных запросов проверки
+WATCH_DB = getenv('WATCH_DB')
+WATCH_INTERVAL = float(getenv('WATCH_INTERVAL', '3600'))
+WATCH_MIN_DROP = float(getenv('WATCH_MIN_DROP', '10'))
+WATCH_MAX_PER_CHAT = int(getenv('WATCH_MAX_PER_CHAT', '10'))
+WATCH_WORKERS = int(getenv('WATCH_WORKERS', '4'))
@@ -0,0 +1,90 @@
+from typing import Optional
+from argparse import ArgumentParser
+from itertools import count
+from time import time
+from requests import Session
+from webhook import SECRET_HEADER
+
+
+# Счетчик идентификаторов обновлений и сообщений
+_ids = count(1)
+
+
+def make_text_update(chat_id: int, text: str) -> dict:
+    """Формирование обновления телеграма с текстовым сообщением
+
+    Args:
+        chat_id (int): идентификатор чата
+        text (str): текст сообщения
+
+    Returns:
+        dict: обновление в формате API телеграма
+    """
+    update_id = next(_ids)
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+            'text': text
+        }
+    }
+
+
+class FakeTelegramSender:
+    """Имитация телеграма, отправляющего обновления на вебхук бота
+    """
+
+    def __init__(self, url: str, secret_token: Optional[str]) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            url (str): адрес вебхука
+            secret_token (Optional[str]): секретный токен для заголовка
+        """
+        self.url: str = url
+        self._session = Session()
+        if secret_token is not None:
+            self._session.headers[SECRET_HEADER] = secret_token
+
+    def post_update(self, update: dict) -> int:
+        """Отправка обновления на вебхук
+
+        Args:
+            update (dict): обновление в формате API телеграма
+
+        Returns:
+            int: код ответа вебхука
+        """
+        return self._session.post(self.url, json=update, timeout=5).status_code
+
+    def post_text(self, chat_id: int, text: str) -> int:
+        """Отправка текстового сообщения от имени пользователя чата
+
+        Args:
+            chat_id (int): идентификатор чата
+            text (str): текст сообщения
+
+        Returns:
+            int: код ответа вебхука
+        """
+        return self.post_update(make_text_update(chat_id, text))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(
+        description='Отправка тестовых сообщений на вебхук бота'
+    )
+    parser.add_argument('url', help='адрес вебхука')
+    parser.add_argument('--secret', default=None, help='секретный токен')
+    parser.add_argument('--chat-id', type=int, default=1)
+    parser.add_argument(
+        'messages', nargs='*', default=['/lowprice', 'Москва', '3'],
+        help='тексты сообщений по порядку'
+    )
+    args = parser.parse_args()
+    sender = FakeTelegramSender(args.url, args.secret)
+    for text in args.messages:
+        print(text, sender.post_text(args.chat_id, text))
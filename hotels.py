@@ -1,34 +1,389 @@
 
+import asyncio
+from typing import AsyncIterator
+from typing import Iterator
 from typing import Optional
 from typing import Union
-from requests import request
-from json import loads
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextvars import copy_context
+from threading import Lock
+from requests import Session
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from urllib3.util.retry import Retry
+try:
+    # Быстрый разбор JSON, если установлен orjson
+    from orjson import loads
+except ImportError:
+    from json import loads
 from datetime import date
 from datetime import timedelta
-from env import HOTELS_KEY, HOTELS_HOST
+from math import nan
+from time import perf_counter
+from env import HOTELS_KEY, HOTELS_HOST, HOTELS_BASE_URL
+from env import HOTELS_CONNECT_TIMEOUT, HOTELS_READ_TIMEOUT
+from env import HOTELS_POOL_CONNECTIONS, HOTELS_POOL_MAXSIZE
+from env import HOTELS_MAX_RETRIES, HOTELS_BACKOFF_FACTOR
+from env import CITY_CACHE_SIZE, CITY_CACHE_TTL, CITY_NEGATIVE_TTL
+from env import RESULTS_CACHE_SIZE, RESULTS_CACHE_TTL, RESULTS_STALE_TTL
+from env import RESULTS_STALE_IF_ERROR
+from env import PAGES_PREFETCH, PAGES_WORKERS
+from env import WATCH_WORKERS
+from env import ASYNC_UPSTREAM_LIMIT
+from env import COALESCE_TIMEOUT
+from env import HOTELS_RPS, HOTELS_BURST
+from env import CITY_SUGGESTIONS, CITY_INDEX_STRICT
+from env import BESTDEAL_MAX_PAGES, BESTDEAL_PRICE_WEIGHT
+from env import RESULT_SET_SIZE
+from env import HOTELS_HEDGE_PERCENTILE, HOTELS_HEDGE_MIN_DELAY
+from env import HOTELS_HEDGE_WINDOW
+from env import HOTELS_BREAKER_ERROR_RATE, HOTELS_BREAKER_WINDOW
+from env import HOTELS_BREAKER_COOLDOWN
+from env import PREFETCH_HALF_LIFE, PREFETCH_MAX_TRACKED
+from cache import TTLCache, SWRCache
+from cityindex import CityIndex
+from sharedcache import SharedCache
+from singleflight import SingleFlight
+from popularity import DecayingCounter
+from ratelimit import RateLimiter
+from ranking import RankingColumns
+from resilience import CircuitBreaker, LatencyTracker
+from resilience import BREAKER_STATES
+from metrics import registry, timed, record_stage
+from metrics import UPSTREAM_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_RETRIES
+from metrics import HEDGED_REQUESTS
+
+
+# Максимальная длина сообщения телеграма
+MESSAGE_LIMIT = 4096
+# Служебные символы разметки MarkdownV2 телеграма
+MARKDOWN_SPECIAL = '\\_*[]()~`>#+-=|{}.!'
+_MARKDOWN_ESCAPES = str.maketrans({
+    char: '\\' + char for char in MARKDOWN_SPECIAL
+})
+
+
+def escape_markdown(text: str) -> str:
+    """Экранирование текста для разметки MarkdownV2 телеграма
+
+    Args:
+        text (str): текст
+
+    Returns:
+        str: текст с экранированными служебными символами
+    """
+    return text.translate(_MARKDOWN_ESCAPES)
 
 
 class Hotel:
     """Класс-структура для хранения параметров отелей
     """
 
+    __slots__ = ('name', 'address', 'distance', 'price')
+
     def __init__(
-        self, name: str, address: str, distance: float, price: int
+        self, name: str, address: str, distance: float,
+        price: Optional[int]
     ) -> None:
         self.name: str = name
         self.address: str = address
         self.distance: float = distance
-        self.price: int = price
+        self.price: Optional[int] = price
 
 
-class HotelsRequest:
+class HotelsClient:
+    """Общий для всего процесса HTTP-клиент к API сайта hotels.com
+        с пулом keep-alive соединений, таймаутами и повторами запросов
+    """
+
+    # Адрес API сайта
+    BASE_URL = HOTELS_BASE_URL.rstrip('/')
     # Заголовки для подключения к API сайта hotels.com
     headers = {
         'x-rapidapi-key': HOTELS_KEY,
         'x-rapidapi-host': HOTELS_HOST
     }
-    # Максимальное количество отелей в результате поиска
+    # Таймауты (соединение, чтение)
+    timeout = (HOTELS_CONNECT_TIMEOUT, HOTELS_READ_TIMEOUT)
+    # Коды ответов, при которых запрос повторяется
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    # Ограничение частоты запросов к сайту (квота RapidAPI)
+    rate_limiter = RateLimiter(HOTELS_RPS, HOTELS_BURST)
+    # Потоки, которые сами отправляют запросы: загрузчики страниц,
+    # асинхронные запросы и проверка сохраненных поисков
+    CALLER_THREADS = PAGES_WORKERS + ASYNC_UPSTREAM_LIMIT + WATCH_WORKERS
+
+    # Автоматы защиты по методам API
+    breakers: dict[str, CircuitBreaker] = dict()
+    # Задержки успешных ответов по методам API
+    latencies: dict[str, LatencyTracker] = dict()
+    # Потоки для запросов с дублированием: основной и дублирующий
+    # запросы каждого из загрузчиков страниц и асинхронных запросов
+    _hedge_executor = ThreadPoolExecutor(
+        max_workers=2 * (PAGES_WORKERS + ASYNC_UPSTREAM_LIMIT),
+        thread_name_prefix='hotels-hedge'
+    )
+    # Соединений в пуле хватает на все одновременные запросы, иначе
+    # лишние соединения закрываются и открываются заново
+    pool_maxsize = HOTELS_POOL_MAXSIZE or \
+        CALLER_THREADS + 2 * (PAGES_WORKERS + ASYNC_UPSTREAM_LIMIT)
+
+    _session: Optional[Session] = None
+    _session_lock = Lock()
+
+    @classmethod
+    def get_session(cls) -> Session:
+        """Получение общей сессии, сессия создается при первом обращении
+
+        Returns:
+            Session: сессия с пулом соединений
+        """
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    retry = Retry(
+                        total=HOTELS_MAX_RETRIES,
+                        backoff_factor=HOTELS_BACKOFF_FACTOR,
+                        status_forcelist=cls.RETRY_STATUSES,
+                        allowed_methods=frozenset(['GET']),
+                        respect_retry_after_header=True,
+                        raise_on_status=False
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=HOTELS_POOL_CONNECTIONS,
+                        pool_maxsize=cls.pool_maxsize,
+                        max_retries=retry
+                    )
+                    session = Session()
+                    session.headers.update(cls.headers)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def get_breaker(cls, path: str) -> CircuitBreaker:
+        """Автомат защиты метода API, создается при первом обращении
+
+        Args:
+            path (str): путь метода API
+
+        Returns:
+            CircuitBreaker: автомат защиты
+        """
+        breaker = cls.breakers.get(path)
+        if breaker is None:
+            with cls._session_lock:
+                breaker = cls.breakers.setdefault(path, CircuitBreaker(
+                    window=HOTELS_BREAKER_WINDOW,
+                    error_rate=HOTELS_BREAKER_ERROR_RATE,
+                    cooldown=HOTELS_BREAKER_COOLDOWN
+                ))
+        return breaker
+
+    @classmethod
+    def _get_hedge_delay(cls, path: str) -> Optional[float]:
+        """Задержка, после которой отправляется дублирующий запрос
+
+        Args:
+            path (str): путь метода API
+
+        Returns:
+            Optional[float]: задержка (секунды), None - без дублирования
+        """
+        if HOTELS_HEDGE_PERCENTILE <= 0:
+            return None
+        latencies = cls.latencies.get(path)
+        if latencies is None:
+            latencies = cls.latencies.setdefault(
+                path, LatencyTracker(HOTELS_HEDGE_WINDOW)
+            )
+        delay = latencies.percentile(HOTELS_HEDGE_PERCENTILE)
+        if delay is None:
+            return None
+        return max(delay, HOTELS_HEDGE_MIN_DELAY)
+
+    @classmethod
+    def get(cls, path: str, params: dict) -> Optional[Response]:
+        """GET-запрос к API сайта
+
+        Медленный запрос дублируется после задержки, равной процентилю
+        HOTELS_HEDGE_PERCENTILE задержек последних ответов, используется
+        первый успешный ответ. При большой доле ошибок автомат защиты
+        отклоняет запросы без обращения к сайту.
+
+        Args:
+            path (str): путь метода API (например, 'locations/search')
+            params (dict): параметры запроса
+
+        Returns:
+            Optional[Response]: ответ сайта
+                                None - если произошла ошибка соединения,
+                                истек таймаут, ответ не успешный или
+                                сайт недоступен по автомату защиты
+        """
+        breaker = cls.get_breaker(path)
+        generation = breaker.allow()
+        if generation is None:
+            UPSTREAM_RESPONSES.inc(path, 'breaker_open')
+            return None
+        success = False
+        try:
+            cls.rate_limiter.acquire('hotels')
+            delay = cls._get_hedge_delay(path)
+            if delay is None:
+                response = cls._send(path, params)
+            else:
+                response = cls._send_hedged(path, params, delay)
+            success = (
+                response is not None and response.status_code < 500 and
+                response.status_code != 429
+            )
+        finally:
+            # Исключение считается ошибкой, иначе пробный запрос
+            # не завершится и автомат останется полуоткрытым
+            breaker.record(generation, success)
+        # Если запрос не вернул успешный результат
+        if response is None or response.status_code != 200:
+            return None
+        return response
+
+    @classmethod
+    def _send_hedged(
+        cls, path: str, params: dict, delay: float
+    ) -> Optional[Response]:
+        """Запрос с дублированием, если ответа нет дольше задержки
+
+        Дублирующий запрос отправляется, только если квота запросов
+        позволяет сделать его без ожидания
+
+        Args:
+            path (str): путь метода API
+            params (dict): параметры запроса
+            delay (float): задержка перед дублирующим запросом (секунды)
+
+        Returns:
+            Optional[Response]: первый успешный ответ или последний
+                                неуспешный
+        """
+        primary = cls._hedge_executor.submit(
+            copy_context().run, cls._send, path, params
+        )
+        done, _ = wait((primary,), timeout=delay)
+        if done or not cls.rate_limiter.try_acquire():
+            return primary.result()
+        HEDGED_REQUESTS.inc(path, 'sent')
+        hedge = cls._hedge_executor.submit(
+            copy_context().run, cls._send, path, params
+        )
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                response = future.result()
+                if response is not None and response.status_code == 200:
+                    if future is hedge:
+                        HEDGED_REQUESTS.inc(path, 'won')
+                    return response
+        # Оба запроса неуспешны
+        return response
+
+    @classmethod
+    def _send(cls, path: str, params: dict) -> Optional[Response]:
+        """Отправка запроса к API сайта с учетом в метриках
+
+        Args:
+            path (str): путь метода API
+            params (dict): параметры запроса
+
+        Returns:
+            Optional[Response]: ответ сайта с любым кодом
+                                None - если произошла ошибка соединения
+                                или истек таймаут
+        """
+        started = perf_counter()
+        try:
+            response = cls.get_session().get(
+                '{}/{}'.format(cls.BASE_URL, path),
+                params=params,
+                timeout=cls.timeout
+            )
+        except RequestException:
+            UPSTREAM_RESPONSES.inc(path, 'error')
+            return None
+        finally:
+            seconds = perf_counter() - started
+            UPSTREAM_SECONDS.observe(seconds, path)
+            record_stage(path, seconds)
+        UPSTREAM_RESPONSES.inc(path, response.status_code)
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            UPSTREAM_RETRIES.inc(path, amount=len(retries.history))
+        elif response.status_code == 200 and path in cls.latencies:
+            # Задержка ответа без повторов - для расчета дублирования
+            cls.latencies[path].add(seconds)
+        return response
+
+
+class HotelsRequest:
+    # Поля запроса без словаря атрибутов экземпляра
+    __slots__ = (
+        'request_type', 'city_id', 'city_name', 'min_price', 'max_price',
+        'min_distance', 'max_distance', 'hotels_count', 'step'
+    )
+    # Максимальное количество отелей на странице результата поиска
     MAX_CITIES = 10
+    # Максимальная длина имени и адреса отеля в результате
+    MAX_FIELD_LENGTH = 500
+    # Допустимые размеры страницы результатов (максимальный - у API сайта)
+    PAGE_SIZES = (5, 10, 25)
+    # Порядок сортировки результатов по типу команды
+    SORT_ORDERS = {
+        'lowprice': 'PRICE',
+        'highprice': 'PRICE_HIGHEST_FIRST',
+        'bestdeal': 'DISTANCE_FROM_LANDMARK'
+    }
+    # Тип команды по порядку сортировки (для метрик)
+    REQUEST_TYPES = {
+        sort_order: request_type
+        for request_type, sort_order in SORT_ORDERS.items()
+    }
+    # Общий для всех чатов кэш поиска городов:
+    # нормализованное имя -> (destinationId, имя) или None для
+    # несуществующего города
+    cities_cache = TTLCache(maxsize=CITY_CACHE_SIZE, ttl=CITY_CACHE_TTL)
+    # Признак отсутствия записи в кэше
+    _NOT_CACHED = object()
+    # Локальный индекс городов (справочник и найденные на сайте города)
+    city_index = CityIndex()
+    # Общий для процессов машины кэш городов и страниц результатов
+    # (второй уровень после кэшей процесса), None - не используется
+    shared_cache: Optional[SharedCache] = None
+    # Общий кэш страниц результатов: (отпечаток запроса, страница) ->
+    # список отелей, размер ограничен суммарным количеством отелей
+    pages_cache = SWRCache(
+        maxsize=RESULTS_CACHE_SIZE,
+        ttl=RESULTS_CACHE_TTL,
+        stale_ttl=RESULTS_STALE_TTL,
+        weigh=lambda hotels: max(len(hotels), 1),
+        error_ttl=RESULTS_STALE_IF_ERROR
+    )
+    # Популярность поисков /lowprice и /highprice:
+    # (destinationId, sortOrder, pageSize) -> затухающий счетчик
+    popularity = DecayingCounter(PREFETCH_HALF_LIFE, PREFETCH_MAX_TRACKED)
+    # Объединение одинаковых одновременных запросов к сайту
+    _cities_flight = SingleFlight('locations/search', COALESCE_TIMEOUT)
+    _pages_flight = SingleFlight('properties/list', COALESCE_TIMEOUT)
+    # Общий пул потоков параллельной загрузки страниц
+    _pages_executor = ThreadPoolExecutor(
+        max_workers=PAGES_WORKERS,
+        thread_name_prefix='hotels-pages'
+    )
 
     def __init__(self) -> None:
         """Инициализация экземпляра класса
@@ -42,6 +397,32 @@ class HotelsRequest:
         self.min_distance: Optional[float] = None
         self.max_distance: Optional[float] = None
         self.hotels_count: Optional[int] = None
+        # Имя обработчика следующего шага диалога
+        self.step: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """Преобразование параметров запроса в словарь для сохранения
+
+        Returns:
+            dict: параметры запроса
+        """
+        return {name: getattr(self, name) for name in HotelsRequest.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'HotelsRequest':
+        """Восстановление запроса из сохраненного словаря
+
+        Args:
+            data (dict): параметры запроса
+
+        Returns:
+            HotelsRequest: объект запроса
+        """
+        request = cls()
+        for name in HotelsRequest.__slots__:
+            if name in data:
+                setattr(request, name, data[name])
+        return request
 
     def is_city_exists(self, city_name: str) -> Optional[bool]:
         """Проверка имени города на реальность
@@ -55,84 +436,494 @@ class HotelsRequest:
                             True - реальное имя города
                             False - несуществующее имя города
         """
-        # Сылка запроса к сайту
-        url = "https://hotels4.p.rapidapi.com/locations/search"
-        # Параметры запроса (имя города, язык ответа)
-        query_string = {"query": city_name.lower(), "locale": "ru_RU"}
-        try:
-            response = request(
-                "GET",
-                url,
-                headers=self.headers,
-                params=query_string
-            )
-            # Если запрос не вернул успешный результат
-            if response.status_code != 200:
-                return None
-            response_dict: dict = loads(response.text)
-            # Если ответ содержит результаты поиска
-            if response_dict.get('moresuggestions', 0) == 0:
+        with timed('search_city', self.request_type):
+            return self._check_city_name(city_name)
+
+    def _check_city_name(self, city_name: str) -> Optional[bool]:
+        """Проверка имени города по кэшу и на сайте
+
+        Args:
+            city_name (str): Проверяемое имя
+
+        Returns:
+            Optional[bool]: см. is_city_exists
+        """
+        normalized_name = self.normalize_city_name(city_name)
+        # Известный город не требует запроса к сайту
+        city = self.city_index.lookup(normalized_name)
+        if city is not None:
+            self.city_id, self.city_name = city
+            return True
+        if CITY_INDEX_STRICT and len(self.city_index):
+            return False
+        # Проверяем результат предыдущих поисков
+        cached = self.cities_cache.get(normalized_name, self._NOT_CACHED)
+        if cached is not self._NOT_CACHED:
+            if cached is None:
                 return False
-            # Проверяем среди группы города полное совпадение названия
-            for item in response_dict['suggestions']:
-                if item['group'] == 'CITY_GROUP':
-                    for city in item['entities']:
-                        if city['name'].lower() == city_name.lower():
-                            self.city_id = city['destinationId']
-                            self.city_name = city['name'].lower()
-                            return True
-        except ConnectionError:
+            self.city_id, self.city_name = cached
+            return True
+        city = self._cities_flight.do(
+            normalized_name,
+            lambda: self._load_city(normalized_name)
+        )
+        if city is None:
             return None
+        if city is False:
+            self.cities_cache.set(
+                normalized_name, None, ttl=CITY_NEGATIVE_TTL
+            )
+            return False
+        self.cities_cache.set(normalized_name, city)
+        self.city_id, self.city_name = city
+        return True
+
+    @staticmethod
+    def normalize_city_name(city_name: str) -> str:
+        """Приведение имени города к виду для поиска и ключа кэша
+
+        Args:
+            city_name (str): имя города
+
+        Returns:
+            str: имя в нижнем регистре без лишних пробелов
+        """
+        return ' '.join(city_name.lower().split())
+
+    @classmethod
+    def _load_city(
+        cls, city_name: str
+    ) -> Union[tuple[str, str], bool, None]:
+        """Поиск города в общем кэше процессов или на сайте
+
+        Args:
+            city_name (str): нормализованное имя города
+
+        Returns:
+            Union[tuple[str, str], bool, None]: см. _search_city
+        """
+        if cls.shared_cache is None:
+            return cls._search_city(city_name)
+        city = cls.shared_cache.get('cities', city_name)
+        if city is not None:
+            return tuple(city) if city else False
+        city = cls._search_city(city_name)
+        if city is not None:
+            cls.shared_cache.set(
+                'cities', city_name, city,
+                CITY_CACHE_TTL if city else CITY_NEGATIVE_TTL
+            )
+        return city
+
+    @staticmethod
+    def _search_city(city_name: str) -> Union[tuple[str, str], bool, None]:
+        """Поиск города на сайте
+
+        Args:
+            city_name (str): нормализованное имя города
+
+        Returns:
+            Union[tuple[str, str], bool, None]:
+                (destinationId, имя) - город найден
+                False - несуществующее имя города
+                None - в процессе запроса к сайту произошла ошибка
+        """
+        # Параметры запроса (имя города, язык ответа)
+        query_string = {"query": city_name, "locale": "ru_RU"}
+        response = HotelsClient.get('locations/search', query_string)
+        if response is None:
+            return None
+        response_dict: dict = loads(response.content)
+        # Найденные города пополняют локальный индекс
+        HotelsRequest.city_index.add_search_response(response_dict)
+        # Если ответ содержит результаты поиска
+        if response_dict.get('moresuggestions', 0) == 0:
+            return False
+        # Проверяем среди группы города полное совпадение названия
+        for item in response_dict['suggestions']:
+            if item['group'] == 'CITY_GROUP':
+                for city in item['entities']:
+                    if city['name'].lower() == city_name:
+                        return city['destinationId'], city['name'].lower()
         return False
 
-    def _get_site_responce(self, page: int = 1) -> Optional[list]:
-        """Получение ответа сайта и преобразование текста ответа в словарь
+    def suggest_cities(self, city_name: str) -> list[tuple[str, str]]:
+        """Подбор известных городов с похожими именами
 
         Args:
-            page (int, optional): Номер страницы для запроса. Defaults to 1.
+            city_name (str): введенное имя города
 
         Returns:
-            Optional[list]: список с результатами поиска
+            list[tuple[str, str]]: destinationId и имя города
         """
-        # Ссылка запроса к API сайта
-        url = "https://hotels4.p.rapidapi.com/properties/list"
+        with timed('suggest_city', self.request_type):
+            return self.city_index.suggest(city_name, CITY_SUGGESTIONS)
 
-        # Параметры запроса
-        query_string: dict[str, Union[int, str]] = {
+    def choose_city(self, destination_id: str) -> bool:
+        """Выбор города из предложенных по destinationId
+
+        Args:
+            destination_id (str): идентификатор города
+
+        Returns:
+            bool: True - город выбран, False - город неизвестен
+        """
+        name = self.city_index.get_name(destination_id)
+        if name is None:
+            return False
+        self.city_id = destination_id
+        self.city_name = self.normalize_city_name(name)
+        return True
+
+    def _get_query_string(
+        self, day: Optional[date] = None
+    ) -> Optional[dict[str, str]]:
+        """Формирование параметров запроса списка отелей без номера страницы
+
+        Args:
+            day (Optional[date], optional): день поиска, от которого
+                                            отсчитываются даты заезда
+                                            и выезда, None - сегодня.
+                                            Defaults to None.
+
+        Returns:
+            Optional[dict[str, str]]: параметры запроса
+                                      None - неизвестный тип запроса
+        """
+        if day is None:
+            day = date.today()
+        query_string: dict[str, str] = {
             "adults1": "1",
-            "pageNumber": str(page),
             "destinationId": str(self.city_id),
-            "checkOut": str(date.today() + timedelta(days=3)),
-            "checkIn": str(date.today() + timedelta(days=2)),
+            "checkOut": str(day + timedelta(days=3)),
+            "checkIn": str(day + timedelta(days=2)),
             "locale": "ru_RU",
-            "pageSize": "25",
+            "pageSize": str(self._get_page_size()),
             "currency": "RUB"
         }
-        if self.request_type == 'lowprice':
-            query_string['sortOrder'] = "PRICE"
-        elif self.request_type == 'highprice':
-            query_string['sortOrder'] = "PRICE_HIGHEST_FIRST"
-        elif self.request_type == 'bestdeal':
+        if self.request_type not in self.SORT_ORDERS:
+            return None
+        query_string['sortOrder'] = self.SORT_ORDERS[self.request_type]
+        if self.request_type == 'bestdeal':
             query_string["priceMin"] = str(self.min_price)
             query_string["priceMax"] = str(self.max_price)
-            query_string['sortOrder'] = "DISTANCE_FROM_LANDMARK"
-        else:
+        return query_string
+
+    def _get_page_size(self) -> int:
+        """Выбор размера страницы результатов
+
+        Для /lowprice и /highprice берется наименьший размер, в который
+        помещаются все собираемые отели, для /bestdeal - максимальный,
+        так как часть отелей отсеивается фильтром по расстоянию
+
+        Returns:
+            int: размер страницы
+        """
+        if self.request_type != 'bestdeal' and self.hotels_count:
+            for page_size in self.PAGE_SIZES:
+                if page_size >= self.get_result_limit():
+                    return page_size
+        return self.PAGE_SIZES[-1]
+
+    def get_result_limit(self) -> int:
+        """Количество отелей, собираемых для постраничного вывода
+
+        Сверх указанного количества собирается не больше одной страницы
+        сайта, поэтому листание не требует лишних запросов
+
+        Returns:
+            int: количество отелей
+        """
+        return max(
+            self.hotels_count or self.MAX_CITIES,
+            min(RESULT_SET_SIZE, self.PAGE_SIZES[-1])
+        )
+
+    @staticmethod
+    def query_fingerprint(query_string: dict[str, str]) -> tuple:
+        """Нормализованный отпечаток параметров запроса для ключа кэша
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+
+        Returns:
+            tuple: отсортированные пары (параметр, значение)
+                   без номера страницы
+        """
+        return tuple(sorted(
+            (key, str(value).strip().lower())
+            for key, value in query_string.items()
+            if key != 'pageNumber'
+        ))
+
+    @staticmethod
+    def _parse_distance(distance: str) -> float:
+        """Разбор расстояния вида '1,5 км'
+
+        Args:
+            distance (str): расстояние из ответа сайта
+
+        Returns:
+            float: расстояние в километрах
+        """
+        return float(distance.partition(' ')[0].replace(',', '.'))
+
+    @staticmethod
+    def _parse_price(price: str) -> int:
+        """Разбор стоимости вида '1,234 RUB'
+
+        Args:
+            price (str): стоимость из ответа сайта
+
+        Returns:
+            int: стоимость в рублях
+        """
+        return int(price.partition(' ')[0].replace(',', ''))
+
+    @classmethod
+    def _parse_hotel(cls, hotel: dict) -> Hotel:
+        """Преобразование записи из ответа сайта в объект отеля
+
+        Args:
+            hotel (dict): запись отеля из ответа сайта
+
+        Returns:
+            Hotel: объект отеля, цена None - у отеля нет цены
+        """
+        price = hotel.get('ratePlan', {}).get('price', {}).get('current')
+        # Определяем расмтояние от центра города
+        distance: Optional[float] = None
+        for landmark in hotel['landmarks']:
+            if landmark['label'] == 'Центр города':
+                distance = cls._parse_distance(str(landmark['distance']))
+                break
+        return Hotel(
+            name=hotel['name'],
+            address=hotel['address'].get('streetAddress', ''),
+            distance=distance,
+            price=None if price is None else cls._parse_price(str(price))
+        )
+
+    @classmethod
+    def parse_page(cls, content: bytes) -> list[Hotel]:
+        """Разбор страницы результатов сразу из байтов ответа сайта
+
+        Из ответа берутся только поля отеля, остальное дерево ответа
+        (фотографии, отзывы, акции) не сохраняется
+
+        Args:
+            content (bytes): тело ответа сайта
+
+        Returns:
+            list[Hotel]: список отелей на странице
+        """
+        return [
+            cls._parse_hotel(hotel)
+            for hotel in loads(
+                content
+            )['data']['body']['searchResults']['results']
+        ]
+
+    @classmethod
+    def _fetch_page(
+        cls, query_string: dict[str, str], page: int
+    ) -> Optional[list[Hotel]]:
+        """Запрос страницы результатов у сайта
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+            page (int): номер страницы
+
+        Returns:
+            Optional[list[Hotel]]: список отелей на странице
+                                   None - если произошла ошибка
+        """
+        response = HotelsClient.get(
+            'properties/list',
+            dict(query_string, pageNumber=str(page))
+        )
+        if response is None:
             return None
         try:
-            response = request(
-                "GET",
-                url,
-                headers=self.headers,
-                params=query_string
-            )
-            # Если запрос вернул не успешный результат
-            if response.status_code != 200:
-                return None
-        except ConnectionError:
+            with timed(
+                'parse', cls.REQUEST_TYPES.get(query_string.get('sortOrder'))
+            ):
+                return cls.parse_page(response.content)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # Ответ сайта не соответствует ожидаемому формату
+            return None
+
+    def _get_site_responce(self, page: int = 1) -> Optional[list[Hotel]]:
+        """Получение страницы результатов поиска из кэша или от сайта
+
+        Args:
+            page (int, optional): Номер страницы для запроса. Defaults to 1.
+
+        Returns:
+            Optional[list[Hotel]]: список отелей на странице
+        """
+        query_string = self._get_query_string()
+        if query_string is None:
             return None
-        return (
-            loads(response.text)
-        )['data']['body']['searchResults']['results']
+        return self._get_page(query_string, page)
+
+    @classmethod
+    def _get_page(
+        cls, query_string: dict[str, str], page: int
+    ) -> Optional[list[Hotel]]:
+        """Получение страницы результатов из кэша или от сайта
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+            page (int): номер страницы
+
+        Returns:
+            Optional[list[Hotel]]: список отелей на странице
+        """
+        key = (cls.query_fingerprint(query_string), page)
+        return cls.pages_cache.get_or_load(
+            key,
+            lambda: cls._pages_flight.do(
+                key, lambda: cls._load_page(query_string, page, key)
+            )
+        )
+
+    @classmethod
+    def _load_page(
+        cls, query_string: dict[str, str], page: int, key: tuple
+    ) -> Optional[list[Hotel]]:
+        """Получение страницы результатов из общего кэша процессов
+            или от сайта
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+            page (int): номер страницы
+            key (tuple): ключ страницы в кэше
+
+        Returns:
+            Optional[list[Hotel]]: список отелей на странице
+        """
+        if cls.shared_cache is None:
+            return cls._fetch_page(query_string, page)
+        hotels = cls.shared_cache.get('pages', key)
+        if hotels is not None:
+            return [Hotel(*hotel) for hotel in hotels]
+        return cls._fetch_shared_page(query_string, page, key)
+
+    @classmethod
+    def _fetch_shared_page(
+        cls, query_string: dict[str, str], page: int, key: tuple
+    ) -> Optional[list[Hotel]]:
+        """Запрос страницы результатов у сайта с сохранением в общий кэш
+            процессов, если он используется
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+            page (int): номер страницы
+            key (tuple): ключ страницы в кэше
+
+        Returns:
+            Optional[list[Hotel]]: список отелей на странице
+        """
+        hotels = cls._fetch_page(query_string, page)
+        if hotels is not None and cls.shared_cache is not None:
+            cls.shared_cache.set(
+                'pages', key,
+                [
+                    (hotel.name, hotel.address, hotel.distance, hotel.price)
+                    for hotel in hotels
+                ],
+                RESULTS_CACHE_TTL
+            )
+        return hotels
+
+    @classmethod
+    def refresh_page(
+        cls, query_string: dict[str, str], page: int
+    ) -> Optional[list[Hotel]]:
+        """Загрузка страницы результатов от сайта в обход кэшей
+            и сохранение ее в кэши как свежей (фоновое обновление)
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+            page (int): номер страницы
+
+        Returns:
+            Optional[list[Hotel]]: список отелей на странице
+                                   None - если произошла ошибка
+        """
+        key = (cls.query_fingerprint(query_string), page)
+        hotels = cls._pages_flight.do(
+            key, lambda: cls._fetch_shared_page(query_string, page, key)
+        )
+        if hotels is not None:
+            cls.pages_cache.put(key, hotels)
+        return hotels
+
+    def _iter_pages(
+        self, query_string: dict[str, str], prefetch: int,
+        max_pages: Optional[int] = None
+    ) -> Iterator[Optional[list[Hotel]]]:
+        """Последовательный обход страниц результатов с параллельной
+            загрузкой следующих страниц
+
+        Страницы выдаются по порядку. При закрытии генератора еще не
+        начатые загрузки отменяются.
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+            prefetch (int): количество одновременно загружаемых страниц
+            max_pages (Optional[int], optional): максимальное количество
+                                                 страниц. Defaults to None.
+
+        Yields:
+            Iterator[Optional[list[Hotel]]]: список отелей на странице,
+                                             None - ошибка загрузки
+        """
+        page_size = int(query_string['pageSize'])
+        pending: deque[Future] = deque()
+        next_page: int = 1
+        try:
+            while True:
+                while len(pending) < prefetch and (
+                    max_pages is None or next_page <= max_pages
+                ):
+                    # Загрузка видит трассировку текущего сообщения
+                    pending.append(self._pages_executor.submit(
+                        copy_context().run,
+                        self._get_page, query_string, next_page
+                    ))
+                    next_page += 1
+                with timed('page_wait', self.request_type):
+                    page = pending.popleft().result()
+                yield page
+                # Ошибка или неполная страница - страниц больше нет
+                if page is None or len(page) < page_size:
+                    return
+                # Бюджет страниц исчерпан
+                if max_pages is not None and next_page > max_pages and \
+                        not pending:
+                    return
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @classmethod
+    def _format_hotel(cls, hotel: Hotel) -> str:
+        """Описание отеля в разметке MarkdownV2
+
+        Args:
+            hotel (Hotel): отель
+
+        Returns:
+            str: описание отеля
+        """
+        return '*{}*\r\n{}\r\n{} км до центра\r\n{} руб\\.\r\n\r\n'.format(
+            escape_markdown(hotel.name[:cls.MAX_FIELD_LENGTH]),
+            escape_markdown(hotel.address[:cls.MAX_FIELD_LENGTH]),
+            escape_markdown(str(hotel.distance)),
+            hotel.price
+        )
 
     def _get_result_str(self, results_list: list[Hotel]) -> str:
         """Получение строки результата пригодной для вывода в бота
@@ -141,19 +932,188 @@ class HotelsRequest:
             results_list (list[Hotel]): список отелей в результате поиска
 
         Returns:
-            str: строка-результат
+            str: строка-результат в разметке MarkdownV2
         """
-        result_str: str = ''
-        for hotel in results_list:
-            result_str += '*{}*\r\n{}\r\n'.format(
-                hotel.name,
-                hotel.address
-            )
-            result_str += '{} км до центра\r\n{} руб.\r\n\r\n'.format(
-                hotel.distance,
-                hotel.price
+        with timed('render', self.request_type):
+            return ''.join(map(self._format_hotel, results_list))
+
+    def get_result_pages(
+        self, results_list: list[Hotel], per_page: int,
+        limit: int = MESSAGE_LIMIT
+    ) -> list[tuple[int, int]]:
+        """Разбиение результата на страницы для вывода сообщениями:
+            не больше per_page отелей и limit символов на странице
+
+        Args:
+            results_list (list[Hotel]): список отелей
+            per_page (int): количество отелей на странице
+            limit (int, optional): максимальная длина страницы.
+                                   Defaults to MESSAGE_LIMIT.
+
+        Returns:
+            list[tuple[int, int]]: границы страниц в списке отелей
+                                   (начало, конец)
+        """
+        bounds: list[tuple[int, int]] = list()
+        start = 0
+        length = 0
+        for index, hotel in enumerate(results_list):
+            size = len(self._format_hotel(hotel))
+            if index > start and (
+                index - start >= per_page or length + size > limit
+            ):
+                bounds.append((start, index))
+                start, length = index, 0
+            length += size
+        if start < len(results_list):
+            bounds.append((start, len(results_list)))
+        return bounds
+
+    def _rank_bestdeal(
+        self, query_string: dict[str, str]
+    ) -> Optional[list[Hotel]]:
+        """Выбор лучших отелей для /bestdeal по совокупности цены
+            и расстояния до центра
+
+        Загружается не больше BESTDEAL_MAX_PAGES страниц независимо
+        от порядка выдачи сайта, отели всех страниц фильтруются
+        и ранжируются вместе
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+
+        Returns:
+            Optional[list[Hotel]]: лучшие отели от лучшего к худшему
+                                   None - если не загружена ни одна
+                                   страница
+        """
+        columns = RankingColumns()
+        pages = self._iter_pages(
+            query_string,
+            min(PAGES_PREFETCH, BESTDEAL_MAX_PAGES),
+            max_pages=BESTDEAL_MAX_PAGES
+        )
+        try:
+            for site_results_list in pages:
+                if site_results_list is None:
+                    # Ранжируем то, что успели загрузить
+                    if not columns:
+                        return None
+                    break
+                self._add_columns(columns, site_results_list)
+        finally:
+            pages.close()
+        with timed('rank', self.request_type):
+            return self._rank_columns(columns, self.get_result_limit())
+
+    @staticmethod
+    def _add_columns(columns: RankingColumns, hotels: list[Hotel]) -> None:
+        """Добавление отелей страницы в колонки ранжирования
+
+        Args:
+            columns (RankingColumns): колонки ранжирования
+            hotels (list[Hotel]): отели страницы
+        """
+        columns.extend(
+            hotels,
+            (nan if hotel.price is None else hotel.price for hotel in hotels),
+            (
+                nan if hotel.distance is None else hotel.distance
+                for hotel in hotels
             )
-        return result_str
+        )
+
+    def _rank_columns(
+        self, columns: RankingColumns, limit: int
+    ) -> list[Hotel]:
+        """Лучшие отели для /bestdeal с фильтрами запроса
+
+        Args:
+            columns (RankingColumns): колонки ранжирования
+            limit (int): количество отелей
+
+        Returns:
+            list[Hotel]: отели от лучшего к худшему
+        """
+        return columns.top(
+            limit,
+            self.min_price, self.max_price,
+            self.min_distance, self.max_distance,
+            price_weight=BESTDEAL_PRICE_WEIGHT
+        )
+
+    def select_hotels(self, hotels: list[Hotel]) -> list[Hotel]:
+        """Отели первой страницы вывода запроса из уже загруженных
+            страниц результатов (для сохраненных поисков)
+
+        Args:
+            hotels (list[Hotel]): отели страниц в порядке выдачи сайта
+
+        Returns:
+            list[Hotel]: отели, которые увидит пользователь
+        """
+        limit = self.hotels_count or self.MAX_CITIES
+        if self.request_type == 'bestdeal':
+            columns = RankingColumns()
+            self._add_columns(columns, hotels)
+            return self._rank_columns(columns, limit)
+        return [hotel for hotel in hotels if hotel.price is not None][:limit]
+
+    def iter_hotels(self) -> Iterator[Optional[list[Hotel]]]:
+        """Постраничное получение отелей, подходящих под запрос
+
+        Отели выдаются сразу после разбора очередной страницы, поэтому
+        первые результаты можно показать, не дожидаясь остальных страниц.
+        Для /bestdeal выдается один список лучших отелей после
+        ранжирования
+
+        Yields:
+            Iterator[Optional[list[Hotel]]]: подходящие отели очередной
+                страницы (список может быть пустым)
+                None - если в процессе запроса произошла ошибка,
+                после него отели не выдаются
+        """
+        # Параметры запроса
+        query_string = self._get_query_string()
+        if query_string is None:
+            yield None
+            return
+        if self.request_type == 'bestdeal':
+            yield self._rank_bestdeal(query_string)
+            return
+        # Популярные поиски обновляются в фоне (prefetch.py)
+        self.popularity.hit((
+            query_string['destinationId'], query_string['sortOrder'],
+            query_string['pageSize']
+        ))
+        pages = self._iter_pages(query_string, 1)
+        finish_loop: bool = False
+        found_count: int = 0
+        try:
+            for site_results_list in pages:
+                if site_results_list is None:
+                    yield None
+                    return
+                results_list: list[Hotel] = list()
+                for hotel in site_results_list:
+                    # Отели без цены не выводим
+                    if hotel.price is None:
+                        continue
+                    results_list.append(hotel)
+                    found_count += 1
+                    if found_count == self.get_result_limit():
+                        finish_loop = True
+                        break
+                # Следующие страницы загружаются, только если отелей
+                # меньше указанного количества
+                if found_count >= (self.hotels_count or self.MAX_CITIES):
+                    finish_loop = True
+                yield results_list
+                if finish_loop:
+                    break
+        finally:
+            # Отменяем загрузку ненужных страниц
+            pages.close()
 
     def get_responce(self) -> Optional[str]:
         """Получение и разбор результата поиска
@@ -163,49 +1123,202 @@ class HotelsRequest:
                             None - если в процессе формирования запроса
                             произошли какие-то ошибки
         """
-        # Параметры запроса
-        page_number: int = 1
-        finish_loop: bool = False
         results_list: list[Hotel] = list()
-        while not finish_loop:
-            site_results_list: list = self._get_site_responce(page=page_number)
-            if site_results_list is None:
+        for hotels in self.iter_hotels():
+            if hotels is None:
                 return None
-            if site_results_list == []:
-                finish_loop = True
-            for hotel in site_results_list:
-                # Определяем расмтояние от центра города
-                distance: Optional[float] = None
-                for landmark in hotel['landmarks']:
-                    if landmark['label'] == 'Центр города':
-                        distance = float(
-                            str(landmark['distance'])
-                            .split(sep=' ')[0]
-                            .replace(',', '.')
-                        )
-                    break
-                if self.request_type == 'bestdeal':
-                    if distance < self.min_distance:
-                        continue
-                    if distance > self.max_distance:
-                        finish_loop = True
-                        break
-                results_list.append(
-                    Hotel(
-                        name=hotel['name'],
-                        address=dict(
-                            hotel['address']
-                        ).get('streetAddress', ''),
-                        distance=distance,
-                        price=int(
-                            str(hotel['ratePlan']['price']['current'])
-                            .split(sep=' ')[0]
-                            .replace(',', '')
-                        )
-                    )
+            results_list.extend(hotels)
+        return self._get_result_str(
+            results_list[:self.hotels_count or self.MAX_CITIES]
+        )
+
+
+def _collect_cache_stats(attribute: str) -> dict[tuple, float]:
+    """Получение счетчика общих кэшей запросов для метрик
+
+    Args:
+        attribute (str): имя счетчика кэша
+
+    Returns:
+        dict[tuple, float]: имя кэша -> значение
+    """
+    stats = {
+        ('cities',): getattr(HotelsRequest.cities_cache, attribute),
+        ('pages',): getattr(HotelsRequest.pages_cache, attribute)
+    }
+    shared_cache = HotelsRequest.shared_cache
+    if shared_cache is not None and hasattr(shared_cache, attribute):
+        stats[('shared',)] = getattr(shared_cache, attribute)
+    return stats
+
+
+registry.gauge(
+    'hotels_cache_hits',
+    'Попадания в кэши запросов',
+    lambda: _collect_cache_stats('hits'),
+    labels=('cache',)
+)
+registry.gauge(
+    'hotels_cache_misses',
+    'Промахи кэшей запросов',
+    lambda: _collect_cache_stats('misses'),
+    labels=('cache',)
+)
+registry.gauge(
+    'hotels_cache_evictions',
+    'Вытеснения из кэшей запросов',
+    lambda: _collect_cache_stats('evictions'),
+    labels=('cache',)
+)
+registry.gauge(
+    'hotels_cache_entries',
+    'Количество записей в кэшах запросов',
+    lambda: {
+        ('cities',): len(HotelsRequest.cities_cache),
+        ('pages',): len(HotelsRequest.pages_cache),
+        ('city_index',): len(HotelsRequest.city_index)
+    },
+    labels=('cache',)
+)
+registry.gauge(
+    'hotels_cache_stale_hits',
+    'Отдачи устаревших страниц результатов на время обновления',
+    lambda: {(): HotelsRequest.pages_cache.stale_hits}
+)
+registry.gauge(
+    'hotels_cache_stale_if_error_hits',
+    'Отдачи устаревших страниц результатов при недоступности сайта',
+    lambda: {(): HotelsRequest.pages_cache.error_hits}
+)
+
+registry.gauge(
+    'hotels_upstream_breaker_state',
+    'Состояние автомата защиты API hotels.com ' +
+    '(0 - замкнут, 1 - разомкнут, 2 - пробный запрос)',
+    lambda: {
+        (path, BREAKER_STATES[breaker.state]): breaker.state
+        for path, breaker in list(HotelsClient.breakers.items())
+    },
+    labels=('path', 'state')
+)
+registry.gauge(
+    'hotels_upstream_breaker_opened',
+    'Размыкания автомата защиты API hotels.com',
+    lambda: {
+        (path,): breaker.opened
+        for path, breaker in list(HotelsClient.breakers.items())
+    },
+    labels=('path',)
+)
+registry.gauge(
+    'hotels_upstream_hedge_win_ratio',
+    'Доля дублирующих запросов, ответ на которые пришел раньше основного',
+    lambda: {
+        (path,): HEDGED_REQUESTS.value(path, 'won') /
+        HEDGED_REQUESTS.value(path, 'sent')
+        for path in list(HotelsClient.latencies)
+        if HEDGED_REQUESTS.value(path, 'sent')
+    },
+    labels=('path',)
+)
+
+
+class AsyncHotelsRequest(HotelsRequest):
+    """Асинхронный вариант запроса к сайту для использования
+        в цикле asyncio
+
+    Запросы к сайту выполняются в отдельном пуле потоков поверх общего
+    пула соединений, количество одновременных запросов ограничено
+    семафором, поэтому медленный ответ сайта не блокирует цикл событий
+    """
+
+    __slots__ = ()
+
+    # Пул потоков для запросов к сайту
+    _upstream_executor = ThreadPoolExecutor(
+        max_workers=ASYNC_UPSTREAM_LIMIT,
+        thread_name_prefix='hotels-async'
+    )
+    # Ограничение одновременных запросов, создается в цикле событий
+    _upstream_limit: Optional[asyncio.Semaphore] = None
+    # Признак окончания страниц результатов
+    _END_OF_PAGES = object()
+
+    @classmethod
+    def set_upstream_limit(cls, limit: int = ASYNC_UPSTREAM_LIMIT) -> None:
+        """Установка ограничения одновременных запросов к сайту,
+            вызывается из работающего цикла событий
+
+        Args:
+            limit (int, optional): максимальное количество одновременных
+                                   запросов. Defaults to ASYNC_UPSTREAM_LIMIT.
+        """
+        if limit > cls._upstream_executor._max_workers:
+            cls._upstream_executor = ThreadPoolExecutor(
+                max_workers=limit,
+                thread_name_prefix='hotels-async'
+            )
+        cls._upstream_limit = asyncio.Semaphore(limit)
+
+    async def _run_upstream(self, func, *args):
+        """Выполнение блокирующего запроса к сайту вне цикла событий
+
+        Args:
+            func: блокирующая функция
+            args: аргументы функции
+
+        Returns:
+            результат функции
+        """
+        if self._upstream_limit is None:
+            self.set_upstream_limit()
+        async with self._upstream_limit:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._upstream_executor, copy_context().run, func, *args
+            )
+
+    async def is_city_exists_async(self, city_name: str) -> Optional[bool]:
+        """Асинхронная проверка имени города на реальность
+
+        Args:
+            city_name (str): Проверяемое имя
+
+        Returns:
+            Optional[bool]: см. HotelsRequest.is_city_exists
+        """
+        # Известный город или проверка только по индексу не требуют
+        # запроса к сайту
+        normalized_name = self.normalize_city_name(city_name)
+        if (
+            normalized_name in self.city_index or
+            normalized_name in self.cities_cache or
+            CITY_INDEX_STRICT and len(self.city_index)
+        ):
+            return self.is_city_exists(city_name)
+        return await self._run_upstream(self.is_city_exists, city_name)
+
+    async def iter_hotels_async(self) -> AsyncIterator[Optional[list[Hotel]]]:
+        """Асинхронное постраничное получение отелей, подходящих под запрос
+
+        Yields:
+            AsyncIterator[Optional[list[Hotel]]]: см. HotelsRequest.iter_hotels
+        """
+        hotels = self.iter_hotels()
+        try:
+            while True:
+                results_list = await self._run_upstream(
+                    next, hotels, self._END_OF_PAGES
                 )
-                if len(results_list) == self.hotels_count:
-                    finish_loop = True
-                    break
-            page_number += 1
-        return self._get_result_str(results_list)
+                if results_list is self._END_OF_PAGES:
+                    return
+                yield results_list
+        finally:
+            hotels.close()
+
+    async def get_responce_async(self) -> Optional[str]:
+        """Асинхронное получение и разбор результата поиска
+
+        Returns:
+            Optional[str]: см. HotelsRequest.get_responce
+        """
+        return await self._run_upstream(self.get_responce)
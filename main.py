@@ -1,22 +1,141 @@
+import logging
+from argparse import ArgumentParser
+from urllib.parse import urlparse
 from bot import HotelsBot
+from telebot import apihelper
+from telebot.types import CallbackQuery
 from telebot.types import Message
-from env import BOT_TOKEN
+from env import BOT_TOKEN, TELEGRAM_API_URL
+from env import WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_URL, WEBHOOK_SECRET
+from env import WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE
+from env import SESSION_DB, SESSION_MAX_SIZE, SESSION_IDLE_TTL
+from env import METRICS_HOST, METRICS_PORT, METRICS_TRACE
+from env import CITY_INDEX
+from env import PREFETCH_TOP_K
+from env import WATCH_DB, WATCH_MAX_PER_CHAT
+from metrics import MetricsServer
+from hotels import HotelsRequest, AsyncHotelsRequest
+from prefetch import Prefetcher
+from pricewatch import PriceWatcher
+from sessions import SQLiteSessionStore
+from subscriptions import SubscriptionStore
 
 
-# Создание объекта класса телеграм бота
-bot = HotelsBot(BOT_TOKEN)
+# Режим работы бота задается при запуске
+parser = ArgumentParser(description='Телеграм бот поиска отелей')
+parser.add_argument(
+    '--mode',
+    choices=('polling', 'async', 'webhook'),
+    default='polling',
+    help='polling - опрос телеграма в потоках, ' +
+         'async - опрос телеграма в цикле asyncio, ' +
+         'webhook - прием обновлений от телеграма локальным HTTP-сервером'
+)
+args = parser.parse_args()
+# Вебхук без секретного токена не запускается
+if args.mode == 'webhook':
+    from webhook import get_secret_token
 
+    try:
+        secret_token = get_secret_token(WEBHOOK_SECRET, WEBHOOK_URL)
+    except ValueError as error:
+        parser.error(str(error))
 
-# Перехват всех текстовых сообщений к боту и направление их на фукцию парсинга
-@bot.message_handler(func=lambda message: True, content_types=['text'])
-def get_command(message: Message) -> None:
-    """Функция перехвата входящих к телеграм боту сообщений
+# Адрес API телеграма, если задан отличный от стандартного
+if TELEGRAM_API_URL:
+    apihelper.API_URL = TELEGRAM_API_URL
 
-    Args:
-        message (Message): объект-сообщение API телеграма
-    """
-    bot.parse_command(message)
+# Выгрузка метрик и трассировка шагов диалогов
+if METRICS_PORT:
+    MetricsServer(METRICS_HOST, METRICS_PORT).start()
+if METRICS_TRACE:
+    logging.basicConfig(level=logging.INFO)
 
+# Локальный индекс городов загружается из файла, найденные на сайте
+# города сохраняются в файл при завершении работы, индекс нечеткого
+# поиска строится в фоне
+HotelsRequest.city_index.start(CITY_INDEX)
 
-# Бесконечный постоянный опрос телеграма о новых сообщениях
-bot.polling(none_stop=True, interval=0)
+# Первые страницы популярных поисков обновляются в фоне
+if PREFETCH_TOP_K:
+    Prefetcher().start()
+
+# Сессии в базе SQLite сохраняют незавершенные диалоги между перезапусками
+session_store = None
+if SESSION_DB:
+    session_store = SQLiteSessionStore(
+        SESSION_DB,
+        max_size=SESSION_MAX_SIZE,
+        idle_ttl=SESSION_IDLE_TTL,
+        factory=(
+            AsyncHotelsRequest if args.mode == 'async' else HotelsRequest
+        ).from_dict
+    )
+
+# Сохраненные поиски проверяются в фоне, о снижении цен сообщается в чаты
+subscriptions = None
+if WATCH_DB:
+    subscriptions = SubscriptionStore(WATCH_DB, WATCH_MAX_PER_CHAT)
+
+if args.mode == 'async':
+    from async_bot import AsyncHotelsBot
+
+    # Асинхронный бот сам направляет сообщения на парсинг
+    bot = AsyncHotelsBot(
+        BOT_TOKEN, session_store=session_store, subscriptions=subscriptions
+    )
+    if subscriptions is not None:
+        PriceWatcher(bot, subscriptions).start()
+    bot.polling_async(interval=0)
+else:
+    # Создание объекта класса телеграм бота, в режиме вебхука
+    # обновления обрабатываются потоками сервера
+    bot = HotelsBot(
+        BOT_TOKEN,
+        threaded=args.mode == 'polling',
+        session_store=session_store,
+        subscriptions=subscriptions
+    )
+    if subscriptions is not None:
+        PriceWatcher(bot, subscriptions).start()
+
+    # Перехват всех текстовых сообщений к боту и направление их
+    # на фукцию парсинга
+    @bot.message_handler(func=lambda message: True, content_types=['text'])
+    def get_command(message: Message) -> None:
+        """Функция перехвата входящих к телеграм боту сообщений
+
+        Args:
+            message (Message): объект-сообщение API телеграма
+        """
+        bot.parse_command(message)
+
+    # Нажатия кнопок под сообщениями бота
+    @bot.callback_query_handler(func=lambda call: True)
+    def get_callback(call: CallbackQuery) -> None:
+        """Функция перехвата нажатий кнопок
+
+        Args:
+            call (CallbackQuery): нажатие кнопки API телеграма
+        """
+        bot.parse_callback(call)
+
+    if args.mode == 'webhook':
+        from webhook import WebhookServer, set_webhook
+
+        server = WebhookServer(
+            bot,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            secret_token=secret_token,
+            path=(urlparse(WEBHOOK_URL).path or '/') if WEBHOOK_URL else '/',
+            workers=WEBHOOK_WORKERS,
+            queue_size=WEBHOOK_QUEUE_SIZE
+        )
+        # Регистрация вебхука в телеграме
+        if WEBHOOK_URL:
+            set_webhook(bot, WEBHOOK_URL, secret_token)
+        server.serve_forever()
+    else:
+        # Бесконечный постоянный опрос телеграма о новых сообщениях
+        bot.polling(none_stop=True, interval=0)
@@ -0,0 +1,397 @@
+import logging
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from json import dumps
+from threading import Lock
+from threading import Thread
+from time import perf_counter
+
+
+trace_logger = logging.getLogger('hotels.trace')
+
+# Границы корзин гистограмм длительности (секунды)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    """Форматирование меток в виде {name="value",...}
+
+    Args:
+        names (tuple[str, ...]): имена меток
+        values (tuple): значения меток
+
+    Returns:
+        str: метки в формате Prometheus
+    """
+    if not names:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in zip(names, values)
+    ) + '}'
+
+
+class Counter:
+    """Счетчик с метками
+    """
+
+    def __init__(
+        self, name: str, description: str, labels: tuple[str, ...] = ()
+    ) -> None:
+        self.name: str = name
+        self.description: str = description
+        self.labels: tuple[str, ...] = labels
+        self._values: dict[tuple, float] = dict()
+        self._lock = Lock()
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        """Увеличение счетчика
+
+        Args:
+            label_values: значения меток по порядку
+            amount (float, optional): величина увеличения. Defaults to 1.
+        """
+        with self._lock:
+            self._values[label_values] = \
+                self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> Iterator[str]:
+        yield '# HELP {} {}'.format(self.name, self.description)
+        yield '# TYPE {} counter'.format(self.name)
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield '{}{} {}'.format(
+                self.name, _format_labels(self.labels, label_values), value
+            )
+
+
+class Gauge:
+    """Показатель, значение которого вычисляется при выгрузке метрик
+    """
+
+    def __init__(
+        self, name: str, description: str,
+        collect: Callable[[], dict[tuple, float]],
+        labels: tuple[str, ...] = ()
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            name (str): имя метрики
+            description (str): описание
+            collect (Callable[[], dict[tuple, float]]): функция получения
+                значений: значения меток -> значение
+            labels (tuple[str, ...], optional): имена меток.
+                                                Defaults to ().
+        """
+        self.name: str = name
+        self.description: str = description
+        self.labels: tuple[str, ...] = labels
+        self._collect = collect
+
+    def render(self) -> Iterator[str]:
+        yield '# HELP {} {}'.format(self.name, self.description)
+        yield '# TYPE {} gauge'.format(self.name)
+        for label_values, value in self._collect().items():
+            yield '{}{} {}'.format(
+                self.name, _format_labels(self.labels, label_values), value
+            )
+
+
+class Histogram:
+    """Гистограмма с метками
+    """
+
+    def __init__(
+        self, name: str, description: str, labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name: str = name
+        self.description: str = description
+        self.labels: tuple[str, ...] = labels
+        self.buckets: tuple[float, ...] = buckets
+        # Значения меток -> [количество по корзинам, сумма, количество]
+        self._values: dict[tuple, list] = dict()
+        self._lock = Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        """Добавление наблюдения
+
+        Args:
+            value (float): наблюдаемое значение
+            label_values: значения меток по порядку
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(label_values)
+            if item is None:
+                item = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[label_values] = item
+            item[0][index] += 1
+            item[1] += value
+            item[2] += 1
+
+    def count(self, *label_values) -> int:
+        item = self._values.get(label_values)
+        return 0 if item is None else item[2]
+
+    def render(self) -> Iterator[str]:
+        yield '# HELP {} {}'.format(self.name, self.description)
+        yield '# TYPE {} histogram'.format(self.name)
+        with self._lock:
+            items = [
+                (label_values, list(counts), total, count)
+                for label_values, (counts, total, count)
+                in self._values.items()
+            ]
+        names = self.labels + ('le',)
+        for label_values, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(
+                self.buckets + (float('inf'),), counts
+            ):
+                cumulative += bucket_count
+                yield '{}_bucket{} {}'.format(
+                    self.name,
+                    _format_labels(
+                        names,
+                        label_values + (
+                            '+Inf' if bound == float('inf') else bound,
+                        )
+                    ),
+                    cumulative
+                )
+            labels = _format_labels(self.labels, label_values)
+            yield '{}_sum{} {}'.format(self.name, labels, total)
+            yield '{}_count{} {}'.format(self.name, labels, count)
+
+
+class Registry:
+    """Набор метрик процесса
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, object] = dict()
+        self._lock = Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(
+        self, name: str, description: str, labels: tuple[str, ...] = ()
+    ) -> Counter:
+        return self._register(Counter(name, description, labels))
+
+    def histogram(
+        self, name: str, description: str, labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def gauge(
+        self, name: str, description: str,
+        collect: Callable[[], dict[tuple, float]],
+        labels: tuple[str, ...] = ()
+    ) -> Gauge:
+        return self._register(Gauge(name, description, collect, labels))
+
+    def render(self) -> str:
+        """Выгрузка всех метрик в текстовом формате Prometheus
+
+        Returns:
+            str: текст метрик
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = list()
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Общий набор метрик процесса
+registry = Registry()
+
+# Длительность этапов обработки по типу команды
+STAGE_SECONDS = registry.histogram(
+    'hotels_stage_seconds',
+    'Длительность этапов обработки запроса',
+    labels=('stage', 'request_type')
+)
+# Запросы к API сайта
+UPSTREAM_SECONDS = registry.histogram(
+    'hotels_upstream_seconds',
+    'Длительность запросов к API hotels.com',
+    labels=('path',)
+)
+UPSTREAM_RESPONSES = registry.counter(
+    'hotels_upstream_responses_total',
+    'Ответы API hotels.com по кодам (error - ошибка соединения, ' +
+    'breaker_open - отклонен автоматом защиты)',
+    labels=('path', 'status')
+)
+UPSTREAM_RETRIES = registry.counter(
+    'hotels_upstream_retries_total',
+    'Повторные запросы к API hotels.com',
+    labels=('path',)
+)
+HEDGED_REQUESTS = registry.counter(
+    'hotels_upstream_hedged_total',
+    'Дублирующие запросы к API hotels.com (sent - отправлен, ' +
+    'won - ответ пришел раньше основного)',
+    labels=('path', 'outcome')
+)
+
+
+class Trace:
+    """Трассировка обработки одного сообщения диалога
+    """
+
+    __slots__ = ('chat_id', 'step', 'request_type', 'stages')
+
+    def __init__(
+        self, chat_id: int, step: str, request_type: Optional[str]
+    ) -> None:
+        self.chat_id: int = chat_id
+        self.step: str = step
+        self.request_type: Optional[str] = request_type
+        # (этап, длительность) в порядке завершения
+        self.stages: list[tuple[str, float]] = list()
+
+
+# Трассировка текущего сообщения, None - трассировка выключена
+current_trace: ContextVar[Optional[Trace]] = \
+    ContextVar('current_trace', default=None)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Запись длительности этапа в трассировку текущего сообщения
+
+    Args:
+        stage (str): этап
+        seconds (float): длительность
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        trace.stages.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str, request_type: Optional[str]) -> Iterator[None]:
+    """Замер длительности этапа обработки
+
+    Args:
+        stage (str): этап
+        request_type (Optional[str]): тип команды
+    """
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        seconds = perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage, request_type or '')
+        record_stage(stage, seconds)
+
+
+@contextmanager
+def traced(
+    enabled: bool, chat_id: int, step: str, request_type: Optional[str]
+) -> Iterator[None]:
+    """Трассировка обработки сообщения с выводом в лог одной строкой JSON
+
+    Args:
+        enabled (bool): включена ли трассировка
+        chat_id (int): идентификатор чата
+        step (str): шаг диалога
+        request_type (Optional[str]): тип команды
+    """
+    if not enabled:
+        yield
+        return
+    trace = Trace(chat_id, step, request_type)
+    token = current_trace.set(trace)
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        current_trace.reset(token)
+        trace_logger.info(dumps({
+            'chat_id': trace.chat_id,
+            'step': trace.step,
+            'request_type': trace.request_type,
+            'total_ms': round((perf_counter() - started) * 1000, 3),
+            'stages': [
+                [stage, round(seconds * 1000, 3)]
+                for stage, seconds in trace.stages
+            ]
+        }, ensure_ascii=False))
+
+
+class MetricsServer:
+    """Локальный HTTP-сервер выгрузки метрик в формате Prometheus
+    """
+
+    def __init__(
+        self, host: str, port: int, metrics: Registry = registry
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            host (str): адрес сервера
+            port (int): порт сервера
+            metrics (Registry, optional): набор метрик.
+                                          Defaults to registry.
+        """
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                if self.path != '/metrics':
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header(
+                    'Content-Type', 'text/plain; version=0.0.4'
+                )
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def start(self) -> None:
+        """Запуск сервера в фоновом потоке
+        """
+        Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
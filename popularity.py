@@ -0,0 +1,111 @@
+from typing import Hashable
+from typing import Optional
+from heapq import nlargest
+from threading import Lock
+from time import monotonic
+
+
+class DecayingCounter:
+    """Счетчики популярности с экспоненциальным затуханием: каждое
+        обращение добавляет 1, накопленное значение уменьшается вдвое
+        за half_life секунд
+
+    Затухание рассчитывается при обращении к счетчику, поэтому хранится
+    только значение и время его расчета
+    """
+
+    def __init__(self, half_life: float, max_size: int) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            half_life (float): время уменьшения счетчика вдвое (секунды)
+            max_size (int): максимальное количество счетчиков, при
+                            превышении удаляются наименее популярные
+        """
+        self.half_life: float = half_life
+        self.max_size: int = max_size
+        # Ключ -> (значение, время расчета значения)
+        self._counters: dict[Hashable, tuple[float, float]] = dict()
+        self._lock = Lock()
+
+    def _decayed(self, item: tuple[float, float], now: float) -> float:
+        """Значение счетчика на момент now
+
+        Args:
+            item (tuple[float, float]): значение и время его расчета
+            now (float): текущее время
+
+        Returns:
+            float: значение с учетом затухания
+        """
+        value, updated = item
+        return value * 0.5 ** ((now - updated) / self.half_life)
+
+    def hit(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Учет обращения
+
+        Args:
+            key (Hashable): ключ счетчика
+            now (Optional[float], optional): текущее время.
+                                             Defaults to None.
+
+        Returns:
+            float: новое значение счетчика
+        """
+        if now is None:
+            now = monotonic()
+        with self._lock:
+            item = self._counters.get(key)
+            value = 1 + (0 if item is None else self._decayed(item, now))
+            self._counters[key] = (value, now)
+            if len(self._counters) > self.max_size:
+                # Оставляем более популярную половину
+                self._counters = dict(nlargest(
+                    self.max_size // 2 or 1, self._counters.items(),
+                    key=lambda entry: self._decayed(entry[1], now)
+                ))
+        return value
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Текущее значение счетчика
+
+        Args:
+            key (Hashable): ключ счетчика
+            now (Optional[float], optional): текущее время.
+                                             Defaults to None.
+
+        Returns:
+            float: значение, 0 - обращений не было
+        """
+        if now is None:
+            now = monotonic()
+        with self._lock:
+            item = self._counters.get(key)
+            return 0 if item is None else self._decayed(item, now)
+
+    def top(
+        self, count: int, now: Optional[float] = None
+    ) -> list[tuple[Hashable, float]]:
+        """Самые популярные ключи
+
+        Args:
+            count (int): количество ключей
+            now (Optional[float], optional): текущее время.
+                                             Defaults to None.
+
+        Returns:
+            list[tuple[Hashable, float]]: пары (ключ, значение)
+                                          по убыванию значения
+        """
+        if now is None:
+            now = monotonic()
+        with self._lock:
+            items = list(self._counters.items())
+        return nlargest(
+            count,
+            ((key, self._decayed(item, now)) for key, item in items),
+            key=lambda entry: entry[1]
+        )
+
+    def __len__(self) -> int:
+        return len(self._counters)
@@ -0,0 +1,210 @@
+import logging
+from typing import Optional
+from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from concurrent.futures import Future
+from threading import Event
+from threading import Thread
+from hotels import HotelsClient, HotelsRequest
+from metrics import registry
+from ratelimit import RateLimiter
+from resilience import BREAKER_CLOSED
+from env import PREFETCH_TOP_K, PREFETCH_PAGES, PREFETCH_QUOTA_SHARE
+from env import PREFETCH_INTERVAL, PREFETCH_ROLLOVER_LEAD
+from env import HOTELS_RPS
+
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_PAGES_TOTAL = registry.counter(
+    'hotels_prefetch_pages_total',
+    'Страницы результатов, загруженные фоновым обновлением ' +
+    '(fetched - загружена, error - ошибка загрузки)',
+    labels=('outcome',)
+)
+registry.gauge(
+    'hotels_prefetch_tracked',
+    'Поиски с отслеживаемой популярностью',
+    lambda: {(): len(HotelsRequest.popularity)}
+)
+
+
+class Prefetcher:
+    """Фоновое обновление первых страниц результатов самых популярных
+        поисков /lowprice и /highprice
+
+    Каждые interval секунд берутся top_k поисков с наибольшей
+    популярностью (HotelsRequest.popularity), и загружаются те из первых
+    pages страниц, которые устареют до следующего прохода. Запросы
+    к сайту ограничены своей частотой, поэтому обновление занимает
+    не больше заданной доли квоты. Незадолго до полуночи загружаются
+    также страницы с датами следующего дня, а после смены даты страницы
+    с прошедшими датами удаляются из кэша.
+    """
+
+    def __init__(
+        self, top_k: int = PREFETCH_TOP_K, pages: int = PREFETCH_PAGES,
+        rate: float = PREFETCH_QUOTA_SHARE * HOTELS_RPS,
+        interval: float = PREFETCH_INTERVAL,
+        rollover_lead: float = PREFETCH_ROLLOVER_LEAD
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            top_k (int, optional): количество обновляемых поисков.
+                                   Defaults to PREFETCH_TOP_K.
+            pages (int, optional): страниц результатов на поиск.
+                                   Defaults to PREFETCH_PAGES.
+            rate (float, optional): запросов к сайту в секунду,
+                                    0 - без ограничения.
+                                    Defaults to PREFETCH_QUOTA_SHARE *
+                                    HOTELS_RPS.
+            interval (float, optional): интервал между проходами
+                                        (секунды).
+                                        Defaults to PREFETCH_INTERVAL.
+            rollover_lead (float, optional): время до полуночи, с которого
+                                             загружаются страницы
+                                             следующего дня (секунды).
+                                             Defaults to
+                                             PREFETCH_ROLLOVER_LEAD.
+        """
+        self.top_k: int = top_k
+        self.pages: int = pages
+        self.interval: float = interval
+        self.rollover_lead: float = rollover_lead
+        self.limiter = RateLimiter(rate)
+        self._day: date = date.today()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> 'Prefetcher':
+        """Запуск фонового потока обновления
+
+        Returns:
+            Prefetcher: этот же объект
+        """
+        self._thread = Thread(
+            target=self._run, name='hotels-prefetch', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Остановка фонового потока: незапущенные загрузки прохода
+            отменяются
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Ошибка фонового обновления результатов')
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """Один проход обновления
+
+        Args:
+            now (Optional[datetime], optional): текущее время.
+                                                Defaults to None.
+
+        Returns:
+            int: количество загруженных страниц
+        """
+        if now is None:
+            now = datetime.now()
+        today = now.date()
+        if today != self._day:
+            self.roll_over(today)
+        # Сайт недоступен: обновлять нечего, квоту не тратим
+        if HotelsClient.get_breaker('properties/list').state != \
+                BREAKER_CLOSED:
+            return 0
+        days = [today]
+        midnight = datetime.combine(today + timedelta(days=1), time())
+        if (midnight - now).total_seconds() <= self.rollover_lead:
+            days.append(today + timedelta(days=1))
+        searches = HotelsRequest.popularity.top(self.top_k)
+        futures: list[Future] = list()
+        # Сначала страницы текущего дня всех поисков, затем следующего
+        for day in days:
+            for (destination_id, sort_order, page_size), _ in searches:
+                for query_string, page in self._get_stale_pages(
+                    destination_id, sort_order, page_size, day
+                ):
+                    if self._stopped.is_set():
+                        for future in futures:
+                            future.cancel()
+                        return 0
+                    # Загрузки идут параллельно с частотой не выше
+                    # квоты обновления
+                    self.limiter.acquire('prefetch')
+                    futures.append(HotelsRequest._pages_executor.submit(
+                        HotelsRequest.refresh_page, query_string, page
+                    ))
+        fetched = 0
+        for future in futures:
+            if future.result() is None:
+                PREFETCH_PAGES_TOTAL.inc('error')
+            else:
+                PREFETCH_PAGES_TOTAL.inc('fetched')
+                fetched += 1
+        return fetched
+
+    def _get_stale_pages(
+        self, destination_id: str, sort_order: str, page_size: str,
+        day: date
+    ) -> list[tuple[dict[str, str], int]]:
+        """Первые страницы поиска, которые устареют до следующего прохода
+
+        Args:
+            destination_id (str): идентификатор города
+            sort_order (str): порядок сортировки
+            page_size (str): размер страницы, с которым выполнялся поиск
+            day (date): день поиска
+
+        Returns:
+            list[tuple[dict[str, str], int]]: параметры запроса и номера
+                                              страниц для загрузки
+        """
+        request = HotelsRequest()
+        request.city_id = destination_id
+        request.request_type = HotelsRequest.REQUEST_TYPES.get(sort_order)
+        query_string = request._get_query_string(day)
+        if query_string is None:
+            return []
+        # Размер страницы входит в ключ кэша, поэтому берется тот же,
+        # что у поисков пользователей
+        query_string['pageSize'] = page_size
+        fingerprint = HotelsRequest.query_fingerprint(query_string)
+        # Следующий проход начнется через interval после окончания
+        # текущего, поэтому берется запас на длительность прохода
+        return [
+            (query_string, page)
+            for page in range(1, self.pages + 1)
+            if HotelsRequest.pages_cache.fresh_for(
+                (fingerprint, page)
+            ) <= 2 * self.interval
+        ]
+
+    def roll_over(self, today: date) -> int:
+        """Смена даты: удаление из кэша страниц с прошедшими датами заезда
+
+        Args:
+            today (date): новая текущая дата
+
+        Returns:
+            int: количество удаленных страниц
+        """
+        check_in = str(today + timedelta(days=2))
+        removed = HotelsRequest.pages_cache.prune(
+            lambda key: dict(key[0]).get('checkIn', check_in) < check_in
+        )
+        self._day = today
+        logger.info('Смена даты %s: удалено страниц %s', today, removed)
+        return removed
@@ -0,0 +1,280 @@
+import logging
+from typing import Optional
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from threading import Thread
+from telebot.apihelper import ApiTelegramException
+from bot import HotelsBot
+from hotels import Hotel, HotelsRequest
+from hotels import MESSAGE_LIMIT, escape_markdown
+from metrics import registry
+from ratelimit import PRIORITY_ALERTS
+from subscriptions import Subscription, SubscriptionStore
+from env import WATCH_INTERVAL, WATCH_WORKERS, BESTDEAL_MAX_PAGES
+
+
+logger = logging.getLogger(__name__)
+
+WATCH_UPSTREAM_REQUESTS = registry.counter(
+    'hotels_watch_upstream_requests_total',
+    'Запросы страниц результатов к API hotels.com для сохраненных поисков'
+)
+WATCH_ALERTS = registry.counter(
+    'hotels_watch_alerts_total',
+    'Оповещения о снижении цен (sent - отправлено, failed - ошибка)',
+    labels=('outcome',)
+)
+
+
+class PriceWatcher:
+    """Периодическая проверка цен сохраненных поисков
+
+    Подписки группируются по параметрам запроса (город, сортировка,
+    даты, фильтры цены), поэтому каждый различный запрос выполняется
+    один раз за проход, сколько бы чатов на него ни подписалось. Цены
+    отелей сравниваются с сохраненными на прошлом проходе, чату
+    сообщается о снижении цены отелей его поиска не меньше, чем на
+    порог подписки. Оповещения отправляются через общую очередь
+    исходящих сообщений с самым низким приоритетом.
+    """
+
+    # Время хранения цен запросов без обновления (секунды)
+    SNAPSHOT_MAX_AGE = 2 * 24 * 3600
+
+    def __init__(
+        self, bot: HotelsBot, store: SubscriptionStore,
+        interval: float = WATCH_INTERVAL, workers: int = WATCH_WORKERS
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            bot (HotelsBot): бот для отправки оповещений
+            store (SubscriptionStore): хранилище подписок и цен
+            interval (float, optional): интервал между проходами
+                                        (секунды).
+                                        Defaults to WATCH_INTERVAL.
+            workers (int, optional): количество одновременно выполняемых
+                                     запросов. Defaults to WATCH_WORKERS.
+        """
+        self.bot: HotelsBot = bot
+        self.store: SubscriptionStore = store
+        self.interval: float = interval
+        # Подписок на один запрос к сайту за последний проход
+        self.batching_ratio: float = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='hotels-watch'
+        )
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        registry.gauge(
+            'hotels_watch_batching_ratio',
+            'Сохраненных поисков на один запрос к сайту за последний проход',
+            lambda: {(): self.batching_ratio}
+        )
+        registry.gauge(
+            'hotels_watch_subscriptions',
+            'Сохраненные поиски',
+            lambda: {(): len(self.store)}
+        )
+
+    def start(self) -> 'PriceWatcher':
+        """Запуск фонового потока проверки
+
+        Returns:
+            PriceWatcher: этот же объект
+        """
+        self._thread = Thread(
+            target=self._run, name='hotels-watch', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Остановка фонового потока после текущего прохода
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Ошибка проверки сохраненных поисков')
+
+    def run_once(self) -> tuple[int, int, int, int]:
+        """Один проход проверки
+
+        Returns:
+            tuple[int, int, int, int]: количество подписок, различных
+                запросов, запросов к сайту и отправленных оповещений
+        """
+        # Отпечаток запроса -> параметры запроса и подписки на него
+        groups: dict[tuple, tuple[dict[str, str], list[Subscription]]] = \
+            dict()
+        subscriptions = self.store.get_all()
+        for subscription in subscriptions:
+            query_string = subscription.request._get_query_string()
+            if query_string is None:
+                continue
+            groups.setdefault(
+                HotelsRequest.query_fingerprint(query_string),
+                (query_string, list())
+            )[1].append(subscription)
+        futures = {
+            fingerprint: self._executor.submit(
+                self._fetch, query_string,
+                subscribers[0].request.request_type
+            )
+            for fingerprint, (query_string, subscribers) in groups.items()
+        }
+        requests = 0
+        alerts: list[tuple[Subscription, Future]] = list()
+        for fingerprint, future in futures.items():
+            hotels, pages = future.result()
+            requests += pages
+            if hotels is None:
+                continue
+            previous = self.store.get_snapshot(fingerprint)
+            self.store.set_snapshot(fingerprint, {
+                hotel.name: hotel.price
+                for hotel in hotels if hotel.price is not None
+            })
+            # Первый проход запроса только запоминает цены
+            if previous is None:
+                continue
+            for subscription in groups[fingerprint][1]:
+                drops = self._get_drops(subscription, hotels, previous)
+                if drops:
+                    alerts.append((
+                        subscription,
+                        self.bot.submit_message(
+                            subscription.chat_id,
+                            self._format_alert(subscription, drops),
+                            parse_mode='MarkdownV2',
+                            priority=PRIORITY_ALERTS
+                        )
+                    ))
+        sent = self._wait_alerts(alerts)
+        self.store.purge_snapshots(self.SNAPSHOT_MAX_AGE)
+        self.batching_ratio = len(subscriptions) / requests if requests else 0
+        logger.info(
+            'Проверка сохраненных поисков: подписок %s, запросов %s, ' +
+            'запросов к сайту %s (%.1f подписки на запрос), оповещений %s',
+            len(subscriptions), len(groups), requests,
+            self.batching_ratio, sent
+        )
+        return len(subscriptions), len(groups), requests, sent
+
+    @staticmethod
+    def _fetch(
+        query_string: dict[str, str], request_type: str
+    ) -> tuple[Optional[list[Hotel]], int]:
+        """Загрузка свежих страниц результатов запроса в обход кэшей
+
+        Для /lowprice и /highprice достаточно первой страницы, для
+        /bestdeal загружается столько же страниц, сколько при поиске
+
+        Args:
+            query_string (dict[str, str]): параметры запроса
+            request_type (str): тип поиска
+
+        Returns:
+            tuple[Optional[list[Hotel]], int]: отели страниц в порядке
+                выдачи (None - ошибка загрузки) и количество запросов
+        """
+        max_pages = BESTDEAL_MAX_PAGES if request_type == 'bestdeal' else 1
+        page_size = int(query_string['pageSize'])
+        hotels: list[Hotel] = list()
+        for page in range(1, max_pages + 1):
+            WATCH_UPSTREAM_REQUESTS.inc()
+            page_hotels = HotelsRequest.refresh_page(query_string, page)
+            if page_hotels is None:
+                return None, page
+            hotels.extend(page_hotels)
+            if len(page_hotels) < page_size:
+                return hotels, page
+        return hotels, max_pages
+
+    @staticmethod
+    def _get_drops(
+        subscription: Subscription, hotels: list[Hotel],
+        previous: dict[str, int]
+    ) -> list[tuple[Hotel, int]]:
+        """Отели поиска подписки, цена которых снизилась не меньше порога
+
+        Args:
+            subscription (Subscription): подписка
+            hotels (list[Hotel]): отели запроса
+            previous (dict[str, int]): цены прошлого прохода
+
+        Returns:
+            list[tuple[Hotel, int]]: отель и его прежняя цена
+        """
+        share = 1 - subscription.min_drop / 100
+        return [
+            (hotel, previous[hotel.name])
+            for hotel in subscription.request.select_hotels(hotels)
+            if hotel.name in previous and
+            hotel.price <= previous[hotel.name] * share
+        ]
+
+    @staticmethod
+    def _format_alert(
+        subscription: Subscription, drops: list[tuple[Hotel, int]]
+    ) -> str:
+        """Текст оповещения в разметке MarkdownV2
+
+        Args:
+            subscription (Subscription): подписка
+            drops (list[tuple[Hotel, int]]): отели и их прежние цены
+
+        Returns:
+            str: текст, не длиннее сообщения телеграма
+        """
+        text = escape_markdown('Цены снизились: {}\r\n\r\n'.format(
+            HotelsBot.describe_search(subscription.request)
+        ))
+        for hotel, price in drops:
+            line = '*{}*\r\n{}\r\n{} → {} руб\\.\r\n\r\n'.format(
+                escape_markdown(hotel.name[:HotelsRequest.MAX_FIELD_LENGTH]),
+                escape_markdown(
+                    hotel.address[:HotelsRequest.MAX_FIELD_LENGTH]
+                ),
+                price, hotel.price
+            )
+            if len(text) + len(line) > MESSAGE_LIMIT:
+                break
+            text += line
+        return text
+
+    def _wait_alerts(self, alerts: list[tuple[Subscription, Future]]) -> int:
+        """Ожидание отправки оповещений, подписки чатов, заблокировавших
+            бота, удаляются
+
+        Args:
+            alerts (list[tuple[Subscription, Future]]): подписки
+                                                         и отправки
+
+        Returns:
+            int: количество отправленных оповещений
+        """
+        sent = 0
+        for subscription, future in alerts:
+            try:
+                future.result()
+            except ApiTelegramException as error:
+                WATCH_ALERTS.inc('failed')
+                if error.error_code == 403:
+                    self.store.remove_chat(subscription.chat_id)
+                else:
+                    logger.warning('Ошибка отправки оповещения: %s', error)
+            except Exception:
+                WATCH_ALERTS.inc('failed')
+                logger.exception('Ошибка отправки оповещения')
+            else:
+                WATCH_ALERTS.inc('sent')
+                sent += 1
+        return sent
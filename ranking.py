@@ -0,0 +1,102 @@
+from typing import Any
+from typing import Iterable
+from array import array
+from heapq import nsmallest
+
+
+class RankingColumns:
+    """Кандидаты для ранжирования в колоночном представлении: цены
+        и расстояния в массивах array, сами кандидаты - в параллельном
+        списке
+
+    Отсутствующие цена или расстояние хранятся как NaN, такие кандидаты
+    не проходят ни один фильтр
+    """
+
+    __slots__ = ('prices', 'distances', 'items')
+
+    def __init__(self) -> None:
+        self.prices = array('d')
+        self.distances = array('d')
+        self.items: list[Any] = list()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def extend(
+        self, items: list[Any], prices: Iterable[float],
+        distances: Iterable[float]
+    ) -> None:
+        """Добавление кандидатов
+
+        Args:
+            items (list[Any]): кандидаты
+            prices (Iterable[float]): цены кандидатов
+            distances (Iterable[float]): расстояния кандидатов
+        """
+        self.items.extend(items)
+        self.prices.extend(prices)
+        self.distances.extend(distances)
+
+    def select(
+        self, min_price: float, max_price: float,
+        min_distance: float, max_distance: float
+    ) -> list[int]:
+        """Отбор кандидатов по диапазонам цены и расстояния
+            одним проходом по колонкам
+
+        Args:
+            min_price (float): минимальная цена
+            max_price (float): максимальная цена
+            min_distance (float): минимальное расстояние
+            max_distance (float): максимальное расстояние
+
+        Returns:
+            list[int]: номера подходящих кандидатов
+        """
+        return [
+            index
+            for index, (price, distance) in enumerate(
+                zip(self.prices, self.distances)
+            )
+            if min_price <= price <= max_price and
+            min_distance <= distance <= max_distance
+        ]
+
+    def top(
+        self, count: int, min_price: float, max_price: float,
+        min_distance: float, max_distance: float, price_weight: float = 0.5
+    ) -> list[Any]:
+        """Лучшие кандидаты по совокупной оценке цены и расстояния
+
+        Цена и расстояние приводятся к долям своих диапазонов,
+        оценка - их взвешенная сумма (меньше - лучше)
+
+        Args:
+            count (int): количество кандидатов
+            min_price (float): минимальная цена
+            max_price (float): максимальная цена
+            min_distance (float): минимальное расстояние
+            max_distance (float): максимальное расстояние
+            price_weight (float, optional): вес цены в оценке, вес
+                                            расстояния - 1 - price_weight.
+                                            Defaults to 0.5.
+
+        Returns:
+            list[Any]: кандидаты от лучшего к худшему
+        """
+        selected = self.select(
+            min_price, max_price, min_distance, max_distance
+        )
+        prices, distances = self.prices, self.distances
+        price_scale = price_weight / max(max_price - min_price, 1)
+        distance_scale = \
+            (1 - price_weight) / max(max_distance - min_distance, 1e-3)
+        best = nsmallest(
+            count, selected,
+            key=lambda index: (
+                (prices[index] - min_price) * price_scale +
+                (distances[index] - min_distance) * distance_scale
+            )
+        )
+        return [self.items[index] for index in best]
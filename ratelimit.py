@@ -0,0 +1,353 @@
+import heapq
+import logging
+from typing import Any
+from typing import Callable
+from typing import Optional
+from concurrent.futures import Future
+from itertools import count
+from threading import Condition
+from threading import Lock
+from threading import Thread
+from time import monotonic
+from time import sleep
+from telebot.apihelper import ApiTelegramException
+from metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих сообщений телеграма (меньше - важнее)
+PRIORITY_RESULTS = 0
+PRIORITY_DIALOG = 1
+PRIORITY_HELP = 2
+PRIORITY_ALERTS = 3
+PRIORITY_NAMES = {
+    PRIORITY_RESULTS: 'results',
+    PRIORITY_DIALOG: 'dialog',
+    PRIORITY_HELP: 'help',
+    PRIORITY_ALERTS: 'alerts'
+}
+
+RATE_LIMIT_WAIT = registry.histogram(
+    'hotels_rate_limit_wait_seconds',
+    'Ожидание разрешения на исходящий запрос',
+    labels=('target',)
+)
+RETRY_AFTER = registry.counter(
+    'hotels_telegram_retry_after_total',
+    'Ответы телеграма 429 с retry_after'
+)
+
+
+class RateLimiter:
+    """Ограничитель частоты запросов по алгоритму маркерной корзины
+        (в форме GCRA: хранится только расчетное время следующего запроса)
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            rate (float): запросов в секунду, 0 - без ограничения
+            burst (int, optional): размер корзины (запросов подряд без
+                                   ожидания). Defaults to 1.
+        """
+        self.rate: float = rate
+        self.burst: int = max(burst, 1)
+        self._tat: float = 0
+        self._lock = Lock()
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """Резервирование разрешения на запрос
+
+        Args:
+            now (Optional[float], optional): текущее время.
+                                             Defaults to None.
+
+        Returns:
+            float: момент времени (monotonic), начиная с которого
+                   запрос разрешен
+        """
+        if self.rate <= 0:
+            return 0
+        if now is None:
+            now = monotonic()
+        interval = 1 / self.rate
+        with self._lock:
+            tat = max(self._tat, now)
+            allowed_at = tat - interval * (self.burst - 1)
+            self._tat = tat + interval
+        return max(allowed_at, now)
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        """Получение разрешения на запрос, только если ждать не нужно
+
+        Args:
+            now (Optional[float], optional): текущее время.
+                                             Defaults to None.
+
+        Returns:
+            bool: True - запрос разрешен сейчас
+        """
+        if self.rate <= 0:
+            return True
+        if now is None:
+            now = monotonic()
+        interval = 1 / self.rate
+        with self._lock:
+            tat = max(self._tat, now)
+            if tat - interval * (self.burst - 1) > now:
+                return False
+            self._tat = tat + interval
+        return True
+
+    def pause(self, until: float) -> None:
+        """Запрет запросов до указанного момента (например, retry_after)
+
+        Args:
+            until (float): момент времени (monotonic)
+        """
+        with self._lock:
+            self._tat = max(
+                self._tat, until + (self.burst - 1) / max(self.rate, 1e-9)
+            )
+
+    def acquire(self, target: str = '') -> None:
+        """Ожидание разрешения на запрос
+
+        Args:
+            target (str, optional): назначение запросов для метрик.
+                                    Defaults to ''.
+        """
+        delay = self.reserve() - monotonic()
+        RATE_LIMIT_WAIT.observe(max(delay, 0), target)
+        if delay > 0:
+            sleep(delay)
+
+
+class TelegramScheduler:
+    """Планировщик исходящих вызовов API телеграма
+
+    Вызовы выполняются рабочими потоками в порядке приоритета с общим
+    ограничением частоты и ограничением частоты по чату. Вызов чата,
+    исчерпавшего лимит, откладывается и не задерживает другие чаты.
+    Ответ 429 приостанавливает отправку на retry_after секунд, после
+    чего вызов повторяется.
+    """
+
+    def __init__(
+        self, global_rate: float, chat_rate: float, chat_burst: int = 1,
+        workers: int = 4, max_retries: int = 3
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            global_rate (float): сообщений в секунду по всем чатам
+            chat_rate (float): сообщений в секунду в один чат
+            chat_burst (int, optional): сообщений подряд в один чат без
+                                        ожидания. Defaults to 1.
+            workers (int, optional): количество рабочих потоков.
+                                     Defaults to 4.
+            max_retries (int, optional): повторов после ответа 429.
+                                         Defaults to 3.
+        """
+        self.global_limiter = RateLimiter(global_rate, burst=workers)
+        self.chat_rate: float = chat_rate
+        self.chat_burst: int = chat_burst
+        self.workers: int = workers
+        self.max_retries: int = max_retries
+        self._chat_limiters: dict[int, RateLimiter] = dict()
+        # Готовые к отправке: (приоритет, номер, вызов)
+        self._ready: list[tuple] = list()
+        # Отложенные: (момент отправки, приоритет, номер, вызов)
+        self._delayed: list[tuple] = list()
+        self._sequence = count()
+        # Вызовы в очереди и выполняющиеся
+        self._pending: int = 0
+        self._condition = Condition()
+        self._threads: list[Thread] = list()
+        registry.gauge(
+            'hotels_telegram_queue_depth',
+            'Вызовы API телеграма в очереди по приоритетам',
+            self._collect_depth,
+            labels=('priority',)
+        )
+
+    def _collect_depth(self) -> dict[tuple, float]:
+        with self._condition:
+            depth = {(name,): 0 for name in PRIORITY_NAMES.values()}
+            for item in self._ready:
+                depth[(PRIORITY_NAMES.get(item[0], str(item[0])),)] += 1
+            for item in self._delayed:
+                depth[(PRIORITY_NAMES.get(item[1], str(item[1])),)] += 1
+        return depth
+
+    def _chat_ready_at(self, chat_id: int, now: float) -> float:
+        """Резервирование разрешения на сообщение в чат
+
+        Args:
+            chat_id (int): идентификатор чата
+            now (float): текущее время
+
+        Returns:
+            float: момент, начиная с которого сообщение разрешено
+        """
+        limiter = self._chat_limiters.get(chat_id)
+        if limiter is None:
+            # Удаляем давно неактивные чаты
+            if len(self._chat_limiters) > 10000:
+                self._chat_limiters = {
+                    chat: chat_limiter
+                    for chat, chat_limiter in self._chat_limiters.items()
+                    if chat_limiter._tat > now
+                }
+            limiter = RateLimiter(self.chat_rate, self.chat_burst)
+            self._chat_limiters[chat_id] = limiter
+        return limiter.reserve(now)
+
+    def _push(self, ready_at: float, priority: int, call: list) -> None:
+        """Постановка вызова в очередь (под блокировкой)
+        """
+        if ready_at <= monotonic():
+            heapq.heappush(
+                self._ready, (priority, next(self._sequence), call)
+            )
+        else:
+            heapq.heappush(
+                self._delayed,
+                (ready_at, priority, next(self._sequence), call)
+            )
+        self._condition.notify()
+
+    def submit(
+        self, chat_id: int, priority: int, func: Callable, /,
+        *args, **kwargs
+    ) -> Future:
+        """Постановка вызова API телеграма в очередь
+
+        Args:
+            chat_id (int): идентификатор чата
+            priority (int): приоритет вызова
+            func (Callable): вызов API
+
+        Returns:
+            Future: результат вызова
+        """
+        future: Future = Future()
+        # Вызов: функция, аргументы, результат, идентификатор чата, повторы
+        call = [func, args, kwargs, future, chat_id, 0]
+        with self._condition:
+            if not self._threads:
+                self._start()
+            self._pending += 1
+            self._push(
+                self._chat_ready_at(chat_id, monotonic()), priority, call
+            )
+        return future
+
+    def call(
+        self, chat_id: int, priority: int, func: Callable, /,
+        *args, **kwargs
+    ) -> Any:
+        """Вызов API телеграма через очередь с ожиданием результата
+
+        Args:
+            chat_id (int): идентификатор чата
+            priority (int): приоритет вызова
+            func (Callable): вызов API
+
+        Returns:
+            Any: результат вызова
+        """
+        return self.submit(chat_id, priority, func, *args, **kwargs).result()
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Ожидание выполнения всех вызовов в очереди
+
+        Args:
+            timeout (Optional[float], optional): максимальное время
+                ожидания (секунды), None - без ограничения.
+                Defaults to None.
+
+        Returns:
+            bool: True - очередь пуста
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending, timeout
+            )
+
+    def _done(self) -> None:
+        """Учет завершенного вызова
+        """
+        with self._condition:
+            self._pending -= 1
+            if not self._pending:
+                self._condition.notify_all()
+
+    def _start(self) -> None:
+        for index in range(self.workers):
+            thread = Thread(
+                target=self._work,
+                name='telegram-sender-{}'.format(index),
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _take(self) -> tuple[int, list]:
+        """Получение следующего вызова по приоритету с ожиданием
+
+        Returns:
+            tuple[int, list]: приоритет и вызов
+        """
+        with self._condition:
+            while True:
+                now = monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, priority, sequence, call = \
+                        heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (priority, sequence, call))
+                if self._ready:
+                    priority, _, call = heapq.heappop(self._ready)
+                    return priority, call
+                timeout = None
+                if self._delayed:
+                    timeout = self._delayed[0][0] - now
+                self._condition.wait(timeout)
+
+    def _work(self) -> None:
+        """Цикл рабочего потока
+        """
+        while True:
+            priority, call = self._take()
+            func, args, kwargs, future, chat_id, retries = call
+            self.global_limiter.acquire('telegram')
+            try:
+                result = func(*args, **kwargs)
+            except ApiTelegramException as error:
+                retry_after = error.result_json.get(
+                    'parameters', {}
+                ).get('retry_after')
+                if (
+                    error.error_code != 429 or retry_after is None or
+                    retries >= self.max_retries
+                ):
+                    future.set_exception(error)
+                    self._done()
+                    continue
+                RETRY_AFTER.inc()
+                logger.warning(
+                    'Телеграм ограничил отправку на %s с', retry_after
+                )
+                until = monotonic() + float(retry_after)
+                self.global_limiter.pause(until)
+                call[5] = retries + 1
+                with self._condition:
+                    self._push(until, priority, call)
+                continue
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+            self._done()
@@ -0,0 +1,165 @@
+from typing import Optional
+from collections import deque
+from threading import Lock
+from time import monotonic
+
+
+# Состояния автомата защиты
+BREAKER_CLOSED = 0
+BREAKER_OPEN = 1
+BREAKER_HALF_OPEN = 2
+BREAKER_STATES = {
+    BREAKER_CLOSED: 'closed',
+    BREAKER_OPEN: 'open',
+    BREAKER_HALF_OPEN: 'half_open'
+}
+
+
+class CircuitBreaker:
+    """Автомат защиты от недоступного сайта (circuit breaker)
+
+    Считает ошибки среди последних window запросов. Когда доля ошибок
+    достигает error_rate, автомат размыкается и запросы сразу
+    отклоняются. Через cooldown секунд пропускается один пробный запрос:
+    успех замыкает автомат, ошибка размыкает снова
+    """
+
+    def __init__(
+        self, window: int, error_rate: float, cooldown: float,
+        min_calls: Optional[int] = None
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            window (int): количество последних запросов для подсчета ошибок
+            error_rate (float): доля ошибок, при которой автомат
+                                размыкается, 0 - автомат отключен
+            cooldown (float): время до пробного запроса (секунды)
+            min_calls (Optional[int], optional): минимальное количество
+                запросов для решения, None - половина окна.
+                Defaults to None.
+        """
+        self.error_rate: float = error_rate
+        self.cooldown: float = cooldown
+        self.min_calls: int = \
+            max(window // 2, 1) if min_calls is None else min_calls
+        self.state: int = BREAKER_CLOSED
+        # Количество размыканий
+        self.opened: int = 0
+        # Результаты последних запросов: True - ошибка
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._errors: int = 0
+        self._opened_at: float = 0
+        # Поколение автомата меняется при каждой смене состояния
+        # и при пропуске пробного запроса, поэтому результаты запросов,
+        # разрешенных раньше, не влияют на новое состояние
+        self._generation: int = 1
+        self._probing: bool = False
+        self._lock = Lock()
+
+    def allow(self) -> Optional[int]:
+        """Разрешение на запрос
+
+        Returns:
+            Optional[int]: поколение автомата для передачи в record,
+                           None - автомат разомкнут
+        """
+        if self.state == BREAKER_CLOSED:
+            return self._generation
+        with self._lock:
+            if self.state == BREAKER_OPEN:
+                if monotonic() - self._opened_at < self.cooldown:
+                    return None
+                self.state = BREAKER_HALF_OPEN
+            if self.state == BREAKER_HALF_OPEN:
+                # Пока пробный запрос не завершен, остальные отклоняются
+                if self._probing:
+                    return None
+                self._probing = True
+                self._generation += 1
+            return self._generation
+
+    def record(self, generation: int, success: bool) -> None:
+        """Учет результата разрешенного запроса, вызывается для каждого
+            разрешения, в том числе при исключении во время запроса
+
+        Args:
+            generation (int): поколение, полученное от allow
+            success (bool): True - сайт ответил без ошибки
+        """
+        if self.error_rate <= 0:
+            return
+        with self._lock:
+            # Запрос разрешен до смены состояния
+            if generation != self._generation:
+                return
+            if self.state == BREAKER_HALF_OPEN:
+                self._probing = False
+                if success:
+                    self.state = BREAKER_CLOSED
+                    self._generation += 1
+                    self._outcomes.clear()
+                    self._errors = 0
+                else:
+                    self._open()
+                return
+            if self.state != BREAKER_CLOSED:
+                return
+            if len(self._outcomes) == self._outcomes.maxlen:
+                self._errors -= self._outcomes[0]
+            self._outcomes.append(not success)
+            self._errors += not success
+            if (
+                len(self._outcomes) >= self.min_calls and
+                self._errors >= self.error_rate * len(self._outcomes)
+            ):
+                self._open()
+
+    def _open(self) -> None:
+        """Размыкание автомата (вызывается под блокировкой)
+        """
+        self.state = BREAKER_OPEN
+        self.opened += 1
+        self._generation += 1
+        self._opened_at = monotonic()
+
+
+class LatencyTracker:
+    """Задержки последних успешных ответов для расчета процентиля
+    """
+
+    def __init__(self, size: int, min_samples: int = 20) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            size (int): количество хранимых задержек
+            min_samples (int, optional): минимальное количество задержек
+                                         для расчета. Defaults to 20.
+        """
+        self.min_samples: int = min_samples
+        self._samples: deque[float] = deque(maxlen=size)
+        self._lock = Lock()
+
+    def add(self, seconds: float) -> None:
+        """Добавление задержки ответа
+
+        Args:
+            seconds (float): задержка (секунды)
+        """
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, share: float) -> Optional[float]:
+        """Процентиль задержек
+
+        Args:
+            share (float): доля от 0 до 1
+
+        Returns:
+            Optional[float]: задержка, None - задержек еще мало
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(int(share * len(samples)), len(samples) - 1)]
@@ -0,0 +1,257 @@
+import sqlite3
+from abc import ABC
+from abc import abstractmethod
+from typing import Callable
+from typing import Optional
+from collections import OrderedDict
+from json import dumps
+from json import loads
+from threading import RLock
+from time import monotonic
+from time import time
+from hotels import HotelsRequest
+
+
+class SessionStore(ABC):
+    """Хранилище запросов пользователей (сессий) по идентификатору чата
+
+    Поддерживает обращение как к словарю. Изменения полей полученного
+    запроса сохраняются вызовом save.
+    """
+
+    @abstractmethod
+    def get(self, chat_id: int) -> Optional[HotelsRequest]:
+        """Получение запроса чата
+
+        Args:
+            chat_id (int): идентификатор чата
+
+        Returns:
+            Optional[HotelsRequest]: запрос или None, если сессии нет
+                                     или она вытеснена
+        """
+
+    @abstractmethod
+    def set(self, chat_id: int, request: HotelsRequest) -> None:
+        """Сохранение нового запроса чата
+
+        Args:
+            chat_id (int): идентификатор чата
+            request (HotelsRequest): запрос
+        """
+
+    @abstractmethod
+    def delete(self, chat_id: int) -> None:
+        """Удаление сессии чата
+
+        Args:
+            chat_id (int): идентификатор чата
+        """
+
+    def save(self, chat_id: int) -> None:
+        """Сохранение изменений запроса чата
+
+        Args:
+            chat_id (int): идентификатор чата
+        """
+
+    def __getitem__(self, chat_id: int) -> HotelsRequest:
+        request = self.get(chat_id)
+        if request is None:
+            raise KeyError(chat_id)
+        return request
+
+    def __setitem__(self, chat_id: int, request: HotelsRequest) -> None:
+        self.set(chat_id, request)
+
+    def __delitem__(self, chat_id: int) -> None:
+        self.delete(chat_id)
+
+    def __contains__(self, chat_id: int) -> bool:
+        return self.get(chat_id) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """Хранилище сессий в памяти с вытеснением неактивных сессий
+        и ограничением количества сессий
+    """
+
+    def __init__(self, max_size: int, idle_ttl: float) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            max_size (int): максимальное количество сессий, при превышении
+                            вытесняются самые давно активные
+            idle_ttl (float): время неактивности (секунды), после которого
+                              сессия удаляется
+        """
+        self.max_size: int = max_size
+        self.idle_ttl: float = idle_ttl
+        # Идентификатор чата -> (время последнего обращения, запрос),
+        # порядок - от давно активных к недавним
+        self._sessions: OrderedDict[int, tuple[float, HotelsRequest]] = \
+            OrderedDict()
+        self._lock = RLock()
+        self.evictions: int = 0
+
+    def _evict(self, now: float) -> None:
+        """Удаление неактивных сессий и сессий сверх максимального количества
+
+        Args:
+            now (float): текущее время
+        """
+        while self._sessions:
+            chat_id, (last_access, _) = next(iter(self._sessions.items()))
+            if (
+                len(self._sessions) <= self.max_size and
+                now - last_access < self.idle_ttl
+            ):
+                return
+            del self._sessions[chat_id]
+            self.evictions += 1
+
+    def get(self, chat_id: int) -> Optional[HotelsRequest]:
+        now = monotonic()
+        with self._lock:
+            item = self._sessions.get(chat_id)
+            if item is None:
+                return None
+            if now - item[0] >= self.idle_ttl:
+                del self._sessions[chat_id]
+                self.evictions += 1
+                return None
+            self._sessions[chat_id] = (now, item[1])
+            self._sessions.move_to_end(chat_id)
+            return item[1]
+
+    def set(self, chat_id: int, request: HotelsRequest) -> None:
+        now = monotonic()
+        with self._lock:
+            self._sessions[chat_id] = (now, request)
+            self._sessions.move_to_end(chat_id)
+            self._evict(now)
+
+    def delete(self, chat_id: int) -> None:
+        with self._lock:
+            self._sessions.pop(chat_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Хранилище сессий в базе SQLite, сохраняющее незавершенные диалоги
+        между перезапусками бота
+
+    Активные сессии дополнительно хранятся в памяти, поэтому изменения
+    полей полученного запроса видны сразу, а в базу попадают при save.
+    """
+
+    # Количество записей в базу между очистками устаревших сессий
+    PURGE_EVERY = 1000
+
+    def __init__(
+        self, path: str, max_size: int, idle_ttl: float,
+        factory: Callable[[dict], HotelsRequest] = HotelsRequest.from_dict
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            path (str): путь к файлу базы
+            max_size (int): максимальное количество сессий
+            idle_ttl (float): время неактивности (секунды), после которого
+                              сессия удаляется
+            factory (Callable[[dict], HotelsRequest], optional): функция
+                восстановления запроса из словаря.
+                Defaults to HotelsRequest.from_dict.
+        """
+        self.max_size: int = max_size
+        self.idle_ttl: float = idle_ttl
+        self._factory: Callable[[dict], HotelsRequest] = factory
+        self._memory = MemorySessionStore(max_size, idle_ttl)
+        self._lock = RLock()
+        self._writes: int = 0
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False
+        )
+        with self._connection:
+            # Одну базу используют рабочие процессы многопроцессного режима
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS sessions ('
+                'chat_id INTEGER PRIMARY KEY, '
+                'data TEXT NOT NULL, '
+                'last_access REAL NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS sessions_last_access '
+                'ON sessions (last_access)'
+            )
+        self.purge()
+
+    def purge(self) -> None:
+        """Удаление из базы неактивных сессий и сессий сверх
+            максимального количества
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM sessions WHERE last_access < ?',
+                (time() - self.idle_ttl,)
+            )
+            self._connection.execute(
+                'DELETE FROM sessions WHERE chat_id IN ('
+                'SELECT chat_id FROM sessions ORDER BY last_access DESC '
+                'LIMIT -1 OFFSET ?)',
+                (self.max_size,)
+            )
+
+    def get(self, chat_id: int) -> Optional[HotelsRequest]:
+        with self._lock:
+            request = self._memory.get(chat_id)
+            if request is not None:
+                return request
+            row = self._connection.execute(
+                'SELECT data, last_access FROM sessions WHERE chat_id = ?',
+                (chat_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time() - row[1] >= self.idle_ttl:
+                self.delete(chat_id)
+                return None
+            request = self._factory(loads(row[0]))
+            self._memory.set(chat_id, request)
+            return request
+
+    def set(self, chat_id: int, request: HotelsRequest) -> None:
+        with self._lock:
+            self._memory.set(chat_id, request)
+            with self._connection:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO sessions '
+                    '(chat_id, data, last_access) VALUES (?, ?, ?)',
+                    (chat_id, dumps(request.to_dict()), time())
+                )
+            # Периодически удаляем устаревшие сессии
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self.purge()
+
+    def save(self, chat_id: int) -> None:
+        with self._lock:
+            request = self._memory.get(chat_id)
+            if request is not None:
+                self.set(chat_id, request)
+
+    def delete(self, chat_id: int) -> None:
+        with self._lock:
+            self._memory.delete(chat_id)
+            with self._connection:
+                self._connection.execute(
+                    'DELETE FROM sessions WHERE chat_id = ?', (chat_id,)
+                )
+
+    def __len__(self) -> int:
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM sessions'
+        ).fetchone()[0]
@@ -0,0 +1,488 @@
+import logging
+import queue
+from typing import Callable
+from typing import Optional
+from argparse import ArgumentParser
+from bisect import bisect
+from collections import OrderedDict
+from functools import partial
+from hashlib import md5
+from itertools import count
+from multiprocessing import get_context
+from multiprocessing.process import BaseProcess
+from threading import Lock
+from threading import Thread
+from time import sleep
+from urllib.parse import urlparse
+from telebot import TeleBot
+from telebot import apihelper
+from telebot.types import Update
+from bot import HotelsBot
+from hotels import HotelsClient, HotelsRequest
+from metrics import registry, MetricsServer
+from prefetch import Prefetcher
+from pricewatch import PriceWatcher
+from ratelimit import RateLimiter
+from sharedcache import SharedCache
+from sessions import SQLiteSessionStore
+from subscriptions import SubscriptionStore
+from webhook import WebhookServer, get_update_chat_id
+from webhook import get_secret_token, set_webhook
+from env import BOT_TOKEN, TELEGRAM_API_URL
+from env import WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_URL, WEBHOOK_SECRET
+from env import SHARD_WORKERS, SHARD_LANES, SHARD_MAX_PENDING
+from env import TELEGRAM_GLOBAL_RATE, HOTELS_RPS, HOTELS_BURST
+from env import SESSION_DB, SESSION_MAX_SIZE, SESSION_IDLE_TTL
+from env import SHARED_CACHE_DB, SHARED_CACHE_SIZE
+from env import METRICS_HOST, METRICS_PORT
+from env import CITY_INDEX
+from env import PREFETCH_TOP_K, PREFETCH_QUOTA_SHARE
+from env import WATCH_DB, WATCH_MAX_PER_CHAT
+
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    """Равномерный хэш строки для кольца
+
+    Args:
+        value (str): строка
+
+    Returns:
+        int: 64-битный хэш
+    """
+    return int.from_bytes(md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Согласованное хэширование чатов по рабочим процессам: при
+        изменении количества процессов переходит только часть чатов,
+        приходящаяся на добавленные или убранные процессы
+    """
+
+    def __init__(self, nodes: int, replicas: int = 1024) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            nodes (int): количество рабочих процессов
+            replicas (int, optional): точек кольца на процесс.
+                                      Defaults to 1024.
+        """
+        points = sorted(
+            (_hash('{}:{}'.format(node, replica)), node)
+            for node in range(nodes)
+            for replica in range(replicas)
+        )
+        self._hashes: list[int] = [point[0] for point in points]
+        self._nodes: list[int] = [point[1] for point in points]
+
+    def get_node(self, key: int) -> int:
+        """Рабочий процесс для чата
+
+        Args:
+            key (int): идентификатор чата
+
+        Returns:
+            int: номер рабочего процесса
+        """
+        position = bisect(self._hashes, _hash(str(key)))
+        return self._nodes[position % len(self._nodes)]
+
+
+def make_worker_bot(index: int, workers: int) -> HotelsBot:
+    """Создание бота рабочего процесса по настройкам файла env
+
+    Квоты запросов к телеграму и к сайту делятся между процессами
+    поровну, ограничение частоты по чату не меняется: чат всегда
+    обрабатывается одним процессом
+
+    Args:
+        index (int): номер рабочего процесса
+        workers (int): количество рабочих процессов
+
+    Returns:
+        HotelsBot: бот с обработчиками сообщений и нажатий кнопок
+    """
+    if TELEGRAM_API_URL:
+        apihelper.API_URL = TELEGRAM_API_URL
+    if METRICS_PORT:
+        MetricsServer(METRICS_HOST, METRICS_PORT + 1 + index).start()
+    HotelsBot._scheduler.global_limiter = RateLimiter(
+        TELEGRAM_GLOBAL_RATE / workers,
+        burst=HotelsBot._scheduler.global_limiter.burst
+    )
+    HotelsClient.rate_limiter = RateLimiter(
+        HOTELS_RPS / workers, burst=max(HOTELS_BURST // workers, 1)
+    )
+    if SHARED_CACHE_DB:
+        HotelsRequest.shared_cache = \
+            SharedCache(SHARED_CACHE_DB, SHARED_CACHE_SIZE)
+    # Индекс городов общий для процессов: каждый добавляет в файл
+    # найденные им города
+    HotelsRequest.city_index.start(CITY_INDEX)
+    if PREFETCH_TOP_K:
+        Prefetcher(rate=PREFETCH_QUOTA_SHARE * HOTELS_RPS / workers).start()
+    session_store = None
+    if SESSION_DB:
+        session_store = SQLiteSessionStore(
+            SESSION_DB,
+            max_size=SESSION_MAX_SIZE,
+            idle_ttl=SESSION_IDLE_TTL
+        )
+    subscriptions = None
+    if WATCH_DB:
+        subscriptions = SubscriptionStore(WATCH_DB, WATCH_MAX_PER_CHAT)
+    bot = HotelsBot(
+        BOT_TOKEN, threaded=False, session_store=session_store,
+        subscriptions=subscriptions
+    )
+    bot.add_default_handlers()
+    # Подписки общие для процессов, цены проверяет только первый процесс
+    if subscriptions is not None and index == 0:
+        PriceWatcher(bot, subscriptions).start()
+    return bot
+
+
+def run_worker(
+    index: int, updates: queue.Queue, acks: queue.Queue,
+    make_bot: Callable[[int], HotelsBot], lanes: int
+) -> None:
+    """Цикл рабочего процесса: обработка обновлений своих чатов
+
+    Обновления распределяются по потокам-полосам по чату, поэтому
+    обновления одного чата обрабатываются по порядку. После обработки
+    номер обновления отправляется в очередь подтверждений.
+
+    Args:
+        index (int): номер рабочего процесса
+        updates (queue.Queue): очередь обновлений (номер, обновление),
+                               None - завершение работы
+        acks (queue.Queue): очередь подтверждений обработки
+        make_bot (Callable[[int], HotelsBot]): создание бота по номеру
+                                               процесса
+        lanes (int): количество потоков обработки
+    """
+    bot = make_bot(index)
+
+    def work(lane: queue.Queue) -> None:
+        while True:
+            item = lane.get()
+            if item is None:
+                return
+            sequence, update = item
+            try:
+                bot.process_new_updates([Update.de_json(update)])
+            except Exception:
+                logger.exception('Ошибка обработки обновления')
+            acks.put(sequence)
+
+    lane_queues: list[queue.Queue] = [queue.Queue() for _ in range(lanes)]
+    threads = [
+        Thread(target=work, args=(lane,), daemon=True)
+        for lane in lane_queues
+    ]
+    for thread in threads:
+        thread.start()
+    while True:
+        item = updates.get()
+        if item is None:
+            break
+        lane_queues[get_update_chat_id(item[1]) % lanes].put(item)
+    for lane in lane_queues:
+        lane.put(None)
+    for thread in threads:
+        thread.join()
+
+
+class ShardWorker:
+    """Слот рабочего процесса: процесс, его очереди и обновления,
+        отправленные процессу, но еще не подтвержденные
+    """
+
+    __slots__ = ('process', 'updates', 'acks', 'pending', 'restarts')
+
+    def __init__(self) -> None:
+        self.process: Optional[BaseProcess] = None
+        self.updates = None
+        self.acks = None
+        # Номер обновления -> обновление, в порядке отправки
+        self.pending: OrderedDict[int, dict] = OrderedDict()
+        self.restarts: int = 0
+
+
+class ShardFront:
+    """Входной процесс многопроцессного режима: направляет обновления
+        рабочим процессам по согласованному хэшу чата
+
+    Диалог чата всегда обрабатывается одним процессом. Остановившийся
+    процесс перезапускается, и новый процесс получает все обновления,
+    которые старый не подтвердил, в исходном порядке. Обновление,
+    обработка которого прервалась, может быть обработано повторно.
+    """
+
+    def __init__(
+        self, workers: int, lanes: int, max_pending: int,
+        make_bot: Callable[[int], HotelsBot]
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            workers (int): количество рабочих процессов
+            lanes (int): количество потоков обработки в процессе
+            max_pending (int): максимальное количество неподтвержденных
+                               обновлений процесса
+            make_bot (Callable[[int], HotelsBot]): создание бота
+                по номеру процесса (функция уровня модуля)
+        """
+        self.lanes: int = lanes
+        self.max_pending: int = max_pending
+        self.ring = HashRing(workers)
+        self.workers: list[ShardWorker] = [
+            ShardWorker() for _ in range(workers)
+        ]
+        self._make_bot = make_bot
+        self._context = get_context('spawn')
+        self._sequence = count()
+        self._lock = Lock()
+        self._stopping: bool = False
+        registry.gauge(
+            'hotels_shard_pending',
+            'Неподтвержденные обновления рабочих процессов',
+            lambda: {
+                (str(index),): len(worker.pending)
+                for index, worker in enumerate(self.workers)
+            },
+            labels=('worker',)
+        )
+        registry.gauge(
+            'hotels_shard_restarts',
+            'Перезапуски рабочих процессов',
+            lambda: {
+                (str(index),): worker.restarts
+                for index, worker in enumerate(self.workers)
+            },
+            labels=('worker',)
+        )
+
+    def start(self) -> None:
+        """Запуск рабочих процессов и потока наблюдения за ними
+        """
+        for index in range(len(self.workers)):
+            self._start_worker(index)
+        Thread(target=self._watch, daemon=True).start()
+
+    def _start_worker(self, index: int) -> None:
+        """Запуск процесса слота с новыми очередями, в очередь
+            обновлений сразу попадают неподтвержденные обновления
+
+        Args:
+            index (int): номер слота
+        """
+        worker = self.workers[index]
+        with self._lock:
+            updates = self._context.Queue()
+            acks = self._context.Queue()
+            for item in worker.pending.items():
+                updates.put(item)
+            worker.updates, worker.acks = updates, acks
+        worker.process = self._context.Process(
+            target=run_worker,
+            args=(index, updates, acks, self._make_bot, self.lanes),
+            name='hotels-worker-{}'.format(index),
+            daemon=True
+        )
+        worker.process.start()
+        Thread(
+            target=self._collect_acks, args=(worker, acks), daemon=True
+        ).start()
+
+    def _collect_acks(self, worker: ShardWorker, acks: queue.Queue) -> None:
+        """Цикл приема подтверждений процесса слота, завершается при
+            замене очередей слота
+
+        Args:
+            worker (ShardWorker): слот
+            acks (queue.Queue): очередь подтверждений процесса
+        """
+        while worker.acks is acks:
+            try:
+                sequence = acks.get(timeout=1)
+            except queue.Empty:
+                continue
+            with self._lock:
+                worker.pending.pop(sequence, None)
+
+    def _watch(self) -> None:
+        """Перезапуск остановившихся рабочих процессов
+        """
+        while not self._stopping:
+            for index, worker in enumerate(self.workers):
+                if not self._stopping and not worker.process.is_alive():
+                    logger.warning(
+                        'Рабочий процесс %s остановился (код %s), ' +
+                        'перезапуск с %s обновлениями',
+                        index, worker.process.exitcode, len(worker.pending)
+                    )
+                    worker.restarts += 1
+                    self._start_worker(index)
+            sleep(0.5)
+
+    def route(self, update: dict) -> bool:
+        """Передача обновления рабочему процессу его чата
+
+        Args:
+            update (dict): обновление телеграма в виде словаря
+
+        Returns:
+            bool: False - у процесса слишком много неподтвержденных
+                  обновлений, обновление не принято
+        """
+        worker = self.workers[self.ring.get_node(get_update_chat_id(update))]
+        with self._lock:
+            if len(worker.pending) >= self.max_pending:
+                return False
+            sequence = next(self._sequence)
+            worker.pending[sequence] = update
+            worker.updates.put((sequence, update))
+        return True
+
+    def pending(self) -> int:
+        """Количество неподтвержденных обновлений всех процессов
+
+        Returns:
+            int: количество обновлений
+        """
+        with self._lock:
+            return sum(len(worker.pending) for worker in self.workers)
+
+    def stop(self, timeout: float = 30) -> None:
+        """Остановка рабочих процессов после обработки их очередей
+
+        Args:
+            timeout (float, optional): время ожидания каждого процесса
+                                       (секунды). Defaults to 30.
+        """
+        self._stopping = True
+        for worker in self.workers:
+            worker.updates.put(None)
+        for worker in self.workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.acks = None
+
+    def poll(self, token: str, long_polling_timeout: int = 20) -> None:
+        """Прием обновлений длинным опросом телеграма и передача их
+            рабочим процессам
+
+        Args:
+            token (str): токен телеграм бота
+            long_polling_timeout (int, optional): таймаут длинного опроса.
+                                                  Defaults to 20.
+        """
+        offset: Optional[int] = None
+        while True:
+            try:
+                updates = apihelper.get_updates(
+                    token, offset, None, long_polling_timeout, None,
+                    long_polling_timeout
+                )
+            except Exception:
+                logger.exception('Ошибка получения обновлений')
+                sleep(1)
+                continue
+            for update in updates:
+                offset = update['update_id'] + 1
+                # Процесс чата перегружен - ждем подтверждений
+                while not self.route(update):
+                    sleep(0.05)
+
+
+class ShardedWebhookServer(WebhookServer):
+    """Прием обновлений вебхуком с передачей их рабочим процессам
+        вместо рабочих потоков
+    """
+
+    def __init__(
+        self, front: ShardFront, host: str, port: int,
+        secret_token: str, path: str = '/'
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            front (ShardFront): распределение обновлений по процессам
+            host (str): адрес для входящих соединений
+            port (int): порт для входящих соединений
+            secret_token (str): ожидаемый секретный токен
+            path (str, optional): путь вебхука. Defaults to '/'.
+        """
+        super().__init__(
+            None, host, port, secret_token, path=path, workers=0
+        )
+        self.front: ShardFront = front
+
+    def enqueue(self, update: dict) -> bool:
+        """Передача обновления рабочему процессу его чата
+
+        Args:
+            update (dict): обновление телеграма в виде словаря
+
+        Returns:
+            bool: False - процесс перегружен, телеграм повторит запрос
+        """
+        if not self.front.route(update):
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+
+# Рабочие процессы запускаются методом spawn и импортируют этот модуль
+# заново, поэтому запуск входного процесса - только при запуске модуля
+if __name__ == '__main__':
+    parser = ArgumentParser(
+        description='Многопроцессный режим бота: входной процесс ' +
+                    'принимает обновления и направляет их рабочим ' +
+                    'процессам по чатам'
+    )
+    parser.add_argument('--workers', type=int, default=SHARD_WORKERS,
+                        help='количество рабочих процессов')
+    parser.add_argument('--lanes', type=int, default=SHARD_LANES,
+                        help='потоков обработки в рабочем процессе')
+    parser.add_argument('--front', choices=('polling', 'webhook'),
+                        default='polling',
+                        help='прием обновлений опросом или вебхуком')
+    args = parser.parse_args()
+    # Вебхук без секретного токена не запускается
+    if args.front == 'webhook':
+        try:
+            secret_token = get_secret_token(WEBHOOK_SECRET, WEBHOOK_URL)
+        except ValueError as error:
+            parser.error(str(error))
+
+    logging.basicConfig(level=logging.INFO)
+    if TELEGRAM_API_URL:
+        apihelper.API_URL = TELEGRAM_API_URL
+    # Метрики входного процесса, рабочие процессы отдают свои метрики
+    # на следующих портах
+    if METRICS_PORT:
+        MetricsServer(METRICS_HOST, METRICS_PORT).start()
+    front = ShardFront(
+        args.workers, args.lanes, SHARD_MAX_PENDING,
+        partial(make_worker_bot, workers=args.workers)
+    )
+    front.start()
+    if args.front == 'webhook':
+        server = ShardedWebhookServer(
+            front,
+            host=WEBHOOK_HOST,
+            port=WEBHOOK_PORT,
+            secret_token=secret_token,
+            path=(urlparse(WEBHOOK_URL).path or '/') if WEBHOOK_URL else '/'
+        )
+        if WEBHOOK_URL:
+            set_webhook(TeleBot(BOT_TOKEN), WEBHOOK_URL, secret_token)
+        server.serve_forever()
+    else:
+        front.poll(BOT_TOKEN)
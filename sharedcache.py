@@ -0,0 +1,118 @@
+import sqlite3
+from typing import Any
+from typing import Hashable
+from typing import Optional
+from json import dumps
+from json import loads
+from threading import Lock
+from time import time
+
+
+class SharedCache:
+    """Общий для процессов одной машины кэш в файле SQLite: второй
+        уровень после кэшей процесса, через него рабочие процессы бота
+        получают найденные другими процессами города и страницы
+        результатов без запроса к сайту
+
+    Ключи и значения хранятся в JSON, записи разделяются по видам
+    (например, 'cities' и 'pages')
+    """
+
+    # Количество записей между очистками устаревших значений
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, max_size: int) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            path (str): путь к файлу базы
+            max_size (int): максимальное количество записей
+        """
+        self.max_size: int = max_size
+        # Счетчики попаданий и промахов
+        self.hits: int = 0
+        self.misses: int = 0
+        self._lock = Lock()
+        self._writes: int = 0
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False
+        )
+        with self._lock, self._connection:
+            # Чтение не блокируется записью других процессов
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'kind TEXT NOT NULL, '
+                'key TEXT NOT NULL, '
+                'value TEXT NOT NULL, '
+                'expires REAL NOT NULL, '
+                'PRIMARY KEY (kind, key))'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+
+    def get(self, kind: str, key: Hashable) -> Optional[Any]:
+        """Получение значения
+
+        Args:
+            kind (str): вид записи
+            key (Hashable): ключ записи
+
+        Returns:
+            Optional[Any]: значение, None - записи нет или она устарела
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM cache '
+                'WHERE kind = ? AND key = ? AND expires > ?',
+                (kind, dumps(key, ensure_ascii=False), time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return loads(row[0])
+
+    def set(self, kind: str, key: Hashable, value: Any, ttl: float) -> None:
+        """Сохранение значения
+
+        Args:
+            kind (str): вид записи
+            key (Hashable): ключ записи
+            value (Any): значение, сохраняемое в JSON
+            ttl (float): время жизни записи (секунды)
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO cache (kind, key, value, expires) '
+                'VALUES (?, ?, ?, ?)',
+                (
+                    kind, dumps(key, ensure_ascii=False),
+                    dumps(value, ensure_ascii=False), time() + ttl
+                )
+            )
+            # Периодически удаляем устаревшие записи
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._purge()
+
+    def _purge(self) -> None:
+        """Удаление устаревших записей и записей сверх максимального
+            количества (вызывается под блокировкой)
+        """
+        self._connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time(),)
+        )
+        self._connection.execute(
+            'DELETE FROM cache WHERE rowid IN ('
+            'SELECT rowid FROM cache ORDER BY expires DESC '
+            'LIMIT -1 OFFSET ?)',
+            (self.max_size,)
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()[0]
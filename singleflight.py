@@ -0,0 +1,86 @@
+from typing import Any
+from typing import Callable
+from typing import Hashable
+from typing import Optional
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
+from threading import Lock
+from metrics import registry
+
+
+COALESCED = registry.counter(
+    'hotels_coalesced_total',
+    'Запросы к API hotels.com, объединенные с уже выполняющимися',
+    labels=('kind',)
+)
+WAIT_TIMEOUTS = registry.counter(
+    'hotels_coalesced_timeouts_total',
+    'Истечения времени ожидания объединенного запроса',
+    labels=('kind',)
+)
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременно выполняющихся запросов:
+        функция выполняется один раз, результат или исключение получают
+        все ожидающие
+    """
+
+    def __init__(self, kind: str, timeout: Optional[float] = None) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            kind (str): вид запросов для метрик
+            timeout (Optional[float], optional): максимальное время
+                ожидания чужого запроса (секунды), None - без ограничения.
+                Defaults to None.
+        """
+        self.kind: str = kind
+        self.timeout: Optional[float] = timeout
+        self._calls: dict[Hashable, Future] = dict()
+        self._lock = Lock()
+
+    def do(
+        self, key: Hashable, func: Callable[[], Any],
+        timeout_result: Any = None
+    ) -> Any:
+        """Выполнение запроса или ожидание такого же выполняющегося
+
+        Args:
+            key (Hashable): ключ запроса
+            func (Callable[[], Any]): функция запроса
+            timeout_result (Any, optional): результат при истечении времени
+                ожидания чужого запроса. Defaults to None.
+
+        Returns:
+            Any: результат функции
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                # Запущенный запрос нельзя отменить из ожидающего потока
+                future.set_running_or_notify_cancel()
+                self._calls[key] = future
+        if not leader:
+            COALESCED.inc(self.kind)
+            try:
+                return future.result(self.timeout)
+            except TimeoutError:
+                WAIT_TIMEOUTS.inc(self.kind)
+                return timeout_result
+        try:
+            result = func()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
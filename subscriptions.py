@@ -0,0 +1,248 @@
+import sqlite3
+from typing import Callable
+from typing import Optional
+from json import dumps
+from json import loads
+from threading import Lock
+from time import time
+from hotels import HotelsRequest
+
+
+class Subscription:
+    """Сохраненный поиск чата для слежения за ценами
+    """
+
+    __slots__ = ('subscription_id', 'chat_id', 'request', 'min_drop')
+
+    def __init__(
+        self, subscription_id: int, chat_id: int, request: HotelsRequest,
+        min_drop: float
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            subscription_id (int): номер подписки
+            chat_id (int): идентификатор чата
+            request (HotelsRequest): сохраненный запрос
+            min_drop (float): снижение цены отеля в процентах, о котором
+                              сообщается в чат
+        """
+        self.subscription_id: int = subscription_id
+        self.chat_id: int = chat_id
+        self.request: HotelsRequest = request
+        self.min_drop: float = min_drop
+
+
+class SubscriptionStore:
+    """Подписки на сохраненные поиски и последние цены запросов
+        в базе SQLite
+
+    Цены хранятся по ключу запроса (отпечатку параметров с датами), общему
+    для всех подписок с одинаковыми параметрами
+    """
+
+    def __init__(
+        self, path: str, max_per_chat: int,
+        factory: Callable[[dict], HotelsRequest] = HotelsRequest.from_dict
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            path (str): путь к файлу базы
+            max_per_chat (int): максимальное количество подписок чата
+            factory (Callable[[dict], HotelsRequest], optional): функция
+                восстановления запроса из словаря.
+                Defaults to HotelsRequest.from_dict.
+        """
+        self.max_per_chat: int = max_per_chat
+        self._factory: Callable[[dict], HotelsRequest] = factory
+        self._lock = Lock()
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False
+        )
+        with self._lock, self._connection:
+            # Подписки добавляются рабочими процессами бота параллельно
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS subscriptions ('
+                'subscription_id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'chat_id INTEGER NOT NULL, '
+                'request TEXT NOT NULL, '
+                'min_drop REAL NOT NULL, '
+                'created REAL NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS subscriptions_chat_id '
+                'ON subscriptions (chat_id)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS snapshots ('
+                'query TEXT PRIMARY KEY, '
+                'prices TEXT NOT NULL, '
+                'updated REAL NOT NULL)'
+            )
+
+    def _make_subscription(self, row: tuple) -> Subscription:
+        """Подписка из строки таблицы
+
+        Args:
+            row (tuple): номер, чат, запрос, снижение цены
+
+        Returns:
+            Subscription: подписка
+        """
+        return Subscription(
+            row[0], row[1], self._factory(loads(row[2])), row[3]
+        )
+
+    def add(
+        self, chat_id: int, request: HotelsRequest, min_drop: float
+    ) -> Optional[int]:
+        """Сохранение поиска чата
+
+        Args:
+            chat_id (int): идентификатор чата
+            request (HotelsRequest): запрос с заполненными параметрами
+            min_drop (float): снижение цены в процентах для оповещения
+
+        Returns:
+            Optional[int]: номер подписки, None - у чата уже
+                           максимальное количество подписок
+        """
+        data = request.to_dict()
+        # Шаг диалога к сохраненному поиску не относится
+        data['step'] = None
+        with self._lock, self._connection:
+            count = self._connection.execute(
+                'SELECT COUNT(*) FROM subscriptions WHERE chat_id = ?',
+                (chat_id,)
+            ).fetchone()[0]
+            if count >= self.max_per_chat:
+                return None
+            return self._connection.execute(
+                'INSERT INTO subscriptions '
+                '(chat_id, request, min_drop, created) VALUES (?, ?, ?, ?)',
+                (chat_id, dumps(data, ensure_ascii=False), min_drop, time())
+            ).lastrowid
+
+    def remove(self, chat_id: int, subscription_id: int) -> bool:
+        """Удаление подписки чата
+
+        Args:
+            chat_id (int): идентификатор чата
+            subscription_id (int): номер подписки
+
+        Returns:
+            bool: True - подписка удалена
+        """
+        with self._lock, self._connection:
+            return self._connection.execute(
+                'DELETE FROM subscriptions '
+                'WHERE chat_id = ? AND subscription_id = ?',
+                (chat_id, subscription_id)
+            ).rowcount > 0
+
+    def remove_chat(self, chat_id: int) -> int:
+        """Удаление всех подписок чата (например, бот заблокирован)
+
+        Args:
+            chat_id (int): идентификатор чата
+
+        Returns:
+            int: количество удаленных подписок
+        """
+        with self._lock, self._connection:
+            return self._connection.execute(
+                'DELETE FROM subscriptions WHERE chat_id = ?', (chat_id,)
+            ).rowcount
+
+    def get_chat(self, chat_id: int) -> list[Subscription]:
+        """Подписки чата
+
+        Args:
+            chat_id (int): идентификатор чата
+
+        Returns:
+            list[Subscription]: подписки в порядке добавления
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT subscription_id, chat_id, request, min_drop '
+                'FROM subscriptions WHERE chat_id = ? '
+                'ORDER BY subscription_id',
+                (chat_id,)
+            ).fetchall()
+        return [self._make_subscription(row) for row in rows]
+
+    def get_all(self) -> list[Subscription]:
+        """Все подписки
+
+        Returns:
+            list[Subscription]: подписки в порядке добавления
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT subscription_id, chat_id, request, min_drop '
+                'FROM subscriptions ORDER BY subscription_id'
+            ).fetchall()
+        return [self._make_subscription(row) for row in rows]
+
+    @staticmethod
+    def _query_key(fingerprint: tuple) -> str:
+        return dumps(fingerprint, ensure_ascii=False)
+
+    def get_snapshot(self, fingerprint: tuple) -> Optional[dict[str, int]]:
+        """Последние цены отелей запроса
+
+        Args:
+            fingerprint (tuple): отпечаток параметров запроса
+
+        Returns:
+            Optional[dict[str, int]]: название отеля -> цена,
+                                      None - цены еще не сохранялись
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT prices FROM snapshots WHERE query = ?',
+                (self._query_key(fingerprint),)
+            ).fetchone()
+        return None if row is None else loads(row[0])
+
+    def set_snapshot(self, fingerprint: tuple, prices: dict[str, int]) -> None:
+        """Сохранение цен отелей запроса
+
+        Args:
+            fingerprint (tuple): отпечаток параметров запроса
+            prices (dict[str, int]): название отеля -> цена
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO snapshots (query, prices, updated) '
+                'VALUES (?, ?, ?)',
+                (
+                    self._query_key(fingerprint),
+                    dumps(prices, ensure_ascii=False), time()
+                )
+            )
+
+    def purge_snapshots(self, max_age: float) -> int:
+        """Удаление цен запросов, которые давно не обновлялись (запросы
+            с прошедшими датами или без подписок)
+
+        Args:
+            max_age (float): время с последнего обновления (секунды)
+
+        Returns:
+            int: количество удаленных записей
+        """
+        with self._lock, self._connection:
+            return self._connection.execute(
+                'DELETE FROM snapshots WHERE updated < ?',
+                (time() - max_age,)
+            ).rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM subscriptions'
+            ).fetchone()[0]
@@ -0,0 +1,37 @@
+import asyncio
+import unittest
+from async_bot import AsyncHotelsBot
+
+
+class ChatLockTest(unittest.TestCase):
+    """Последовательная обработка сообщений одного чата
+    """
+
+    def test_messages_of_chat_do_not_overlap(self) -> None:
+        bot = AsyncHotelsBot('1:test')
+        running = 0
+        overlaps = 0
+
+        async def handle() -> None:
+            nonlocal running, overlaps
+            async with bot._chat_lock(1):
+                running += 1
+                overlaps += running > 1
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        async def run() -> None:
+            second = asyncio.create_task(handle())
+            await handle()
+            # Третье сообщение приходит, когда первое освободило
+            # блокировку, а второе еще не продолжило работу
+            third = asyncio.create_task(handle())
+            await asyncio.gather(second, third)
+
+        asyncio.run(run())
+        self.assertEqual(overlaps, 0)
+        self.assertEqual(bot._chat_locks, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+from typing import Optional
+from threading import Lock
+from time import monotonic
+from unittest import mock
+from telebot import TeleBot
+from telebot.types import Message
+from bot import HotelsBot
+from hotels import HotelsRequest
+from ratelimit import TelegramScheduler
+
+
+class CheckedRequest(HotelsRequest):
+    """Запрос, который считает существующим любой город и запоминает
+        проверенные имена
+    """
+
+    checked: list[str] = list()
+
+    def is_city_exists(self, city_name: str) -> Optional[bool]:
+        self.checked.append(city_name)
+        self.city_id, self.city_name = '1', city_name.lower()
+        return True
+
+
+class SearchCommandTest(unittest.TestCase):
+    """Разбор параметров поиска в строке команды
+    """
+
+    def setUp(self) -> None:
+        CheckedRequest.checked = list()
+        self.bot = HotelsBot('1:test', threaded=False)
+        self.bot._request_class = CheckedRequest
+        self.sent: list[str] = list()
+        self.searches: list[int] = list()
+        self.bot.send_message = \
+            lambda chat_id, text, *args, **kwargs: self.sent.append(text)
+        self.bot.register_next_step_handler = \
+            lambda *args, **kwargs: None
+        self.bot._run_search = \
+            lambda message: self.searches.append(message.chat.id)
+
+    def send(self, text: str) -> int:
+        """Сообщение к боту от чата 1
+
+        Args:
+            text (str): текст сообщения
+
+        Returns:
+            int: идентификатор чата
+        """
+        self.bot.parse_command(Message.de_json({
+            'message_id': 1, 'date': 0, 'text': text,
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'test'}
+        }))
+        return 1
+
+    def test_split_arguments(self) -> None:
+        split = HotelsBot._split_arguments
+        self.assertEqual(split(['Нижний', 'Новгород'], 1),
+                         ('Нижний Новгород', []))
+        self.assertEqual(split(['Нижний', 'Новгород', '5'], 1),
+                         ('Нижний Новгород', ['5']))
+        self.assertEqual(
+            split(['Москва', '1000', '5000', '0,5', '3', '5'], 5),
+            ('Москва', ['1000', '5000', '0,5', '3', '5'])
+        )
+        # Числа перед параметрами - часть имени города
+        self.assertEqual(split(['Город', '12', '5'], 1), ('Город 12', ['5']))
+        self.assertEqual(split(['Москва', '1000', '5000'], 5),
+                         ('Москва', ['1000', '5000']))
+        self.assertEqual(split([], 1), ('', []))
+
+    def test_multiword_city_without_count(self) -> None:
+        chat_id = self.send('/lowprice Нижний Новгород')
+        self.assertEqual(CheckedRequest.checked, ['Нижний Новгород'])
+        request = self.bot._users_cookies[chat_id]
+        self.assertIsNone(request.hotels_count)
+        # Количество отелей бот спрашивает, поиск не начинается
+        self.assertEqual(self.searches, [])
+        self.assertEqual(
+            self.sent, [self.bot._parameters['hotels_count'][1]]
+        )
+
+    def test_multiword_city_with_count(self) -> None:
+        chat_id = self.send('/lowprice Нижний Новгород 5')
+        self.assertEqual(CheckedRequest.checked, ['Нижний Новгород'])
+        self.assertEqual(self.bot._users_cookies[chat_id].hotels_count, 5)
+        self.assertEqual(self.searches, [chat_id])
+
+
+
+def make_message(chat_id: int, text: str) -> Message:
+    """Сообщение к боту
+
+    Args:
+        chat_id (int): идентификатор чата
+        text (str): текст сообщения
+
+    Returns:
+        Message: сообщение
+    """
+    return Message.de_json({
+        'message_id': 1, 'date': 0, 'text': text,
+        'chat': {'id': chat_id, 'type': 'private'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'test'}
+    })
+
+
+class ChatRateTest(unittest.TestCase):
+    """Ограничение частоты сообщений в чат не задерживает другие чаты
+    """
+
+    def test_throttled_chat_does_not_block_handler(self) -> None:
+        bot = HotelsBot('1:test', threaded=False)
+        bot._scheduler = TelegramScheduler(
+            global_rate=0, chat_rate=2, chat_burst=1, workers=2
+        )
+        sent: dict[int, float] = dict()
+        lock = Lock()
+
+        def send_message(self, chat_id: int, *args, **kwargs) -> None:
+            with lock:
+                sent.setdefault(chat_id, monotonic())
+
+        started = monotonic()
+        with mock.patch.object(TeleBot, 'send_message', send_message):
+            for _ in range(8):
+                bot.parse_command(make_message(1, '/help'))
+            bot.parse_command(make_message(2, '/help'))
+            handled = monotonic() - started
+            bot._scheduler.submit(2, 0, lambda: None).result(5)
+        # Восемь сообщений в чат 1 отправляются четыре секунды,
+        # обработчик и ответ чату 2 их не ждут
+        self.assertLess(handled, 0.5)
+        self.assertLess(sent[2] - started, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
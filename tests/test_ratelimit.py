@@ -0,0 +1,60 @@
+import unittest
+from ratelimit import RateLimiter
+
+
+class RateLimiterTest(unittest.TestCase):
+    """Ограничитель частоты по алгоритму GCRA
+    """
+
+    def test_reserve_burst_then_interval(self) -> None:
+        limiter = RateLimiter(10, burst=3)
+        allowed = [limiter.reserve(100) for _ in range(5)]
+        # Корзина пропускает три запроса сразу, дальше - раз в 0.1 с
+        for actual, expected in zip(allowed, (100, 100, 100, 100.1, 100.2)):
+            self.assertAlmostEqual(actual, expected)
+
+    def test_reserve_refills_over_time(self) -> None:
+        limiter = RateLimiter(10, burst=2)
+        for _ in range(2):
+            self.assertEqual(limiter.reserve(100), 100)
+        self.assertAlmostEqual(limiter.reserve(100), 100.1)
+        # Через секунду корзина снова полная
+        for _ in range(2):
+            self.assertEqual(limiter.reserve(101), 101)
+
+    def test_try_acquire(self) -> None:
+        limiter = RateLimiter(10, burst=2)
+        self.assertTrue(limiter.try_acquire(100))
+        self.assertTrue(limiter.try_acquire(100))
+        self.assertFalse(limiter.try_acquire(100))
+        # Отказ не расходует разрешение
+        self.assertFalse(limiter.try_acquire(100.05))
+        self.assertTrue(limiter.try_acquire(100.1))
+        self.assertFalse(limiter.try_acquire(100.1))
+
+    def test_pause(self) -> None:
+        limiter = RateLimiter(10, burst=2)
+        self.assertTrue(limiter.try_acquire(100))
+        limiter.pause(200)
+        self.assertFalse(limiter.try_acquire(199.9))
+        self.assertTrue(limiter.try_acquire(200))
+        # После паузы корзина не переполнена: следующий через интервал
+        self.assertFalse(limiter.try_acquire(200))
+        self.assertAlmostEqual(limiter.reserve(200), 200.1)
+
+    def test_pause_does_not_shorten(self) -> None:
+        limiter = RateLimiter(10)
+        limiter.pause(200)
+        limiter.pause(150)
+        self.assertFalse(limiter.try_acquire(199))
+        self.assertTrue(limiter.try_acquire(200))
+
+    def test_unlimited(self) -> None:
+        limiter = RateLimiter(0, burst=1)
+        for _ in range(100):
+            self.assertTrue(limiter.try_acquire(100))
+        self.assertEqual(limiter.reserve(100), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
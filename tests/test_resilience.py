@@ -0,0 +1,125 @@
+import unittest
+from time import sleep
+from unittest import mock
+from hotels import HotelsClient
+from ratelimit import RateLimiter
+from resilience import CircuitBreaker
+from resilience import BREAKER_CLOSED, BREAKER_OPEN, BREAKER_HALF_OPEN
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """Переходы автомата защиты между состояниями
+    """
+
+    def make_open(self, cooldown: float = 0) -> CircuitBreaker:
+        """Автомат, разомкнутый двумя ошибками подряд
+
+        Args:
+            cooldown (float, optional): время до пробного запроса.
+                                        Defaults to 0.
+
+        Returns:
+            CircuitBreaker: разомкнутый автомат
+        """
+        breaker = CircuitBreaker(window=4, error_rate=0.5, cooldown=cooldown)
+        for _ in range(2):
+            breaker.record(breaker.allow(), False)
+        self.assertEqual(breaker.state, BREAKER_OPEN)
+        return breaker
+
+    def test_opens_on_error_rate(self) -> None:
+        breaker = CircuitBreaker(window=4, error_rate=0.5, cooldown=60)
+        for success in (True, True, False):
+            breaker.record(breaker.allow(), success)
+        self.assertEqual(breaker.state, BREAKER_CLOSED)
+        breaker.record(breaker.allow(), False)
+        self.assertEqual(breaker.state, BREAKER_OPEN)
+        self.assertEqual(breaker.opened, 1)
+        self.assertIsNone(breaker.allow())
+
+    def test_disabled(self) -> None:
+        breaker = CircuitBreaker(window=4, error_rate=0, cooldown=60)
+        for _ in range(10):
+            breaker.record(breaker.allow(), False)
+        self.assertEqual(breaker.state, BREAKER_CLOSED)
+
+    def test_single_probe_after_cooldown(self) -> None:
+        breaker = self.make_open(cooldown=0.05)
+        self.assertIsNone(breaker.allow())
+        sleep(0.06)
+        probe = breaker.allow()
+        self.assertIsNotNone(probe)
+        self.assertEqual(breaker.state, BREAKER_HALF_OPEN)
+        # Пока пробный запрос не завершен, остальные отклоняются
+        self.assertIsNone(breaker.allow())
+        breaker.record(probe, True)
+        self.assertEqual(breaker.state, BREAKER_CLOSED)
+        self.assertIsNotNone(breaker.allow())
+
+    def test_failed_probe_reopens(self) -> None:
+        breaker = self.make_open()
+        breaker.record(breaker.allow(), False)
+        self.assertEqual(breaker.state, BREAKER_OPEN)
+        self.assertEqual(breaker.opened, 2)
+
+    def test_stale_call_is_not_probe(self) -> None:
+        breaker = CircuitBreaker(window=4, error_rate=0.5, cooldown=0)
+        # Медленный запрос разрешен до размыкания
+        slow = breaker.allow()
+        for _ in range(2):
+            breaker.record(breaker.allow(), False)
+        probe = breaker.allow()
+        self.assertEqual(breaker.state, BREAKER_HALF_OPEN)
+        breaker.record(slow, True)
+        self.assertEqual(breaker.state, BREAKER_HALF_OPEN)
+        breaker.record(probe, False)
+        self.assertEqual(breaker.state, BREAKER_OPEN)
+        # Результат запроса прошлого поколения не замыкает автомат
+        breaker.record(slow, True)
+        self.assertEqual(breaker.state, BREAKER_OPEN)
+
+
+class HotelsClientBreakerTest(unittest.TestCase):
+    """Учет исключений запроса к сайту автоматом защиты
+    """
+
+    PATH = 'test/breaker'
+
+    def setUp(self) -> None:
+        self.breaker = CircuitBreaker(window=4, error_rate=0.5, cooldown=0)
+        HotelsClient.breakers[self.PATH] = self.breaker
+        patcher = mock.patch.object(HotelsClient, 'rate_limiter',
+                                    RateLimiter(0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(HotelsClient.breakers.pop, self.PATH, None)
+
+    def test_exception_between_allow_and_record(self) -> None:
+        for _ in range(2):
+            self.breaker.record(self.breaker.allow(), False)
+        with mock.patch.object(
+            HotelsClient, '_send', side_effect=ConnectionError
+        ), mock.patch.object(
+            HotelsClient, '_get_hedge_delay', return_value=None
+        ):
+            with self.assertRaises(ConnectionError):
+                HotelsClient.get(self.PATH, {})
+        # Пробный запрос завершился ошибкой: автомат снова разомкнут,
+        # а после паузы пропускает новый пробный запрос
+        self.assertEqual(self.breaker.state, BREAKER_OPEN)
+        self.assertIsNotNone(self.breaker.allow())
+
+    def test_exception_counts_as_error(self) -> None:
+        with mock.patch.object(
+            HotelsClient, '_send', side_effect=ValueError
+        ), mock.patch.object(
+            HotelsClient, '_get_hedge_delay', return_value=None
+        ):
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    HotelsClient.get(self.PATH, {})
+        self.assertEqual(self.breaker.state, BREAKER_OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from threading import Event
+from threading import Thread
+from time import sleep
+from singleflight import COALESCED
+from singleflight import SingleFlight
+from singleflight import WAIT_TIMEOUTS
+
+
+class SingleFlightTest(unittest.TestCase):
+    """Объединение одинаковых одновременных запросов
+    """
+
+    def run_waiter(
+        self, flight: SingleFlight, key: str, results: list
+    ) -> Thread:
+        """Запуск ожидающего потока, пока запрос лидера выполняется
+
+        Args:
+            flight (SingleFlight): объединитель запросов
+            key (str): ключ запроса
+            results (list): результат или исключение ожидающего
+
+        Returns:
+            Thread: ожидающий поток
+        """
+        def wait() -> None:
+            try:
+                results.append(flight.do(key, self.fail, 'timeout'))
+            except BaseException as error:
+                results.append(error)
+
+        thread = Thread(target=wait)
+        thread.start()
+        return thread
+
+    def lead(self, flight: SingleFlight, key: str, outcome) -> tuple:
+        """Запрос лидера, который завершается после входа ожидающего
+
+        Args:
+            flight (SingleFlight): объединитель запросов
+            key (str): ключ запроса
+            outcome: результат запроса или исключение
+
+        Returns:
+            tuple: результат или исключение лидера и ожидающего
+        """
+        started = Event()
+        release = Event()
+        waiter: list = list()
+
+        def func():
+            started.set()
+            release.wait(5)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+
+        leader: list = list()
+
+        def run() -> None:
+            try:
+                leader.append(flight.do(key, func))
+            except BaseException as error:
+                leader.append(error)
+
+        thread = Thread(target=run)
+        thread.start()
+        self.assertTrue(started.wait(5))
+        coalesced = COALESCED.value(flight.kind)
+        waiter_thread = self.run_waiter(flight, key, waiter)
+        # Ожидающий должен успеть присоединиться к запросу лидера
+        while COALESCED.value(flight.kind) == coalesced:
+            sleep(0.001)
+        release.set()
+        thread.join(5)
+        waiter_thread.join(5)
+        return leader[0], waiter[0]
+
+    def test_result_shared(self) -> None:
+        flight = SingleFlight('test')
+        leader, waiter = self.lead(flight, 'key', 42)
+        self.assertEqual(leader, 42)
+        self.assertEqual(waiter, 42)
+        self.assertEqual(len(flight), 0)
+
+    def test_exception_propagates_to_waiter(self) -> None:
+        flight = SingleFlight('test')
+        error = ValueError('upstream')
+        leader, waiter = self.lead(flight, 'key', error)
+        self.assertIs(leader, error)
+        self.assertIs(waiter, error)
+        self.assertEqual(len(flight), 0)
+        # После ошибки запрос выполняется заново
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+
+    def test_waiter_timeout(self) -> None:
+        flight = SingleFlight('test-timeout', timeout=0.05)
+        started = Event()
+        release = Event()
+
+        def func() -> int:
+            started.set()
+            release.wait(5)
+            return 1
+
+        thread = Thread(target=flight.do, args=('key', func))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        timeouts = WAIT_TIMEOUTS.value('test-timeout')
+        waiter: list = list()
+        self.run_waiter(flight, 'key', waiter).join(5)
+        release.set()
+        thread.join(5)
+        self.assertEqual(waiter, ['timeout'])
+        self.assertEqual(WAIT_TIMEOUTS.value('test-timeout'), timeouts + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
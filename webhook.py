@@ -0,0 +1,259 @@
+import logging
+from typing import Optional
+from hmac import compare_digest
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from json import loads
+from json import JSONDecodeError
+from queue import Full
+from queue import Queue
+from secrets import token_urlsafe
+from threading import Thread
+from telebot import TeleBot
+from telebot import apihelper
+from telebot.types import Update
+
+
+logger = logging.getLogger(__name__)
+
+# Заголовок с секретным токеном, который телеграм добавляет к запросам
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# Максимальный размер тела запроса с обновлением (байты)
+MAX_BODY_SIZE = 1024 * 1024
+
+
+def get_update_chat_id(update: dict) -> int:
+    """Определение идентификатора чата обновления для выбора очереди
+
+    Args:
+        update (dict): обновление телеграма в виде словаря
+
+    Returns:
+        int: идентификатор чата, 0 - если чат не определен
+    """
+    for key in ('message', 'edited_message', 'channel_post'):
+        if key in update:
+            return update[key].get('chat', {}).get('id', 0)
+    if 'callback_query' in update:
+        message = update['callback_query'].get('message') or {}
+        return message.get('chat', {}).get('id', 0)
+    return 0
+
+
+def get_secret_token(secret_token: Optional[str], url: Optional[str]) -> str:
+    """Секретный токен вебхука: заданный в настройках или случайный, если
+        бот сам регистрирует вебхук в телеграме
+
+    Args:
+        secret_token (Optional[str]): токен из настроек
+        url (Optional[str]): публичный адрес вебхука, None - вебхук
+                             зарегистрирован не ботом
+
+    Raises:
+        ValueError: токен не задан, а вебхук регистрирует не бот
+
+    Returns:
+        str: секретный токен
+    """
+    if secret_token:
+        return secret_token
+    if not url:
+        raise ValueError(
+            'Для режима вебхука нужен секретный токен WEBHOOK_SECRET ' +
+            'или адрес WEBHOOK_URL для регистрации со случайным токеном'
+        )
+    return token_urlsafe(32)
+
+
+def set_webhook(bot: TeleBot, url: str, secret_token: str) -> None:
+    """Регистрация адреса вебхука в телеграме вместе с секретным токеном
+
+    Args:
+        bot (TeleBot): объект телеграм бота
+        url (str): публичный адрес вебхука
+        secret_token (str): секретный токен для заголовка запросов
+    """
+    apihelper._make_request(
+        bot.token,
+        'setWebhook',
+        params={'url': url, 'secret_token': secret_token},
+        method='post'
+    )
+
+
+class WebhookServer:
+    """Локальный HTTP-сервер для приема обновлений телеграма
+
+    Запрос с обновлением проверяется по секретному токену (без токена
+    сервер не создается), помещается
+    в ограниченную очередь и сразу получает ответ 200. Обработка
+    выполняется рабочими потоками, обновления одного чата всегда
+    попадают в одну очередь и обрабатываются по порядку.
+    """
+
+    def __init__(
+        self, bot: TeleBot, host: str, port: int,
+        secret_token: str, path: str = '/',
+        workers: int = 4, queue_size: int = 1000
+    ) -> None:
+        """Инициализация экземпляра класса
+
+        Args:
+            bot (TeleBot): объект телеграм бота, обрабатывающий обновления
+            host (str): адрес для входящих соединений
+            port (int): порт для входящих соединений
+            secret_token (str): ожидаемый секретный токен
+            path (str, optional): путь вебхука. Defaults to '/'.
+            workers (int, optional): количество рабочих потоков.
+                                     Defaults to 4.
+            queue_size (int, optional): размер очереди каждого потока.
+                                        Defaults to 1000.
+
+        Raises:
+            ValueError: секретный токен не задан
+        """
+        # Без проверки токена обновления мог бы присылать кто угодно
+        if not secret_token:
+            raise ValueError('Не задан секретный токен вебхука')
+        self.bot: TeleBot = bot
+        self.path: str = path
+        self.secret_token: str = secret_token
+        self.queues: list[Queue] = [
+            Queue(maxsize=queue_size) for _ in range(workers)
+        ]
+        # Счетчики принятых, отклоненных и обработанных обновлений
+        self.accepted: int = 0
+        self.rejected: int = 0
+        self.processed: int = 0
+        self._workers: list[Thread] = list()
+        self._server = ThreadingHTTPServer(
+            (host, port), self._make_handler()
+        )
+        self._server.daemon_threads = True
+
+    @property
+    def address(self) -> tuple[str, int]:
+        """Фактический адрес сервера (полезно при порте 0)
+        """
+        return self._server.server_address[:2]
+
+    def _make_handler(self) -> type:
+        """Создание класса обработчика HTTP-запросов, связанного с сервером
+
+        Returns:
+            type: класс обработчика
+        """
+        server = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+
+            def do_POST(self) -> None:
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+                if not compare_digest(
+                    self.headers.get(SECRET_HEADER, ''),
+                    server.secret_token
+                ):
+                    self._reply(403)
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    self._reply(400)
+                    return
+                if length > MAX_BODY_SIZE:
+                    self._reply(413)
+                    return
+                if length <= 0:
+                    self._reply(400)
+                    return
+                try:
+                    update = loads(self.rfile.read(length))
+                except (JSONDecodeError, UnicodeDecodeError):
+                    self._reply(400)
+                    return
+                if not isinstance(update, dict):
+                    self._reply(400)
+                    return
+                # При переполнении очереди телеграм повторит запрос позже
+                if not server.enqueue(update):
+                    self._reply(503)
+                    return
+                self._reply(200)
+
+            def _reply(self, status: int) -> None:
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format: str, *args) -> None:
+                logger.debug(format, *args)
+
+        return WebhookHandler
+
+    def enqueue(self, update: dict) -> bool:
+        """Постановка обновления в очередь его чата
+
+        Args:
+            update (dict): обновление телеграма в виде словаря
+
+        Returns:
+            bool: False - очередь переполнена, обновление не принято
+        """
+        chat_id = get_update_chat_id(update)
+        try:
+            self.queues[chat_id % len(self.queues)].put_nowait(update)
+        except Full:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def _work(self, queue: Queue) -> None:
+        """Цикл рабочего потока: передача обновлений боту
+
+        Args:
+            queue (Queue): очередь потока
+        """
+        while True:
+            update = queue.get()
+            if update is None:
+                return
+            try:
+                self.bot.process_new_updates([Update.de_json(update)])
+            except Exception:
+                logger.exception('Ошибка обработки обновления')
+            finally:
+                self.processed += 1
+                queue.task_done()
+
+    def _start_workers(self) -> None:
+        """Запуск рабочих потоков, по одному на очередь
+        """
+        for queue in self.queues:
+            worker = Thread(target=self._work, args=(queue,), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def start(self) -> None:
+        """Запуск рабочих потоков и HTTP-сервера в фоне
+        """
+        self._start_workers()
+        Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def serve_forever(self) -> None:
+        """Запуск рабочих потоков и HTTP-сервера в текущем потоке
+        """
+        self._start_workers()
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """Остановка HTTP-сервера и рабочих потоков после обработки очередей
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        for queue in self.queues:
+            queue.put(None)
+        for worker in self._workers:
+            worker.join()